@@ -1,9 +1,6 @@
-import json
+import asyncio
 import platform
 import signal
-import threading
-from queue import Queue, Empty
-from time import sleep
 
 # Windows 平台兼容性修复：这些是 Unix 专用信号，Windows 上不存在
 if platform.system() == "Windows":
@@ -21,13 +18,27 @@ if platform.system() == "Windows":
     signal.SIGTTOU = signal.SIGTERM  # Background write to tty
 
 from fastapi import FastAPI, Request, BackgroundTasks
-from fastapi.responses import StreamingResponse
-import requests
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from src.crew import NasdaqSummaryCrew
-from src.utils.notifier import run_agent_and_notify, TG_API_URL
-from src.utils.scheduler import get_scheduler, get_user_stats
+from src.utils.commands import router
+from src.utils.job_queue import JobRejected, get_crew_queue
+from src.utils.metrics import ACTIVE_RUNS, CONTENT_TYPE, REGISTRY
+from src.utils.notifier import run_registry
+from src.utils.progress import get_progress_dispatcher
+from src.utils.router import CommandContext
+from src.utils.sse import EventStream, StreamRegistry, parse_event_id, stream_events
+from src.utils.tracing import traces
+from src.utils.scheduler import get_scheduler
+from src.utils.tg_client import close_async_client
 from src.db.tg_user.user_service import UserService
-from src.utils.auth import check_admin_permission, get_admin_help, is_admin
+from src.db.tg_user.user_buffer import get_user_buffer
+from src.db.config import close_async_pool, close_pool
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# /invoke 的事件流（只在事件循环线程中访问）
+streams = StreamRegistry()
 
 app = FastAPI(
     title="纳斯达克100指数分析 API",
@@ -43,7 +54,10 @@ def root():
         "message": "🎯 纳斯达克100指数分析 API",
         "docs": "访问 /docs 查看 API 文档",
         "invoke": "POST /invoke 执行分析任务",
+        "events": "GET /invoke/{run_id}/events 观看进行中的分析",
         "webhook": "POST /webhook Telegram Bot 接口",
+        "metrics": "GET /metrics Prometheus 指标",
+        "trace": "GET /runs/{run_id}/trace 单次运行的链路耗时",
         "scheduler": "定时推送功能已启用 (09:00, 20:00)",
     }
 
@@ -54,67 +68,163 @@ def health():
     return {"status": "healthy"}
 
 
-@app.post("/invoke")
-def invoke():
-    """执行纳斯达克分析任务 (流式响应)"""
-    output_queue = Queue()
-
-    def step_callback(step_output):
-        try:
-            # step_output 可能是 TaskOutput 对象或字典
-            msg = ""
-            if hasattr(step_output, "thought") and step_output.thought:
-                msg = f"🤔 {step_output.thought}"
-            elif hasattr(step_output, "output") and step_output.output:
-                msg = (
-                    f"🔧 Output: {str(step_output.output)[:100]}..."  # 截断一下避免过长
-                )
-            else:
-                msg = str(step_output)
-
-            output_queue.put({"type": "log", "content": msg})
-        except Exception as e:
-            output_queue.put({"type": "log", "content": f"Step log error: {str(e)}"})
+def _active_runs() -> dict:
+    return {
+        ("telegram",): run_registry.get_stats()["running"],
+        ("invoke",): streams.running(),
+    }
 
-    def run_crew():
-        import traceback
 
-        try:
-            output_queue.put({"type": "log", "content": "🚀 任务启动..."})
+ACTIVE_RUNS.set_function(_active_runs)
 
-            crew_instance = NasdaqSummaryCrew().crew(step_callback=step_callback)
-            result = crew_instance.kickoff()
 
-            # 使用 result.raw 如果存在
-            final_content = result.raw if hasattr(result, "raw") else str(result)
-            output_queue.put({"type": "result", "content": final_content})
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标（在事件循环线程中渲染，可以直接读取 streams）"""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
 
-        except Exception as e:
-            err_msg = f"执行出错: {str(e)}\n{traceback.format_exc()}"
-            output_queue.put({"type": "error", "content": err_msg})
-        finally:
-            output_queue.put(None)
 
-    # 在后台线程中运行 Crew
-    thread = threading.Thread(target=run_crew)
-    thread.start()
+def _describe_step(step_output) -> str:
+    # step_output 可能是 TaskOutput 对象或字典
+    if hasattr(step_output, "thought") and step_output.thought:
+        return f"🤔 {step_output.thought}"
+    if hasattr(step_output, "output") and step_output.output:
+        return f"🔧 Output: {str(step_output.output)[:100]}..."  # 截断一下避免过长
+    return str(step_output)
 
-    def event_generator():
-        while True:
-            try:
-                # 设置超时防止死循环，也可以让 yield 有机会处理断开连接
-                data = output_queue.get(timeout=1)
 
-                if data is None:
-                    break
+def _run_crew(stream: EventStream):
+    """在任务队列的工作线程中运行 Crew，事件通过 stream 推送给订阅者"""
+    import traceback
 
-                # SSE 格式: data: <json_string>\n\n
-                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    def step_callback(step_output):
+        try:
+            stream.publish({"type": "log", "content": _describe_step(step_output)})
+        except Exception as e:
+            stream.publish({"type": "log", "content": f"Step log error: {str(e)}"})
+
+    try:
+        stream.publish({"type": "log", "content": "🚀 任务启动..."})
+
+        # 与事件流共用 run_id，/runs/{run_id}/trace 可直接查看本次运行的链路
+        crew = NasdaqSummaryCrew(run_id=stream.run_id)
+        result = crew.kickoff(step_callback=step_callback)
+
+        # 使用 result.raw 如果存在
+        final_content = result.raw if hasattr(result, "raw") else str(result)
+        stream.publish({"type": "result", "content": final_content})
+
+    except Exception as e:
+        logger.exception("执行出错: %s", e)
+        err_msg = f"执行出错: {str(e)}\n{traceback.format_exc()}"
+        stream.publish({"type": "error", "content": err_msg})
+    finally:
+        stream.close()
+
+
+def _cancel_if_queued(stream: EventStream, job):
+    """所有客户端都断开了：还在排队的任务直接取消，已开始的在后台跑完（可续传）"""
+    if get_crew_queue().cancel(job):
+        logger.info("客户端已全部断开，取消排队中的运行 %s", stream.run_id)
+        stream.close()
+
+
+def _start_run(request: Request) -> EventStream:
+    """创建事件流并把 Crew 提交到任务队列，队列拒绝时抛出 JobRejected"""
+    stream = streams.create(asyncio.get_running_loop())
+    stream.publish({"type": "run", "run_id": stream.run_id})
+
+    def on_position(position):
+        stream.publish({"type": "log", "content": f"🕒 排队中：第 {position} 位"})
+
+    try:
+        job = get_crew_queue().submit(
+            _run_crew,
+            stream,
+            user_key=request.client.host if request.client else None,
+            on_position=on_position,
+        )
+    except JobRejected:
+        stream.close()
+        raise
+    stream.on_idle = lambda idle_stream: _cancel_if_queued(idle_stream, job)
+    if job.position and job.started_at is None:
+        on_position(job.position)
+    return stream
+
+
+def _sse_response(
+    request: Request, stream: EventStream, after: int = 0
+) -> StreamingResponse:
+    return StreamingResponse(
+        stream_events(stream, after=after, is_disconnected=request.is_disconnected),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Run-ID": stream.run_id,
+        },
+    )
 
-            except Empty:
-                continue
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+@app.post("/invoke")
+async def invoke(request: Request):
+    """执行纳斯达克分析任务 (SSE 流式响应)
+
+    已有运行在进行时直接加入观看，不会重复执行；
+    断线后带上 Last-Event-ID 重新请求，会续传同一次运行的后续事件
+    """
+    run_id, last_seq = parse_event_id(request.headers.get("last-event-id"))
+    stream = streams.get(run_id)
+    if stream is not None:
+        logger.info("续传运行 %s，从事件 #%d 之后开始", run_id, last_seq)
+        return _sse_response(request, stream, after=last_seq)
+
+    stream = streams.active()
+    if stream is not None:
+        logger.info(
+            "加入正在进行的运行 %s（当前观看者 %d）",
+            stream.run_id,
+            stream.subscriber_count,
+        )
+        return _sse_response(request, stream)
+
+    # 提交到有界任务队列，由工作线程运行 Crew
+    try:
+        stream = _start_run(request)
+    except JobRejected as e:
+        return JSONResponse(
+            status_code=429,
+            content={"type": "error", "reason": e.reason, "content": str(e)},
+        )
+    return _sse_response(request, stream)
+
+
+@app.get("/invoke/{run_id}/events")
+async def invoke_events(run_id: str, request: Request):
+    """观看指定运行：先回放历史事件，再接收实时事件（支持 Last-Event-ID 续传）"""
+    stream = streams.get(run_id)
+    if stream is None:
+        return JSONResponse(
+            status_code=404,
+            content={"type": "error", "content": f"运行不存在或已过期: {run_id}"},
+        )
+    resume_id, last_seq = parse_event_id(request.headers.get("last-event-id"))
+    return _sse_response(request, stream, after=last_seq if resume_id == run_id else 0)
+
+
+@app.get("/runs/{run_id}/trace")
+def run_trace(run_id: str, format: str = "json"):
+    """运行的链路：format=text 时返回文本火焰图"""
+    trace = traces.get(run_id)
+    if trace is None:
+        return JSONResponse(
+            status_code=404,
+            content={"type": "error", "content": f"运行不存在或已过期: {run_id}"},
+        )
+    if format == "text":
+        return PlainTextResponse(trace.render_timeline())
+    return trace.to_dict()
 
 
 @app.post("/webhook")
@@ -129,178 +239,20 @@ async def telegram_webhook(
         text = data["message"].get("text", "")
         user_data = data["message"]["from"]
 
-        # 记录所有与 Bot 互动的用户（自动订阅）
-        try:
-            UserService.subscribe_user(user_data)
-            print(f"✅ 用户信息已更新: {chat_id}")
-        except Exception as e:
-            print(f"❌ 更新用户信息失败: {str(e)}")
-
-        print(f"收到消息: {text} (来自用户: {chat_id})")
-
-        if text in ["/start_summary"]:
-            initial_msg = {
-                "chat_id": chat_id,
-                "text": "🚀 收到请求！正在调动 AI 智能体分析纳指数据，请稍候...",
-            }
-            response = requests.post(TG_API_URL + "/sendMessage", json=initial_msg)
-            if response.status_code == 200:
-                resp_data = response.json()
-                # 拿回发出的消息ID，用于后续更新进度
-                status_msg_id = resp_data["result"]["message_id"]
-                background_tasks.add_task(run_agent_and_notify, chat_id, status_msg_id)
-            else:
-                print(f"Failed to send initial message: {response.text}")
-        
-        elif text in ["/unsubscribe", "/取消订阅"]:
-            # 取消订阅定时推送
-            try:
-                UserService.unsubscribe_user(user_data)
-                msg = "❌ 已取消订阅定时推送。如需重新订阅，请发送 /subscribe"
-            except Exception as e:
-                print(f"❌ 取消订阅失败: {str(e)}")
-                msg = "⚠️ 取消订阅失败，请稍后重试。"
-            
-            requests.post(TG_API_URL + "/sendMessage", json={
-                "chat_id": chat_id,
-                "text": msg
-            })
-        
-        elif text in ["/subscribe", "/订阅"]:
-            # 重新订阅定时推送
-            try:
-                UserService.subscribe_user(user_data)
-                msg = "✅ 订阅成功！您将在每日 09:00 和 20:00 收到纳斯达克100指数分析报告。"
-            except Exception as e:
-                print(f"❌ 订阅失败: {str(e)}")
-                msg = "⚠️ 订阅失败，请稍后重试。"
-            
-            requests.post(TG_API_URL + "/sendMessage", json={
-                "chat_id": chat_id,
-                "text": msg
-            })
-        
-        elif text in ["/status", "/状态"]:
-            # 查看订阅状态 - 仅管理员可用
-            has_permission, error_msg = check_admin_permission(chat_id)
-            
-            if not has_permission:
-                requests.post(TG_API_URL + "/sendMessage", json={
-                    "chat_id": chat_id,
-                    "text": error_msg
-                })
-                return {"status": "ok"}
-            
-            try:
-                stats = get_user_stats()
-                
-                # 管理员详细状态信息
-                status_msg = f"""
-🛡️ 系统管理面板
-
-📊 用户统计：
-• 订阅用户数：{stats['subscribed_count']}
-• 活跃用户：{len([u for u in stats['users'] if u])}
-
-⏰ 定时任务：
-• 推送时间：每日 09:00 和 20:00
-• 状态：运行中 ✅
-
-💾 数据存储：
-• 类型：PostgreSQL 数据库
-• 状态：连接正常 ✅
-
-🤖 Bot 信息：
-• 管理员ID：{chat_id}
-• 权限：完全访问 🔓
-
-📋 最近订阅用户：
-{chr(10).join([f"• {u[1] or u[2] or 'Unknown'} ({u[0]})" for u in stats['users'][:5]])}
-                """
-                
-                if stats['subscribed_count'] > 5:
-                    status_msg += f"\n... 还有 {stats['subscribed_count'] - 5} 个用户"
-                    
-            except Exception as e:
-                print(f"❌ 获取状态失败: {str(e)}")
-                status_msg = f"⚠️ 获取系统状态失败：{str(e)}"
-            
-            requests.post(TG_API_URL + "/sendMessage", json={
-                "chat_id": chat_id,
-                "text": status_msg.strip()
-            })
-        
-        elif text in ["/admin_help", "/管理员帮助"]:
-            # 管理员帮助 - 仅管理员可用
-            has_permission, error_msg = check_admin_permission(chat_id)
-            
-            if not has_permission:
-                requests.post(TG_API_URL + "/sendMessage", json={
-                    "chat_id": chat_id,
-                    "text": error_msg
-                })
-                return {"status": "ok"}
-            
-            help_msg = get_admin_help()
-            
-            requests.post(TG_API_URL + "/sendMessage", json={
-                "chat_id": chat_id,
-                "text": help_msg.strip()
-            })
-        
-        elif text in ["/help", "/帮助", "/start"]:
-            # 帮助信息 - 根据用户权限显示不同内容
-            if is_admin(chat_id):
-                # 管理员帮助信息
-                help_msg = f"""
-🤖 纳斯达克100指数分析机器人 (管理员模式)
-
-👋 欢迎管理员！您拥有完全访问权限。
-
-📋 普通命令：
-• /start_summary - 立即生成分析报告
-• /unsubscribe 或 /取消订阅 - 取消定时推送
-• /subscribe 或 /订阅 - 重新订阅定时推送
-• /help 或 /帮助 - 显示此帮助信息
-
-🛡️ 管理员专用命令：
-• /status 或 /状态 - 查看系统状态和用户统计
-• /admin_help - 显示管理员详细帮助
-
-⏰ 定时推送时间：
-• 上午 09:00 - 开盘前分析
-• 晚上 20:00 - 盘后分析
-
-💡 所有与机器人互动的用户都会自动订阅定时推送
-💾 用户数据安全存储在数据库中
-🔐 您当前以管理员身份登录
-                """
-            else:
-                # 普通用户帮助信息
-                help_msg = f"""
-🤖 纳斯达克100指数分析机器人
-
-👋 欢迎！您已自动订阅定时推送。
-
-📋 可用命令：
-• /start_summary - 立即生成分析报告
-• /unsubscribe 或 /取消订阅 - 取消定时推送
-• /subscribe 或 /订阅 - 重新订阅定时推送
-• /help 或 /帮助 - 显示此帮助信息
-
-⏰ 定时推送时间：
-• 上午 09:00 - 开盘前分析
-• 晚上 20:00 - 盘后分析
-
-💡 所有与机器人互动的用户都会自动订阅定时推送
-💾 用户数据安全存储在数据库中
-                """
-            
-            requests.post(TG_API_URL + "/sendMessage", json={
-                "chat_id": chat_id,
-                "text": help_msg.strip()
-            })
-        
+        # 记录所有与 Bot 互动的用户（自动订阅），写缓冲异步落库
+        if UserService.touch_user(user_data):
+            logger.debug("用户信息已加入写缓冲: %s", chat_id)
+
+        logger.debug("收到消息: %s (来自用户: %s)", text, chat_id)
+
+        ctx = CommandContext(
+            chat_id=chat_id,
+            text=text,
+            user_data=user_data,
+            background_tasks=background_tasks,
+        )
+        await router.dispatch(ctx)
+
         return {"status": "ok"}
     return {"status": "error"}
 
@@ -309,7 +261,7 @@ async def telegram_webhook(
 @app.on_event("startup")
 async def startup_event():
     """应用启动时执行的操作"""
-    print("🚀 启动定时任务调度器...")
+    logger.info("启动定时任务调度器")
     get_scheduler()  # 启动调度器
 
 
@@ -319,13 +271,22 @@ async def shutdown_event():
     scheduler = get_scheduler()
     if scheduler:
         scheduler.shutdown()
-        print("⏹️ 定时任务调度器已关闭")
+        logger.info("定时任务调度器已关闭")
+    get_crew_queue().shutdown(wait=False, cancel_pending=True)
+    logger.info("任务队列已关闭")
+    get_progress_dispatcher().close()
+    try:
+        get_user_buffer().close()
+    except Exception as e:
+        logger.error("用户写缓冲落库失败: %s", e)
+    await close_async_client()
+    await close_async_pool()
+    close_pool()
+    logger.info("数据库连接池已关闭")
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    print("🚀 启动 FastAPI 服务器...")
-    print("📡 访问地址: http://localhost:8000")
-    print("📋 API 文档: http://localhost:8000/docs")
+    logger.info("启动 FastAPI 服务器: http://localhost:8000（API 文档: /docs）")
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,94 +1,431 @@
+import logging
+import os
+import threading
+import time
+
 import yaml
-from crewai import Agent, Crew, Task
+from crewai import Agent, Crew, CrewOutput, Task, TaskOutput
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from src.tools.finance_tool import get_nasdaq_data
+from src.tools.constituents import (
+    format_constituents_context,
+    get_constituents_snapshot,
+)
+from src.tools.finance_tool import (
+    get_constituents,
+    get_nasdaq_data,
+    get_technical_indicators,
+)
+from src.tools.indicators import format_indicators_context, get_indicator_engine
+from src.tools.market_metrics import (
+    SNAPSHOT_SYMBOL,
+    format_snapshot_context,
+    get_qqq_snapshot,
+)
 from src.tools.search_tool import search_news_tool
+from src.utils.cached_llm import CachedLLM
+from src.utils.llm_cache import get_llm_cache
+from src.utils.logger import get_logger
+from src.utils.metrics import (
+    CREW_KICKOFF_SECONDS,
+    CREW_STEPS,
+    CREW_TASK_SECONDS,
+    LLM_CALL_SECONDS,
+    LLM_TOKENS,
+)
+from src.utils.task_memo import digest, get_task_memo, recorder, replay_matches
+from src.utils.tracing import (
+    KIND_BUILD,
+    KIND_LLM,
+    KIND_STEP,
+    KIND_TASK,
+    KIND_TOOL,
+    new_id,
+    traces,
+    use_trace,
+)
+
+logger = get_logger(__name__)
+
+AGENT_CONFIG_PATH = "config/agent.yaml"
+TASK_CONFIG_PATH = "config/task.yaml"
+
+# 执行模式：parallel 时任务 1、2 并发执行，任务 3 等两者完成后开始；
+# sequential 为原来的顺序执行
+CREW_EXECUTION_MODE = os.getenv("CREW_EXECUTION_MODE", "parallel")
+# 数据模式：fast 由程序直接计算 QQQ 数据并注入报告任务（少跑一个 Agent）；
+# agent 为原来的 Agent 调用工具
+CREW_DATA_MODE = os.getenv("CREW_DATA_MODE", "fast")
+
+# 任务名 -> 进度展示名称
+TASK_LABELS = {
+    "fetch_and_analyze_data": "数据获取与分析",
+    "research_key_news": "新闻研究",
+    "write_final_report": "报告撰写",
+}
+
+# token_usage 字段 -> qqq_llm_tokens_total 的 kind 标签
+TOKEN_KINDS = {
+    "prompt_tokens": "prompt",
+    "completion_tokens": "completion",
+    "cached_prompt_tokens": "cached_prompt",
+}
+
+_yaml_cache = {}
+_yaml_lock = threading.Lock()
 
 
 def load_yaml(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+    """读取 YAML 配置，按文件 mtime 缓存，文件修改后自动重新解析
+
+    返回的是共享对象，请勿修改
+    """
+    mtime = os.stat(file_path).st_mtime_ns
+    cached = _yaml_cache.get(file_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with _yaml_lock:
+        cached = _yaml_cache.get(file_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f)
+        _yaml_cache[file_path] = (mtime, data)
+        return data
+
+
+# 工具名 -> crewai 工具，用于重放任务记忆中的工具调用
+MEMO_TOOLS = {
+    tool.name: tool
+    for tool in (
+        get_nasdaq_data,
+        get_constituents,
+        get_technical_indicators,
+        search_news_tool,
+    )
+}
+
+
+def _replay_tool(name: str, args: dict):
+    return MEMO_TOOLS[name].func(**args)
+
+
+_event_hooks_installed = False
+_event_hooks_lock = threading.Lock()
+
+
+def install_event_hooks() -> bool:
+    """订阅 crewai 事件总线（只安装一次）
+
+    记录 LLM 调用耗时指标、LLM / 工具调用的 span，以及任务记忆需要的工具调用结果。
+
+    事件处理函数在 crewai 的线程池中执行，因此用事件自带的时间戳计算耗时，
+    并通过事件的 task_id 找到所属的 Trace；
+    同一 Agent 在同一任务内的 LLM 调用是串行的，
+    按 (agent_id, task_id) 配对开始和结束事件。
+    """
+    global _event_hooks_installed
+    with _event_hooks_lock:
+        if _event_hooks_installed:
+            return True
+        try:
+            from crewai.events import crewai_event_bus
+            from crewai.events.types.llm_events import (
+                LLMCallCompletedEvent,
+                LLMCallFailedEvent,
+                LLMCallStartedEvent,
+            )
+            from crewai.events.types.tool_usage_events import (
+                ToolUsageErrorEvent,
+                ToolUsageFinishedEvent,
+            )
+        except ImportError as e:
+            logger.warning(
+                "当前 crewai 版本不支持事件总线，跳过 LLM / 工具调用记录: %s", e
+            )
+            return False
+
+        started = {}
+        started_lock = threading.Lock()
+
+        def on_llm_started(source, event):
+            with started_lock:
+                key = (event.agent_id, event.task_id)
+                started[key] = (event.timestamp, event.model)
+
+        def on_llm_finished(status):
+            def handler(source, event):
+                with started_lock:
+                    start = started.pop((event.agent_id, event.task_id), None)
+                if start is None:
+                    return
+                timestamp, model = start
+                model = getattr(event, "model", None) or model or "unknown"
+                LLM_CALL_SECONDS.observe(
+                    (event.timestamp - timestamp).total_seconds(),
+                    model=model,
+                    status=status,
+                )
+                trace, task_span_id = traces.for_task(event.task_id)
+                if trace is not None:
+                    trace.add_span(
+                        model,
+                        KIND_LLM,
+                        timestamp.timestamp(),
+                        event.timestamp.timestamp(),
+                        task_span_id,
+                        status=status,
+                        agent=event.agent_role,
+                    )
+            return handler
+
+        def on_tool_finished(source, event):
+            recorder.record(
+                event.task_id, event.tool_name, event.tool_args, event.output
+            )
+            trace, task_span_id = traces.for_task(event.task_id)
+            if trace is not None:
+                trace.add_span(
+                    event.tool_name,
+                    KIND_TOOL,
+                    event.started_at.timestamp(),
+                    event.finished_at.timestamp(),
+                    task_span_id,
+                    from_cache=event.from_cache,
+                )
+
+        def on_tool_error(source, event):
+            trace, task_span_id = traces.for_task(event.task_id)
+            if trace is not None:
+                now = event.timestamp.timestamp()
+                trace.add_span(
+                    event.tool_name, KIND_TOOL, now, now, task_span_id,
+                    status="error", error=str(event.error)[:200],
+                )
+
+        crewai_event_bus.on(LLMCallStartedEvent)(on_llm_started)
+        crewai_event_bus.on(LLMCallCompletedEvent)(on_llm_finished("ok"))
+        crewai_event_bus.on(LLMCallFailedEvent)(on_llm_finished("error"))
+        crewai_event_bus.on(ToolUsageFinishedEvent)(on_tool_finished)
+        crewai_event_bus.on(ToolUsageErrorEvent)(on_tool_error)
+        _event_hooks_installed = True
+        return True
+
+
+class CrewTemplate:
+    """预先构建好的 Crew 模板
+
+    Agent 和 Task 只构建一次，每次请求通过 Crew.copy() 复制出独立的实例
+    （复用同一个 LLM 对象，不再重复解析配置），再换上本次请求的回调和数据。
+    """
+
+    def __init__(
+        self, agent_config: dict, task_config: dict, parallel: bool, data_mode: str
+    ):
+        self.agent_config = agent_config
+        self.task_config = task_config
+        self.parallel = parallel
+        self.data_mode = data_mode
+        builder = NasdaqSummaryCrew(
+            agent_config=agent_config,
+            task_config=task_config,
+            parallel=parallel,
+            data_mode=data_mode,
+        )
+        self._crew = builder.build_crew()
+        self.task_names = [task.name for task in self._crew.tasks]
+
+    def is_current(self, agent_config: dict, task_config: dict) -> bool:
+        return self.agent_config is agent_config and self.task_config is task_config
+
+    def instantiate(
+        self, step_callback=None, task_callback=None, report_context: str = None
+    ) -> Crew:
+        crew = self._crew.copy()
+        crew.step_callback = step_callback
+        crew.task_callback = task_callback
+        if report_context:
+            # 把预先计算好的数据放在报告任务描述最前面
+            report_task = crew.tasks[-1]
+            report_task.description = f"{report_context}\n{report_task.description}"
+        return crew
+
+
+_templates = {}
+_template_lock = threading.Lock()
+
+
+def get_crew_template(parallel: bool = None, data_mode: str = None) -> CrewTemplate:
+    """获取 Crew 模板（每种模式组合一个），配置文件变化时重新构建"""
+    if parallel is None:
+        parallel = CREW_EXECUTION_MODE == "parallel"
+    data_mode = data_mode or CREW_DATA_MODE
+    key = (parallel, data_mode)
+    agent_config = load_yaml(AGENT_CONFIG_PATH)
+    task_config = load_yaml(TASK_CONFIG_PATH)
+    template = _templates.get(key)
+    if template is None or not template.is_current(agent_config, task_config):
+        with _template_lock:
+            template = _templates.get(key)
+            if template is None or not template.is_current(agent_config, task_config):
+                template = CrewTemplate(agent_config, task_config, parallel, data_mode)
+                _templates[key] = template
+    return template
 
 
 class NasdaqSummaryCrew:
-    def __init__(self, chat_id=None, status_msg_id=None):
+    def __init__(
+        self,
+        chat_id=None,
+        status_msg_id=None,
+        agent_config=None,
+        task_config=None,
+        parallel: bool = None,
+        data_mode: str = None,
+        on_progress=None,
+        run_id: str = None,
+    ):
         self.chat_id = chat_id
         self.status_msg_id = status_msg_id
+        # 进度输出：传入 on_progress(text) 时交给调用方分发，
+        # 否则直接编辑 chat_id 的状态消息
+        self.on_progress = on_progress
+        if parallel is None:
+            parallel = CREW_EXECUTION_MODE == "parallel"
+        self.parallel = parallel
+        self.data_mode = data_mode or CREW_DATA_MODE
         self.task_count = 0  # 任务计数器
-        # 自动从 config/ 载入 YAML 配置
-        self.agent_config = load_yaml("config/agent.yaml")
-        self.task_config = load_yaml("config/task.yaml")
+        self.task_names = list(TASK_LABELS)
+        self.market_snapshot = None  # 快速模式下预先计算的 QQQ 数据
+        self.constituents = None  # 快速模式下预先计算的成分股表现
+        self.indicators = None  # 快速模式下预先计算的 QQQ 技术指标
+        # 本次运行的记录，随报告一起保存
+        self.task_inputs = {}
+        self.task_timings = {}
+        self._started_at = None
+        self._async_tasks = set()
+        self._task_finished = {}  # 任务名 -> 完成时刻（perf_counter）
+        # 链路追踪：run_id 为空时自动生成
+        self.run_id = run_id
+        self.trace = None
+        self._task_span_ids = {}
+        self._kickoff_thread = None
+        self._step_marks = {}  # 线程 -> 上一步结束时刻（Unix 时间戳）
+        self._memo_order = []  # 任务记忆：复用前 crew 中的全部任务
+        # 并行模式下回调会在多个线程中同时触发
+        self._callback_lock = threading.Lock()
+        # 从 config/ 载入 YAML 配置（已缓存，不会重复解析）
+        self.agent_config = agent_config or load_yaml(AGENT_CONFIG_PATH)
+        self.task_config = task_config or load_yaml(TASK_CONFIG_PATH)
 
     def market_analyst(self) -> Agent:
         """市场分析师"""
-        return Agent(
+        return self._with_llm_cache(Agent(
             config=self.agent_config["market_analyst"],
-            tools=[get_nasdaq_data],
+            tools=[get_nasdaq_data, get_technical_indicators, get_constituents],
             verbose=True,
-        )
+        ))
 
     def news_researcher(self) -> Agent:
         """新闻研究员"""
-        return Agent(
+        return self._with_llm_cache(Agent(
             config=self.agent_config["news_researcher"],
             tools=[search_news_tool],
             verbose=True,
-        )
+        ))
 
     def content_creator(self) -> Agent:
         """内容创作者"""
-        return Agent(
+        return self._with_llm_cache(Agent(
             config=self.agent_config["content_creator"],
             tools=[],  # 撰写报告不需要额外工具
             verbose=True,
-        )
+        ))
+
+    def _llm_cache_allowed(self, task_name: str) -> bool:
+        """task.yaml 中 llm_cache: false 的任务不使用响应缓存"""
+        return bool(self.task_config.get(task_name, {}).get("llm_cache", True))
+
+    def _with_llm_cache(self, agent: Agent) -> Agent:
+        """给 Agent 的 LLM 套上响应缓存（LLM_CACHE=off 时保持原样）"""
+        cache = get_llm_cache()
+        if (
+            cache is not None
+            and agent.llm is not None
+            and not isinstance(agent.llm, CachedLLM)
+        ):
+            agent.llm = CachedLLM(agent.llm, cache, allow=self._llm_cache_allowed)
+        return agent
 
-    def fetch_and_analyze_data_task(self) -> Task:
+    def fetch_and_analyze_data_task(self, agent: Agent = None) -> Task:
         """获取并分析数据"""
         config = self.task_config["fetch_and_analyze_data"]
         return Task(
+            name="fetch_and_analyze_data",
             description=config["description"],
             expected_output=config["expected_output"],
-            agent=self.market_analyst(),
+            agent=agent or self.market_analyst(),
+            async_execution=self.parallel,
         )
 
-    def research_key_news_task(self) -> Task:
+    def research_key_news_task(self, agent: Agent = None) -> Task:
         """研究关键新闻"""
         config = self.task_config["research_key_news"]
         return Task(
+            name="research_key_news",
             description=config["description"],
             expected_output=config["expected_output"],
-            agent=self.news_researcher(),
+            agent=agent or self.news_researcher(),
+            # 快速模式下没有任务 1，不需要并发
+            async_execution=self.parallel and self.data_mode == "agent",
         )
 
-    def write_final_report_task(self) -> Task:
-        """撰写最终报告"""
+    def write_final_report_task(self, context: list[Task], agent: Agent = None) -> Task:
+        """撰写最终报告，context 必须是同一次构建中的上游任务实例"""
         config = self.task_config["write_final_report"]
+        # 快速模式没有任务 1，使用引用注入数据的描述（旧配置没有 fast_* 时回退）
+        prefix = "fast_" if self.data_mode == "fast" else ""
+        description = config.get(f"{prefix}description", config["description"])
+        expected = config.get(f"{prefix}expected_output", config["expected_output"])
         return Task(
-            description=config["description"],
-            expected_output=config["expected_output"],
-            agent=self.content_creator(),
+            name="write_final_report",
+            description=description,
+            expected_output=expected,
+            agent=agent or self.content_creator(),
             # 依赖上一步的结果
-            context=[self.fetch_and_analyze_data_task(), self.research_key_news_task()],
+            context=context,
         )
 
+    def _has_progress_sink(self) -> bool:
+        return bool(self.on_progress or (self.chat_id and self.status_msg_id))
+
+    def _publish_progress(self, text: str):
+        # 进度回调可能在异步任务的线程中触发，显式带上本次运行的 Trace
+        with use_trace(self.trace):
+            if self.on_progress:
+                self.on_progress(text)
+                return
+            # 延迟导入避免循环依赖
+            from src.utils.notifier import queue_progress
+
+            # 只写入最新状态，由后台发送器合并、限速，不阻塞 Agent
+            queue_progress(self.chat_id, self.status_msg_id, text)
+
     def _create_task_callback(self):
         """创建任务回调，在每个任务完成时更新进度"""
         
         def callback(task_output):
-            self.task_count += 1
+            with self._callback_lock:
+                self.task_count += 1
+                task_count = self.task_count
             
-            # 只有在有 chat_id 和 status_msg_id 时才更新 Telegram
-            if not (self.chat_id and self.status_msg_id):
+            # 没有进度输出目标时跳过
+            if not self._has_progress_sink():
                 return
             
-            # 延迟导入避免循环依赖
-            from src.utils.notifier import update_tg_progress
-            
-            print(f"\n✅ [任务 #{self.task_count}] Task callback 触发！")
+            logger.info("任务 #%d 完成，task callback 触发", task_count)
             
             # 提取任务信息
             task_desc = getattr(task_output, "description", "")
@@ -98,14 +435,17 @@ class NasdaqSummaryCrew:
             # 构建进度文本
             progress_parts = []
             
-            if self.task_count == 1:
-                progress_parts.append(f"✅ 任务 1/3 完成：数据获取与分析")
-            elif self.task_count == 2:
-                progress_parts.append(f"✅ 任务 2/3 完成：新闻研究")
-            elif self.task_count == 3:
-                progress_parts.append(f"✅ 任务 3/3 完成：报告撰写")
+            # 并行模式下完成顺序不固定，按任务名识别
+            name = getattr(task_output, "name", None)
+            total = len(self.task_names)
+            if name in self.task_names:
+                index = self.task_names.index(name) + 1
+                progress_parts.append(
+                    f"✅ 任务 {index}/{total} 完成：{TASK_LABELS[name]}"
+                    f"（已完成 {task_count}/{total}）"
+                )
             else:
-                progress_parts.append(f"✅ 任务 {self.task_count} 完成")
+                progress_parts.append(f"✅ 任务 {task_count} 完成")
             
             # 添加任务摘要（截取前200字符）
             if task_summary:
@@ -117,44 +457,32 @@ class NasdaqSummaryCrew:
             
             progress_text = "\n".join(progress_parts)
             
-            print(f"   📤 更新 Telegram 消息: {progress_text[:100]}...")
+            logger.debug("更新进度消息: %.100s", progress_text)
             
             # 更新消息
-            update_tg_progress(self.chat_id, self.status_msg_id, progress_text)
+            self._publish_progress(progress_text)
 
         return callback
 
     def _create_step_callback(self):
         """创建闭包,捕获当前请求的ID,用于更新Telegram消息"""
-        import time
-        self._last_update_time = 0  # 用于限流
         self._callback_count = 0  # 统计回调次数
         
         def callback(step_output):
             self._callback_count += 1
-            print(f"\n🔔 [回调 #{self._callback_count}] Step callback 触发！")
+            logger.debug("step callback #%d", self._callback_count)
             
-            # 只有在有 chat_id 和 status_msg_id 时才更新 Telegram
-            if not (self.chat_id and self.status_msg_id):
-                print(f"   ⚠️ 没有 chat_id 或 status_msg_id，跳过 Telegram 更新")
+            # 没有进度输出目标时跳过
+            if not self._has_progress_sink():
                 return
                 
-            # 限流：至少间隔1秒才更新一次（避免Telegram API限制）
-            current_time = time.time()
-            if current_time - self._last_update_time < 1:
-                print(f"   ⏱️ 限流中，距离上次更新 {current_time - self._last_update_time:.2f}秒")
-                return
-            self._last_update_time = current_time
-            
-            # 延迟导入避免循环依赖
-            from src.utils.notifier import update_tg_progress
+            # 无需在此限流：进度发送器会合并同一消息的更新并按 Telegram 限制发送
             
-            # 打印调试信息
             step_type = type(step_output).__name__
-            print(f"\n📊 Step Callback 触发 - 类型: {step_type}")
-            
-            if hasattr(step_output, "__dict__"):
-                print(f"   属性: {step_output.__dict__}")
+            # 只在 DEBUG 时输出属性名，不把整个对象（含大段 LLM 输出）转成字符串
+            if logger.isEnabledFor(logging.DEBUG):
+                attrs = sorted(getattr(step_output, "__dict__", {}))
+                logger.debug("step 类型: %s，属性: %s", step_type, attrs)
             
             # 构建进度文本
             progress_parts = []
@@ -211,37 +539,356 @@ class NasdaqSummaryCrew:
             else:
                 progress_text = f"Agent 正在处理任务... (类型: {step_type})"
             
-            print(f"   📤 准备更新 Telegram 消息: {progress_text[:100]}...")
+            logger.debug("更新进度消息: %.100s", progress_text)
             
             # 更新消息
-            update_tg_progress(self.chat_id, self.status_msg_id, progress_text)
+            self._publish_progress(progress_text)
 
         return callback
 
+    def build_crew(self) -> Crew:
+        """构建完整的 Crew（每个 Agent 只创建一次，任务共享同一批实例）"""
+        researcher = self.news_researcher()
+        creator = self.content_creator()
+
+        if self.data_mode == "fast":
+            # 数据由程序预先计算并注入报告任务，不需要市场分析师
+            task2 = self.research_key_news_task(researcher)
+            task3 = self.write_final_report_task([task2], creator)
+            return Crew(
+                agents=[researcher, creator],
+                tasks=[task2, task3],
+                verbose=True,
+            )
+
+        analyst = self.market_analyst()
+
+        # 创建任务实例（必须使用同一个实例来建立依赖关系）
+        task1 = self.fetch_and_analyze_data_task(analyst)
+        task2 = self.research_key_news_task(researcher)
+        task3 = self.write_final_report_task([task1, task2], creator)
+
+        return Crew(
+            agents=[analyst, researcher, creator],
+            tasks=[task1, task2, task3],
+            verbose=True,
+        )
+
     def crew(self, step_callback=None, task_callback=None) -> Crew:
         # 如果外部传入了回调，使用外部的；否则使用内部的
         step_cb = step_callback if step_callback else self._create_step_callback()
         task_cb = task_callback if task_callback else self._create_task_callback()
-        
-        # 创建任务实例（必须使用同一个实例来建立依赖关系）
-        task1 = self.fetch_and_analyze_data_task()
-        task2 = self.research_key_news_task()
-        task3 = Task(
-            description=self.task_config["write_final_report"]["description"],
-            expected_output=self.task_config["write_final_report"]["expected_output"],
-            agent=self.content_creator(),
-            context=[task1, task2],  # 使用同一个实例引用
+        if self.trace is None:
+            self.trace = traces.start(
+                self.run_id, data_mode=self.data_mode, parallel=self.parallel
+            )
+            self.run_id = self.trace.run_id
+
+        with self.trace.span("crew", KIND_BUILD):
+            report_context = None
+            if self.data_mode == "fast":
+                # 确定性预处理：直接计算 QQQ 数据，替代任务 1 的 Agent
+                self.market_snapshot = get_qqq_snapshot()
+                report_context = format_snapshot_context(self.market_snapshot)
+                logger.info(
+                    "QQQ 数据已计算: %s", self.market_snapshot["market_assessment"]
+                )
+                # 成分股数据只是补充，获取失败时照常生成报告
+                try:
+                    self.constituents = get_constituents_snapshot()
+                    report_context += format_constituents_context(self.constituents)
+                except Exception as e:
+                    logger.warning("成分股数据获取失败，报告中不包含成分股表现: %s", e)
+                try:
+                    latest = get_indicator_engine().latest((SNAPSHOT_SYMBOL,))
+                    self.indicators = latest.get(SNAPSHOT_SYMBOL)
+                    if self.indicators:
+                        report_context += format_indicators_context(
+                            SNAPSHOT_SYMBOL, self.indicators
+                        )
+                except Exception as e:
+                    logger.warning("技术指标计算失败，报告中不包含技术指标: %s", e)
+
+            def traced_step_cb(step_output):
+                step_type = type(step_output).__name__
+                CREW_STEPS.inc(step_type=step_type)
+                self._record_step(step_type)
+                step_cb(step_output)
+
+            def timed_task_cb(task_output):
+                # 记录每个任务从 kickoff 到完成的时刻，以及任务自身的耗时
+                now = time.perf_counter()
+                name = (
+                    getattr(task_output, "name", None)
+                    or f"task_{len(self.task_timings) + 1}"
+                )
+                with self._callback_lock:
+                    task_started = self._task_started_at(name)
+                    self.task_timings[name] = round(now - self._started_at, 3)
+                    self._task_finished[name] = now
+                duration = now - task_started
+                CREW_TASK_SECONDS.observe(duration, task=name)
+                end = time.time()
+                self.trace.add_span(
+                    name,
+                    KIND_TASK,
+                    end - duration,
+                    end,
+                    span_id=self._task_span_ids.get(name),
+                )
+                task_cb(task_output)
+
+            # 从预构建的模板复制出本次请求的实例
+            template = get_crew_template(self.parallel, self.data_mode)
+            self.task_names = template.task_names
+            crew = template.instantiate(
+                step_callback=traced_step_cb,  # Step 级别回调
+                task_callback=timed_task_cb,  # Task 级别回调（更可靠）
+                report_context=report_context,
+            )
+            self.task_inputs = {
+                task.name: {
+                    "description": task.description,
+                    "context": [c.name for c in task.context]
+                    if isinstance(task.context, list)
+                    else [],
+                }
+                for task in crew.tasks
+            }
+            self._async_tasks = {
+                task.name for task in crew.tasks if task.async_execution
+            }
+            self._task_finished = {}
+            # 预先分配任务 span id，LLM / 工具事件按 task.id 挂到对应任务下
+            self._task_span_ids = {task.name: new_id() for task in crew.tasks}
+            for task in crew.tasks:
+                traces.bind_task(task.id, self.trace, self._task_span_ids[task.name])
+                recorder.track(task.id)
+
+        self._kickoff_thread = threading.get_ident()
+        self._step_marks = {}
+        self._started_at = time.perf_counter()
+        return crew
+
+    def _task_started_at(self, name: str) -> float:
+        """推算任务的开始时刻（需持有 _callback_lock）
+
+        异步任务在 kickoff 时一起启动；
+        同步任务要等此前所有任务（含异步任务）完成后才开始
+        """
+        if name in self._async_tasks:
+            return self._started_at
+        return max(self._task_finished.values(), default=self._started_at)
+
+    def _current_task(self) -> str:
+        """推算当前线程正在执行的任务，无法确定时返回 None
+
+        同步任务在 kickoff 线程中按顺序执行；异步任务各自在独立线程中执行，
+        只剩一个未完成的异步任务时才能确定归属
+        """
+        with self._callback_lock:
+            finished = set(self._task_finished)
+        if threading.get_ident() == self._kickoff_thread:
+            candidates = [
+                n
+                for n in self.task_names
+                if n not in self._async_tasks and n not in finished
+            ]
+            return candidates[0] if candidates else None
+        candidates = [
+            n for n in self.task_names if n in self._async_tasks and n not in finished
+        ]
+        return candidates[0] if len(candidates) == 1 else None
+
+    def _record_step(self, step_type: str):
+        """记录 Agent 一步的 span：从本线程上一步（或上一个任务完成）到现在"""
+        if self.trace is None:
+            return
+        now = time.time()
+        thread = threading.get_ident()
+        with self._callback_lock:
+            start = self._step_marks.get(thread, self.trace.root.start)
+            if thread == self._kickoff_thread and self._task_finished:
+                # 同步任务的第一步从上一个任务完成时开始
+                last_finished = max(self._task_finished.values())
+                start = max(start, now - (time.perf_counter() - last_finished))
+            self._step_marks[thread] = now
+        task = self._current_task()
+        parent_id = self._task_span_ids.get(task)
+        self.trace.add_span(step_type, KIND_STEP, start, now, parent_id)
+
+    def kickoff(self, step_callback=None, task_callback=None):
+        """构建并运行 crew，记录 kickoff 耗时、token 用量和整条链路
+
+        输入没有变化的任务直接复用上次的输出，只执行其余任务；全部可复用时不调用 LLM
+        """
+        install_event_hooks()
+        try:
+            crew = self.crew(step_callback=step_callback, task_callback=task_callback)
+            with self.trace.span("task_memo", KIND_BUILD):
+                reused = self._reuse_memoized(crew)
+        except Exception:
+            if self.trace is not None:
+                traces.finish(self.trace, "error")
+            raise
+        logger.info(
+            "开始运行 %s（%s 模式），执行 %s，复用 %s",
+            self.run_id,
+            self.data_mode,
+            [t.name for t in crew.tasks],
+            [t.name for t in reused],
         )
-        
-        return Crew(
-            agents=[
-                self.market_analyst(),
-                self.news_researcher(),
-                self.content_creator(),
+        status = "error"
+        try:
+            with use_trace(self.trace):
+                if crew.tasks:
+                    result = crew.kickoff()
+                else:
+                    result = CrewOutput(
+                        raw=reused[-1].output.raw,
+                        tasks_output=[t.output for t in reused],
+                    )
+            status = "ok"
+        finally:
+            CREW_KICKOFF_SECONDS.observe(
+                time.perf_counter() - self._started_at,
+                data_mode=self.data_mode,
+                status=status,
+            )
+            traces.finish(self.trace, status)
+            executed = list(crew.tasks)
+            if status == "ok":
+                self._save_memos(executed)
+            else:
+                for task in executed:
+                    recorder.pop(task.id)
+        usage = getattr(result, "token_usage", None)
+        for field, kind in TOKEN_KINDS.items():
+            count = getattr(usage, field, 0)
+            if count:
+                LLM_TOKENS.inc(count, kind=kind)
+        return result
+
+    def _upstream(self, task: Task) -> list[Task]:
+        """任务 prompt 中包含其输出的上游任务
+
+        未指定 context 时 crewai 会把之前的输出传给任务：同步任务拿到此前所有输出，
+        异步任务只拿到最近一个同步任务的输出
+        """
+        if isinstance(task.context, list):
+            return task.context
+        if not task.context:
+            return []
+        previous = self._memo_order[: self._memo_order.index(task)]
+        if task.async_execution:
+            return [t for t in previous if not t.async_execution][-1:]
+        return previous
+
+    def _memo_key(self, task: Task) -> str:
+        """任务输入中运行前即可确定的部分：任务配置、Agent 设定和上游任务的输出"""
+        agent = task.agent
+        return digest({
+            "task": task.name,
+            "description": task.description,
+            "expected_output": task.expected_output,
+            "agent": {
+                "role": agent.role,
+                "goal": agent.goal,
+                "backstory": agent.backstory,
+                "model": getattr(agent.llm, "model", None),
+            },
+            "context": [
+                [c.name, digest(c.output.raw if c.output else "")]
+                for c in self._upstream(task)
             ],
-            tasks=[task1, task2, task3],
-            verbose=True,
-            step_callback=step_cb,  # Step 级别回调
-            task_callback=task_cb,  # Task 级别回调（更可靠）
-        )
+        })
+
+    def _reuse_memoized(self, crew: Crew) -> list[Task]:
+        """按依赖顺序检查每个任务能否复用，把可复用的任务移出 crew，返回这些任务
+
+        上游任务需要重新执行时，下游任务的输入未知，也重新执行
+        """
+        self._memo_order = list(crew.tasks)
+        memo = get_task_memo()
+        if memo is None:
+            return []
+        rerun, reused = set(), []
+        for task in crew.tasks:
+            if any(c.name in rerun for c in self._upstream(task)):
+                rerun.add(task.name)
+                continue
+            entry = memo.get(task.name, self._memo_key(task))
+            if entry is None or not replay_matches(entry, _replay_tool):
+                rerun.add(task.name)
+                continue
+            task.output = TaskOutput(
+                name=task.name,
+                description=task.description,
+                expected_output=task.expected_output,
+                raw=entry.output,
+                agent=task.agent.role,
+            )
+            reused.append(task)
+        if not reused:
+            return []
+
+        reused_names = {task.name for task in reused}
+        for task in crew.tasks:
+            upstream = self._upstream(task)
+            # 复用的任务不再执行，显式指定 context，下游任务照样能拿到它们的输出
+            if task.name in rerun and any(c.name in reused_names for c in upstream):
+                task.context = upstream
+        for task in reused:
+            recorder.pop(task.id)
+            self.task_inputs[task.name]["reused"] = True
+            self.task_timings[task.name] = 0.0
+            with self._callback_lock:
+                self._task_finished[task.name] = time.perf_counter()
+                self.task_count += 1
+            now = time.time()
+            self.trace.add_span(
+                task.name,
+                KIND_TASK,
+                now,
+                now,
+                span_id=self._task_span_ids.get(task.name),
+                reused=True,
+            )
+            if self._has_progress_sink():
+                index = self.task_names.index(task.name) + 1
+                self._publish_progress(
+                    f"♻️ 任务 {index}/{len(self.task_names)} 输入未变化，"
+                    f"复用上次结果：{TASK_LABELS[task.name]}"
+                )
+        crew.tasks[:] = [task for task in crew.tasks if task.name in rerun]
+        return reused
+
+    def _save_memos(self, tasks: list[Task]):
+        """保存本次执行的任务输出；失败不影响本次运行"""
+        memo = get_task_memo()
+        for task in tasks:
+            tool_calls = recorder.pop(task.id)
+            if memo is None or task.output is None:
+                continue
+            try:
+                memo.put(task.name, self._memo_key(task), task.output.raw, tool_calls)
+            except Exception as e:
+                logger.warning("保存任务记忆失败 (%s): %s", task.name, e)
 
+    def run_metadata(self, result) -> dict:
+        """kickoff 完成后的运行记录：任务输入、耗时和 token 用量"""
+        usage = getattr(result, "token_usage", None)
+        if hasattr(usage, "model_dump"):
+            usage = usage.model_dump()
+        timings = dict(self.task_timings)
+        if self._started_at is not None:
+            timings["total"] = round(time.perf_counter() - self._started_at, 3)
+        return {
+            "data_mode": self.data_mode,
+            "market_snapshot": self.market_snapshot,
+            "constituents": self.constituents,
+            "indicators": self.indicators,
+            "task_inputs": self.task_inputs,
+            "timings": timings,
+            "token_usage": usage or {},
+        }
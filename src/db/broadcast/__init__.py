@@ -0,0 +1 @@
+# broadcast package
\ No newline at end of file
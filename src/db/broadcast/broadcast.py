@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+
+# 批次状态
+STATUS_GENERATING = "generating"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+# 投递状态
+DELIVERY_PENDING = "pending"
+DELIVERY_SENT = "sent"
+DELIVERY_FAILED = "failed"
+DELIVERY_BLOCKED = "blocked"  # 用户已阻止 Bot，不再重试
+
+@dataclass
+class Broadcast:
+    id: int
+    slot_key: str
+    report: str = None
+    status: str = STATUS_GENERATING
@@ -0,0 +1,21 @@
+-- 定时推送批次：每个 cron 时段只生成一次报告
+CREATE TABLE broadcast (
+    id BIGSERIAL PRIMARY KEY,
+    slot_key TEXT NOT NULL UNIQUE,
+    report TEXT,
+    status TEXT NOT NULL DEFAULT 'generating',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- 每个用户的投递状态，重试时只重发未成功的用户
+CREATE TABLE broadcast_delivery (
+    broadcast_id BIGINT NOT NULL REFERENCES broadcast (id) ON DELETE CASCADE,
+    tg_user_id BIGINT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    sent_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (broadcast_id, tg_user_id)
+);
@@ -0,0 +1,103 @@
+from ..config import get_conn
+from .broadcast import (
+    DELIVERY_FAILED,
+    DELIVERY_PENDING,
+    DELIVERY_SENT,
+    STATUS_GENERATING,
+    Broadcast,
+)
+
+
+class BroadcastRepo:
+
+    @staticmethod
+    def get_or_create(slot_key: str) -> Broadcast:
+        """按时段获取批次，不存在则创建"""
+        sql = """
+        INSERT INTO broadcast (slot_key, status) VALUES (%s, %s)
+        ON CONFLICT (slot_key) DO UPDATE SET slot_key = EXCLUDED.slot_key
+        RETURNING id, slot_key, report, status;
+        """
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, (slot_key, STATUS_GENERATING))
+                row = cur.fetchone()
+            conn.commit()
+        return Broadcast(*row)
+
+    @staticmethod
+    def set_status(broadcast_id: int, status: str, report: str = None):
+        sql = """
+        UPDATE broadcast
+        SET status = %s, report = COALESCE(%s, report), updated_at = now()
+        WHERE id = %s;
+        """
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, (status, report, broadcast_id))
+            conn.commit()
+
+    @staticmethod
+    def add_deliveries(broadcast_id: int, tg_user_ids: list[int]):
+        """为订阅用户登记投递记录，已存在的记录保持原状态"""
+        sql = """
+        INSERT INTO broadcast_delivery (broadcast_id, tg_user_id, status)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (broadcast_id, tg_user_id) DO NOTHING;
+        """
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.executemany(sql, [
+                    (broadcast_id, tg_user_id, DELIVERY_PENDING)
+                    for tg_user_id in tg_user_ids
+                ])
+            conn.commit()
+
+    @staticmethod
+    def get_undelivered(broadcast_id: int, max_attempts: int) -> list[int]:
+        """获取尚未投递成功且未超过重试次数的用户"""
+        sql = """
+        SELECT tg_user_id FROM broadcast_delivery
+        WHERE broadcast_id = %s AND status IN (%s, %s) AND attempts < %s
+        ORDER BY tg_user_id;
+        """
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    sql, (broadcast_id, DELIVERY_PENDING, DELIVERY_FAILED, max_attempts)
+                )
+                return [row[0] for row in cur.fetchall()]
+
+    @staticmethod
+    def mark_deliveries(broadcast_id: int, results: list[tuple]):
+        """批量更新投递状态，results 为 (tg_user_id, status, error) 列表"""
+        sql = """
+        UPDATE broadcast_delivery
+        SET status = %s,
+            attempts = attempts + 1,
+            last_error = %s,
+            sent_at = CASE WHEN %s = %s THEN now() ELSE sent_at END,
+            updated_at = now()
+        WHERE broadcast_id = %s AND tg_user_id = %s;
+        """
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.executemany(
+                    sql,
+                    [
+                        (status, error, status, DELIVERY_SENT, broadcast_id, tg_user_id)
+                        for tg_user_id, status, error in results
+                    ],
+                )
+            conn.commit()
+
+    @staticmethod
+    def count_by_status(broadcast_id: int) -> dict:
+        sql = """
+        SELECT status, COUNT(*) FROM broadcast_delivery
+        WHERE broadcast_id = %s GROUP BY status;
+        """
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, (broadcast_id,))
+                return dict(cur.fetchall())
@@ -0,0 +1,37 @@
+from .broadcast import STATUS_FAILED, STATUS_READY, Broadcast
+from .broadcast_repo import BroadcastRepo
+
+
+class BroadcastService:
+
+    @staticmethod
+    def get_or_create(slot_key: str) -> Broadcast:
+        return BroadcastRepo.get_or_create(slot_key)
+
+    @staticmethod
+    def save_report(broadcast: Broadcast, report: str):
+        BroadcastRepo.set_status(broadcast.id, STATUS_READY, report)
+        broadcast.report = report
+        broadcast.status = STATUS_READY
+
+    @staticmethod
+    def mark_failed(broadcast: Broadcast):
+        BroadcastRepo.set_status(broadcast.id, STATUS_FAILED)
+        broadcast.status = STATUS_FAILED
+
+    @staticmethod
+    def enqueue_users(broadcast: Broadcast, tg_user_ids: list[int]):
+        BroadcastRepo.add_deliveries(broadcast.id, tg_user_ids)
+
+    @staticmethod
+    def list_undelivered(broadcast: Broadcast, max_attempts: int) -> list[int]:
+        return BroadcastRepo.get_undelivered(broadcast.id, max_attempts)
+
+    @staticmethod
+    def record_deliveries(broadcast: Broadcast, results: list[tuple]):
+        if results:
+            BroadcastRepo.mark_deliveries(broadcast.id, results)
+
+    @staticmethod
+    def delivery_stats(broadcast: Broadcast) -> dict:
+        return BroadcastRepo.count_by_status(broadcast.id)
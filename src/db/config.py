@@ -1,8 +1,13 @@
+import asyncio
 import os
-
-import psycopg
+import threading
+from contextlib import asynccontextmanager, contextmanager
 
 from dotenv import load_dotenv
+from psycopg import AsyncCursor, Cursor
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from src.utils.metrics import DB_QUERY_SECONDS
 
 load_dotenv()
 
@@ -14,11 +19,166 @@ DB_CONFIG = {
     "password": os.getenv("PG_PWD"),
 }
 
+# 连接池配置
+POOL_CONFIG = {
+    "min_size": int(os.getenv("PG_POOL_MIN_SIZE", 1)),
+    "max_size": int(os.getenv("PG_POOL_MAX_SIZE", 10)),
+    # 空闲连接超过该秒数会被关闭（不低于 min_size）
+    "max_idle": float(os.getenv("PG_POOL_MAX_IDLE", 300)),
+    # 获取连接的最长等待秒数
+    "timeout": float(os.getenv("PG_POOL_TIMEOUT", 10)),
+}
+
+# 指标里区分的语句类型，其余记为 other
+STATEMENT_KINDS = ("select", "insert", "update", "delete", "with")
+
+
+def statement_kind(query) -> str:
+    """SQL 的第一个关键字（小写），用作耗时指标的标签"""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    if not isinstance(query, str):
+        return "other"
+    words = query.split(None, 1)
+    kind = words[0].lower() if words else ""
+    return kind if kind in STATEMENT_KINDS else "other"
+
+
+class TimedCursor(Cursor):
+    """记录每条语句执行耗时的游标"""
+
+    def execute(self, query, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(pool="sync", statement=statement_kind(query)):
+            return super().execute(query, *args, **kwargs)
+
+    def executemany(self, query, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(pool="sync", statement=statement_kind(query)):
+            return super().executemany(query, *args, **kwargs)
+
+
+class AsyncTimedCursor(AsyncCursor):
+    """TimedCursor 的异步版本"""
+
+    async def execute(self, query, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(pool="async", statement=statement_kind(query)):
+            return await super().execute(query, *args, **kwargs)
+
+    async def executemany(self, query, *args, **kwargs):
+        with DB_QUERY_SECONDS.time(pool="async", statement=statement_kind(query)):
+            return await super().executemany(query, *args, **kwargs)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_async_pool = None
+_async_pool_lock = None
+
+def get_pool() -> ConnectionPool:
+    """获取进程级连接池（首次调用时创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    kwargs={**DB_CONFIG, "cursor_factory": TimedCursor},
+                    min_size=POOL_CONFIG["min_size"],
+                    max_size=POOL_CONFIG["max_size"],
+                    max_idle=POOL_CONFIG["max_idle"],
+                    timeout=POOL_CONFIG["timeout"],
+                    # 借出前检查连接是否可用，自动替换断开的连接
+                    check=ConnectionPool.check_connection,
+                    name="qqq-agent",
+                    open=True,
+                )
+    return _pool
+
+@contextmanager
 def get_conn():
-    return psycopg.connect(
-        host=DB_CONFIG.get("host"),
-        port=DB_CONFIG.get("port"),
-        dbname=DB_CONFIG.get("dbname"),
-        user=DB_CONFIG.get("user"),
-        password=DB_CONFIG.get("password"),
-    )
\ No newline at end of file
+    """从连接池借出一个连接，退出时自动提交（异常时回滚）并归还
+
+    用法：
+        with get_conn() as conn:
+            ...
+    """
+    with get_pool().connection() as conn:
+        yield conn
+
+async def get_async_pool() -> AsyncConnectionPool:
+    """获取异步连接池（供 webhook 等事件循环内的代码使用）"""
+    global _async_pool, _async_pool_lock
+    if _async_pool is None:
+        if _async_pool_lock is None:
+            _async_pool_lock = asyncio.Lock()
+        async with _async_pool_lock:
+            if _async_pool is None:
+                pool = AsyncConnectionPool(
+                    kwargs={**DB_CONFIG, "cursor_factory": AsyncTimedCursor},
+                    min_size=POOL_CONFIG["min_size"],
+                    max_size=POOL_CONFIG["max_size"],
+                    max_idle=POOL_CONFIG["max_idle"],
+                    timeout=POOL_CONFIG["timeout"],
+                    check=AsyncConnectionPool.check_connection,
+                    name="qqq-agent-async",
+                    open=False,
+                )
+                await pool.open()
+                _async_pool = pool
+    return _async_pool
+
+@asynccontextmanager
+async def get_async_conn():
+    """异步版本的 get_conn()
+
+    用法：
+        async with get_async_conn() as conn:
+            ...
+    """
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+def _summarize_stats(stats: dict) -> dict:
+    pool_size = stats.get("pool_size", 0)
+    available = stats.get("pool_available", 0)
+    queued = stats.get("requests_queued", 0)
+    wait_ms = stats.get("requests_wait_ms", 0)
+    return {
+        "min_size": stats.get("pool_min"),
+        "max_size": stats.get("pool_max"),
+        "size": pool_size,
+        "in_use": pool_size - available,
+        "idle": available,
+        "waiting": stats.get("requests_waiting", 0),
+        "requests": stats.get("requests_num", 0),
+        "queued": queued,
+        "wait_ms_total": wait_ms,
+        "wait_ms_avg": round(wait_ms / queued, 1) if queued else 0.0,
+        "errors": stats.get("requests_errors", 0),
+    }
+
+def get_pool_stats() -> dict:
+    """连接池统计：使用中 / 空闲 / 等待数和等待耗时"""
+    if _pool is None:
+        return {"status": "not_started"}
+    return _summarize_stats(_pool.get_stats())
+
+def get_async_pool_stats() -> dict:
+    """异步连接池统计，字段同 get_pool_stats()"""
+    if _async_pool is None:
+        return {"status": "not_started"}
+    return _summarize_stats(_async_pool.get_stats())
+
+def close_pool():
+    """关闭连接池（应用退出时调用）"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+async def close_async_pool():
+    """关闭异步连接池"""
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
@@ -0,0 +1 @@
+# report package
\ No newline at end of file
@@ -0,0 +1,21 @@
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+# 报告时段
+SLOT_MORNING = "morning"
+SLOT_EVENING = "evening"
+SLOT_ON_DEMAND = "on_demand"  # /start_summary 手动触发
+
+@dataclass
+class Report:
+    trade_date: date
+    slot: str
+    content: str
+    data_mode: str = None
+    market_snapshot: dict = None
+    task_inputs: dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)
+    token_usage: dict = field(default_factory=dict)
+    id: int = None
+    version: int = None
+    created_at: datetime = None
@@ -0,0 +1,18 @@
+-- 生成过的报告：同一交易日、同一时段可以有多个版本
+CREATE TABLE report (
+    id BIGSERIAL PRIMARY KEY,
+    trade_date DATE NOT NULL,
+    slot TEXT NOT NULL,
+    version INT NOT NULL,
+    content TEXT NOT NULL,
+    data_mode TEXT,
+    market_snapshot JSONB,
+    task_inputs JSONB,
+    timings JSONB,
+    token_usage JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    UNIQUE (trade_date, slot, version)
+);
+
+-- 按交易日查询最新报告（/report YYYY-MM-DD）
+CREATE INDEX idx_report_trade_date ON report (trade_date, created_at DESC);
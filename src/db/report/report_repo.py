@@ -0,0 +1,101 @@
+from datetime import date
+
+from psycopg.types.json import Jsonb
+
+from ..config import get_async_conn, get_conn
+from .report import Report
+
+# 版本号在同一交易日、同一时段内递增；并发写入冲突时由唯一约束兜底重试
+INSERT_SQL = """
+        INSERT INTO report (
+            trade_date, slot, version, content, data_mode,
+            market_snapshot, task_inputs, timings, token_usage
+        )
+        SELECT %s, %s, COALESCE(MAX(version), 0) + 1, %s, %s, %s, %s, %s, %s
+        FROM report WHERE trade_date = %s AND slot = %s
+        RETURNING id, version, created_at;
+        """
+
+COLUMNS = """
+        id, trade_date, slot, version, content, data_mode,
+        market_snapshot, task_inputs, timings, token_usage, created_at
+        """
+
+LATEST_SQL = f"""
+        SELECT {COLUMNS} FROM report
+        WHERE trade_date = %s
+        ORDER BY created_at DESC
+        LIMIT 1;
+        """
+
+def _row_to_report(row) -> Report:
+    (id_, trade_date, slot, version, content, data_mode,
+     market_snapshot, task_inputs, timings, token_usage, created_at) = row
+    return Report(
+        trade_date=trade_date,
+        slot=slot,
+        content=content,
+        data_mode=data_mode,
+        market_snapshot=market_snapshot,
+        task_inputs=task_inputs or {},
+        timings=timings or {},
+        token_usage=token_usage or {},
+        id=id_,
+        version=version,
+        created_at=created_at,
+    )
+
+class ReportRepo:
+
+    @staticmethod
+    def insert(report: Report, retries: int = 3) -> Report:
+        """写入新版本，返回带 id 和版本号的报告"""
+        from psycopg.errors import UniqueViolation
+
+        params = (
+            report.trade_date, report.slot, report.content, report.data_mode,
+            Jsonb(report.market_snapshot), Jsonb(report.task_inputs),
+            Jsonb(report.timings), Jsonb(report.token_usage),
+            report.trade_date, report.slot,
+        )
+        for attempt in range(retries):
+            try:
+                with get_conn() as conn:
+                    with conn.cursor() as cur:
+                        cur.execute(INSERT_SQL, params)
+                        report.id, report.version, report.created_at = cur.fetchone()
+                    conn.commit()
+                return report
+            except UniqueViolation:
+                # 另一个进程抢先写入了同一版本号
+                if attempt == retries - 1:
+                    raise
+
+    @staticmethod
+    def get_latest(trade_date: date) -> Report:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(LATEST_SQL, (trade_date,))
+                row = cur.fetchone()
+        return _row_to_report(row) if row else None
+
+    @staticmethod
+    async def aget_latest(trade_date: date) -> Report:
+        async with get_async_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(LATEST_SQL, (trade_date,))
+                row = await cur.fetchone()
+        return _row_to_report(row) if row else None
+
+    @staticmethod
+    def list_range(start: date, end: date, slot: str = None) -> list[Report]:
+        """导出某段时间的全部版本（用于离线评估提示词改动）"""
+        sql = f"""
+        SELECT {COLUMNS} FROM report
+        WHERE trade_date BETWEEN %s AND %s AND (%s::text IS NULL OR slot = %s)
+        ORDER BY trade_date, slot, version;
+        """
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, (start, end, slot, slot))
+                return [_row_to_report(row) for row in cur.fetchall()]
@@ -0,0 +1,23 @@
+from datetime import date
+
+from .report import Report
+from .report_repo import ReportRepo
+
+
+class ReportService:
+
+    @staticmethod
+    def save(report: Report) -> Report:
+        return ReportRepo.insert(report)
+
+    @staticmethod
+    def get_latest(trade_date: date = None) -> Report:
+        return ReportRepo.get_latest(trade_date or date.today())
+
+    @staticmethod
+    async def aget_latest(trade_date: date = None) -> Report:
+        return await ReportRepo.aget_latest(trade_date or date.today())
+
+    @staticmethod
+    def list_range(start: date, end: date, slot: str = None) -> list[Report]:
+        return ReportRepo.list_range(start, end, slot)
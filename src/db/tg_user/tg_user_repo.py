@@ -1,11 +1,7 @@
 from .tg_user import TgUser
-from ..config import get_conn
+from ..config import get_async_conn, get_conn
 
-class TgUserRepo:
-
-    @staticmethod
-    def upsert(user: TgUser):
-        sql = """
+UPSERT_SQL = """
         INSERT INTO tg_user (
             tg_user_id, username, first_name, last_name, language_code, is_subscribed
         ) VALUES (%s, %s, %s, %s, %s, %s)
@@ -18,22 +14,84 @@ class TgUserRepo:
             is_subscribed = EXCLUDED.is_subscribed,
             updated_at = now();
         """
-        conn = get_conn()
-        with conn.cursor() as cur:
-            cur.execute(sql, (
-                user.tg_user_id,
-                user.username,
-                user.first_name,
-                user.last_name,
-                user.language_code,
-                user.is_subscribed
-            ))
+
+SUBSCRIBED_SQL = (
+    "SELECT tg_user_id, username, first_name, last_name "
+    "FROM tg_user WHERE is_subscribed = TRUE;"
+)
+
+def _upsert_params(user: TgUser) -> tuple:
+    return (
+        user.tg_user_id,
+        user.username,
+        user.first_name,
+        user.last_name,
+        user.language_code,
+        user.is_subscribed
+    )
+
+class TgUserRepo:
+
+    @staticmethod
+    def upsert(user: TgUser):
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(UPSERT_SQL, _upsert_params(user))
             conn.commit()
-    
+
+    @staticmethod
+    async def aupsert(user: TgUser):
+        async with get_async_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(UPSERT_SQL, _upsert_params(user))
+            await conn.commit()
+
+    @staticmethod
+    def upsert_many(users: list[TgUser], chunk_size: int = 1000):
+        """批量 upsert：多行 INSERT ... ON CONFLICT，资料未变化的行不做更新"""
+        if not users:
+            return
+        columns = (
+            "(tg_user_id, username, first_name, last_name, "
+            "language_code, is_subscribed)"
+        )
+        for start in range(0, len(users), chunk_size):
+            chunk = users[start:start + chunk_size]
+            values = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(chunk))
+            sql = f"""
+            INSERT INTO tg_user {columns} VALUES {values}
+            ON CONFLICT (tg_user_id)
+            DO UPDATE SET
+                username = EXCLUDED.username,
+                first_name = EXCLUDED.first_name,
+                last_name = EXCLUDED.last_name,
+                language_code = EXCLUDED.language_code,
+                is_subscribed = EXCLUDED.is_subscribed,
+                updated_at = now()
+            WHERE (tg_user.username, tg_user.first_name, tg_user.last_name,
+                   tg_user.language_code, tg_user.is_subscribed)
+                IS DISTINCT FROM
+                  (EXCLUDED.username, EXCLUDED.first_name, EXCLUDED.last_name,
+                   EXCLUDED.language_code, EXCLUDED.is_subscribed);
+            """
+            params = []
+            for user in chunk:
+                params.extend(_upsert_params(user))
+            with get_conn() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, params)
+                conn.commit()
+
     @staticmethod
     def get_subscribed_users():
-        sql = "SELECT tg_user_id, username, first_name, last_name FROM tg_user WHERE is_subscribed = TRUE;"
-        conn = get_conn()
-        with conn.cursor() as cur:
-            cur.execute(sql)
-            return cur.fetchall()
\ No newline at end of file
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(SUBSCRIBED_SQL)
+                return cur.fetchall()
+
+    @staticmethod
+    async def aget_subscribed_users():
+        async with get_async_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(SUBSCRIBED_SQL)
+                return await cur.fetchall()
@@ -0,0 +1,174 @@
+"""用户信息写缓冲（write-behind）
+
+webhook 每收到一条消息都会刷新一次用户资料，绝大多数是没有变化的重复写入。
+这里把写入先放进内存，按 tg_user_id 去重，再由后台线程按时间或数量批量落库。
+"""
+import asyncio
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+from src.utils.logger import get_logger
+
+from .tg_user import TgUser
+from .tg_user_repo import TgUserRepo
+
+logger = get_logger(__name__)
+
+# 刷盘间隔（秒）与批量阈值
+FLUSH_INTERVAL = float(os.getenv("USER_BUFFER_FLUSH_INTERVAL", 5))
+FLUSH_SIZE = int(os.getenv("USER_BUFFER_FLUSH_SIZE", 500))
+# 记住最近写入过的用户资料，用于跳过无变化的刷新
+SEEN_CAPACITY = int(os.getenv("USER_BUFFER_SEEN_CAPACITY", 50000))
+
+
+def _snapshot(user: TgUser) -> tuple:
+    return (
+        user.username,
+        user.first_name,
+        user.last_name,
+        user.language_code,
+        user.is_subscribed,
+    )
+
+
+class UserUpsertBuffer:
+
+    def __init__(
+        self,
+        flush_interval: float = FLUSH_INTERVAL,
+        flush_size: int = FLUSH_SIZE,
+        seen_capacity: int = SEEN_CAPACITY,
+    ):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.seen_capacity = seen_capacity
+        self._pending = {}
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        # 保证落库与直写（订阅/取消订阅）不会交错
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="tg-user-buffer", daemon=True
+        )
+        self._thread.start()
+
+    def add(self, user: TgUser) -> bool:
+        """放入缓冲区，资料与上次写入完全相同时直接跳过，返回是否入队"""
+        snapshot = _snapshot(user)
+        with self._lock:
+            if self._seen.get(user.tg_user_id) == snapshot:
+                self._seen.move_to_end(user.tg_user_id)
+                return False
+            self._pending[user.tg_user_id] = user
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self._wakeup.set()
+        return True
+
+    @contextmanager
+    def write_through(self, user: TgUser):
+        """直写数据库时使用：丢弃该用户的待写入记录，写完后更新去重缓存"""
+        with self._write_lock:
+            with self._lock:
+                self._pending.pop(user.tg_user_id, None)
+            yield
+            with self._lock:
+                self._remember(user)
+
+    @asynccontextmanager
+    async def awrite_through(self, user: TgUser):
+        """write_through() 的异步版本，等锁时不阻塞事件循环"""
+        await self._aacquire_write_lock()
+        try:
+            with self._lock:
+                self._pending.pop(user.tg_user_id, None)
+            yield
+            with self._lock:
+                self._remember(user)
+        finally:
+            self._write_lock.release()
+
+    async def _aacquire_write_lock(self):
+        """在线程池中等待写锁；等待期间被取消时，线程拿到锁后立即释放，避免锁泄漏"""
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self._write_lock.acquire))
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(self._release_acquired)
+            raise
+
+    def _release_acquired(self, future: asyncio.Future):
+        if not future.cancelled() and future.exception() is None:
+            self._write_lock.release()
+
+    def _remember(self, user: TgUser):
+        self._seen[user.tg_user_id] = _snapshot(user)
+        self._seen.move_to_end(user.tg_user_id)
+        while len(self._seen) > self.seen_capacity:
+            self._seen.popitem(last=False)
+
+    def flush(self) -> int:
+        """把缓冲区写入数据库，返回写入条数"""
+        with self._write_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+            users = list(batch.values())
+            try:
+                TgUserRepo.upsert_many(users)
+            except Exception:
+                # 写入失败时放回缓冲区，已有更新的记录优先
+                with self._lock:
+                    for tg_user_id, user in batch.items():
+                        self._pending.setdefault(tg_user_id, user)
+                raise
+            with self._lock:
+                for user in users:
+                    self._remember(user)
+        return len(users)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                written = self.flush()
+                if written:
+                    logger.debug("批量写入用户信息: %d 条", written)
+            except Exception as e:
+                logger.error("批量写入用户信息失败: %s", e)
+
+    def close(self):
+        """停止后台线程并把剩余数据全部落库"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+        written = self.flush()
+        logger.info("用户写缓冲已关闭，最终写入 %d 条", written)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_user_buffer() -> UserUpsertBuffer:
+    """获取全局写缓冲实例"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = UserUpsertBuffer()
+                atexit.register(_buffer.close)
+    return _buffer
@@ -1,19 +1,31 @@
 from .tg_user import TgUser
 from .tg_user_repo import TgUserRepo
+from .user_buffer import get_user_buffer
 
 class UserService:
 
     @staticmethod
-    def subscribe_user(user_data: dict):
-        user = TgUser(
+    def _from_update(user_data: dict, is_subscribed: bool) -> TgUser:
+        return TgUser(
             tg_user_id=user_data.get("id"),
             username=user_data.get("username"),
             first_name=user_data.get("first_name"),
             last_name=user_data.get("last_name"),
             language_code=user_data.get("language_code"),
-            is_subscribed=True
+            is_subscribed=is_subscribed
         )
-        TgUserRepo.upsert(user)
+
+    @staticmethod
+    def touch_user(user_data: dict) -> bool:
+        """记录与 Bot 互动的用户（自动订阅），写入缓冲区后由后台批量落库"""
+        user = UserService._from_update(user_data, is_subscribed=True)
+        return get_user_buffer().add(user)
+
+    @staticmethod
+    def subscribe_user(user_data: dict):
+        user = UserService._from_update(user_data, is_subscribed=True)
+        with get_user_buffer().write_through(user):
+            TgUserRepo.upsert(user)
     
     @staticmethod
     def unsubscribe_user(user_data: dict):
@@ -21,8 +33,28 @@ class UserService:
             tg_user_id=user_data.get("id"),
             is_subscribed=False
         )
-        TgUserRepo.upsert(user)
+        with get_user_buffer().write_through(user):
+            TgUserRepo.upsert(user)
+
+    @staticmethod
+    async def asubscribe_user(user_data: dict):
+        user = UserService._from_update(user_data, is_subscribed=True)
+        async with get_user_buffer().awrite_through(user):
+            await TgUserRepo.aupsert(user)
+
+    @staticmethod
+    async def aunsubscribe_user(user_data: dict):
+        user = TgUser(
+            tg_user_id=user_data.get("id"),
+            is_subscribed=False
+        )
+        async with get_user_buffer().awrite_through(user):
+            await TgUserRepo.aupsert(user)
 
     @staticmethod
     def list_subscribed_users():
-        return TgUserRepo.get_subscribed_users()
\ No newline at end of file
+        return TgUserRepo.get_subscribed_users()
+
+    @staticmethod
+    async def alist_subscribed_users():
+        return await TgUserRepo.aget_subscribed_users()
@@ -0,0 +1,91 @@
+"""Step callback 日志开销微基准：每个 step 的耗时
+
+对比改造前（每个 step 多次 print，并把 step_output.__dict__ 整个转成字符串）
+与改造后（分级日志 + 惰性格式化，INFO 级别下不做调试字符串拼接）。
+两边都把输出丢到 /dev/null，只比较回调本身的开销，不会调用 LLM。
+
+运行: uv run python -m src.test.bench_callback_logging
+"""
+import contextlib
+import os
+import time
+
+from src.crew import NasdaqSummaryCrew
+from src.utils.logger import setup_logging
+
+_devnull = open(os.devnull, "w", encoding="utf-8")
+setup_logging(level="INFO", stream=_devnull)
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+STEPS = 5000
+
+
+class AgentAction:
+    """模拟 crewai 的 AgentAction，带一段较长的 LLM 输出"""
+
+    def __init__(self, i: int):
+        self.thought = "分析纳指走势。" * 200
+        self.tool = "search_news_tool"
+        self.tool_input = {"query": f"Nasdaq 100 news {i}"}
+        self.text = "Thought: " + "x" * 20000
+        self.log = f"step {i}: " + "我需要先获取 QQQ 的最新价格... " * 50
+        self.result = "y" * 5000
+
+
+def legacy_callback(publish):
+    """复刻改造前的 step callback（去掉网络请求和 1 秒限流）"""
+    count = [0]
+
+    def callback(step_output):
+        count[0] += 1
+        print(f"\n🔔 [回调 #{count[0]}] Step callback 触发！")
+        step_type = type(step_output).__name__
+        print(f"\n📊 Step Callback 触发 - 类型: {step_type}")
+        if hasattr(step_output, "__dict__"):
+            print(f"   属性: {step_output.__dict__}")
+        tool = getattr(step_output, "tool", "")
+        tool_input = getattr(step_output, "tool_input", "")
+        log = getattr(step_output, "log", "")
+        parts = [f"🔧 调用工具: {tool}"]
+        input_preview = (
+            str(tool_input)[:150] + "..."
+            if len(str(tool_input)) > 150
+            else str(tool_input)
+        )
+        parts.append(f"📥 输入: {input_preview}")
+        parts.append(f"💭 思考: {log[:200] + '...' if len(log) > 200 else log}")
+        progress_text = "\n\n".join(parts)
+        print(f"   📤 准备更新 Telegram 消息: {progress_text[:100]}...")
+        publish(progress_text)
+
+    return callback
+
+
+def measure(name: str, callback, steps) -> float:
+    start = time.perf_counter()
+    for step in steps:
+        callback(step)
+    elapsed = (time.perf_counter() - start) / len(steps)
+    print(f"   {name}: {elapsed * 1e6:8.1f} µs/step")
+    return elapsed
+
+
+def bench():
+    steps = [AgentAction(i) for i in range(STEPS)]
+    published = []
+
+    print(f"📊 Step callback 开销（{STEPS} 个 step 平均）")
+    with contextlib.redirect_stdout(_devnull):
+        legacy = legacy_callback(published.append)
+        legacy_time = measure("改造前", legacy, steps)
+    current = NasdaqSummaryCrew(on_progress=published.append)._create_step_callback()
+    current_time = measure("分级日志", current, steps)
+    print(f"   提升: {legacy_time / current_time:.1f}x")
+
+    # 两种实现给用户的进度内容一致
+    assert published[0] == published[STEPS]
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,102 @@
+"""Crew 构建微基准：每次请求的构建耗时与内存分配
+
+对比改造前（每次解析 YAML、每个 Agent 构建两次、为 context 额外构建任务副本）
+与改造后（模板只构建一次，每次请求 Crew.copy()）。不会调用 LLM。
+
+运行: uv run python -m src.test.bench_crew_build
+"""
+import os
+import time
+import tracemalloc
+
+import yaml
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+from crewai import Agent, Crew, Task
+
+from src.crew import (
+    AGENT_CONFIG_PATH,
+    TASK_CONFIG_PATH,
+    NasdaqSummaryCrew,
+    get_crew_template,
+)
+from src.tools.finance_tool import get_nasdaq_data
+from src.tools.search_tool import search_news_tool
+
+ROUNDS = 20
+
+
+def build_legacy() -> Crew:
+    """复刻改造前的构建方式"""
+    with open(AGENT_CONFIG_PATH, "r", encoding="utf-8") as f:
+        agent_config = yaml.safe_load(f)
+    with open(TASK_CONFIG_PATH, "r", encoding="utf-8") as f:
+        task_config = yaml.safe_load(f)
+
+    def agents():
+        return (
+            Agent(
+                config=agent_config["market_analyst"],
+                tools=[get_nasdaq_data],
+                verbose=True,
+            ),
+            Agent(
+                config=agent_config["news_researcher"],
+                tools=[search_news_tool],
+                verbose=True,
+            ),
+            Agent(config=agent_config["content_creator"], tools=[], verbose=True),
+        )
+
+    analyst, researcher, creator = agents()
+    task1 = Task(agent=analyst, **_task_kwargs(task_config["fetch_and_analyze_data"]))
+    task2 = Task(agent=researcher, **_task_kwargs(task_config["research_key_news"]))
+    task3 = Task(
+        agent=creator,
+        context=[task1, task2],
+        **_task_kwargs(task_config["write_final_report"]),
+    )
+    return Crew(agents=list(agents()), tasks=[task1, task2, task3], verbose=True)
+
+
+def _task_kwargs(config: dict) -> dict:
+    return {
+        "description": config["description"],
+        "expected_output": config["expected_output"],
+    }
+
+
+def build_template() -> Crew:
+    # 与改造前保持同样的三个任务，快速模式会额外拉取行情
+    return NasdaqSummaryCrew(data_mode="agent").crew()
+
+
+def measure(name: str, build):
+    build()  # 预热（模板在这里构建）
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        build()
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"   {name}: {elapsed * 1000:8.2f} ms/次，峰值分配 {peak / 1024:8.1f} KiB")
+    return elapsed
+
+
+def bench():
+    print(f"📊 Crew 构建（{ROUNDS} 次平均）")
+    legacy = measure("改造前", build_legacy)
+    template = measure("模板复制", build_template)
+    print(f"   提升: {legacy / template:.1f}x")
+
+    # 模板实例之间互不共享任务状态
+    crew_a, crew_b = build_template(), build_template()
+    assert crew_a.tasks[0] is not crew_b.tasks[0]
+    assert crew_a.tasks[2].context[0] is crew_a.tasks[0]
+    assert get_crew_template(data_mode="agent") is get_crew_template(data_mode="agent")
+
+
+if __name__ == "__main__":
+    bench()
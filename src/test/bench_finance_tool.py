@@ -0,0 +1,64 @@
+"""nasdaq_data_tool 基准：冷启动、缓存命中和并发合并
+
+使用离线 fixture 数据源，并人为加入下载延迟模拟 yfinance 的网络往返，不依赖网络。
+
+运行: uv run python -m src.test.bench_finance_tool
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.tools.finance_tool import get_nasdaq_data
+from src.tools.market_data import FixtureFetcher, MarketDataCache, set_market_data
+from src.utils.cache import MemoryBackend
+
+# 模拟单次下载耗时（秒）
+FETCH_LATENCY = 0.3
+WARM_CALLS = 1000
+CONCURRENT_CALLERS = 20
+
+
+class SlowFixtureFetcher(FixtureFetcher):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def history(self, symbol, period, interval):
+        self.calls.append((symbol, period, interval))
+        time.sleep(FETCH_LATENCY)
+        return super().history(symbol, period, interval)
+
+
+def bench():
+    fetcher = SlowFixtureFetcher()
+    cache = MarketDataCache(fetcher, MemoryBackend())
+    set_market_data(cache)
+
+    # 并发冷启动：所有调用方共享一次下载
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CONCURRENT_CALLERS) as pool:
+        calls = range(CONCURRENT_CALLERS)
+        results = list(pool.map(lambda _: get_nasdaq_data.run(), calls))
+    cold = time.perf_counter() - start
+    assert len(set(results)) == 1
+
+    # 缓存命中
+    start = time.perf_counter()
+    for _ in range(WARM_CALLS):
+        get_nasdaq_data.run()
+    warm = (time.perf_counter() - start) / WARM_CALLS
+
+    print(
+        f"📊 {CONCURRENT_CALLERS} 个并发冷启动: {cold * 1000:.1f} ms，"
+        f"实际下载 {len(fetcher.calls)} 次（{len(set(fetcher.calls))} 种请求）"
+    )
+    print(
+        f"📊 缓存命中平均耗时: {warm * 1e6:.1f} µs/次"
+        f"（未缓存约 {FETCH_LATENCY * 1000:.0f} ms）"
+    )
+    print(f"📊 缓存统计: {cache.get_stats()}")
+    # 每种 (代码, period, interval) 只下载一次
+    assert len(fetcher.calls) == len(set(fetcher.calls))
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,87 @@
+"""webhook 并发压测：对比阻塞式处理与异步处理的吞吐量
+
+用 httpx.MockTransport 模拟 Telegram API 的往返延迟，不依赖网络和数据库。
+阻塞版复刻改造前的写法：async 路由里直接调用阻塞 I/O
+（这里用 time.sleep 代替 requests.post）。
+
+运行: uv run python -m src.test.bench_webhook
+"""
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+
+import main
+from src.db.tg_user import user_buffer
+from src.utils import tg_client
+
+# 模拟 Telegram 单次往返延迟（秒）与并发请求数
+TG_LATENCY = 0.2
+CONCURRENCY = 50
+
+
+def _update(i: int) -> dict:
+    return {
+        "update_id": i,
+        "message": {
+            "chat": {"id": 1000 + i},
+            "from": {"id": 1000 + i, "username": f"bench_{i}"},
+            "text": "/help",
+        },
+    }
+
+
+def build_legacy_app() -> FastAPI:
+    """改造前：async 路由中执行阻塞调用，会卡住整个事件循环"""
+    legacy = FastAPI()
+
+    @legacy.post("/webhook")
+    async def webhook(request: Request):
+        await request.json()
+        time.sleep(TG_LATENCY)  # 相当于 requests.post(TG_API_URL + "/sendMessage")
+        return {"status": "ok"}
+
+    return legacy
+
+
+async def _fake_telegram(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(TG_LATENCY)
+    return httpx.Response(200, json={"ok": True, "result": {"message_id": 1}})
+
+
+async def run_load(app: FastAPI, concurrency: int) -> float:
+    """并发发送 concurrency 个 webhook 请求，返回每秒处理数"""
+    transport = httpx.ASGITransport(app=app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://bench")
+    async with client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *[client.post("/webhook", json=_update(i)) for i in range(concurrency)]
+        )
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    return concurrency / elapsed
+
+
+async def bench():
+    # 压测不落库，也不访问真实 Telegram
+    user_buffer.TgUserRepo.upsert_many = lambda users: None
+    tg_client._client = httpx.AsyncClient(
+        base_url=tg_client.TG_API_URL,
+        transport=httpx.MockTransport(_fake_telegram),
+    )
+
+    before = await run_load(build_legacy_app(), CONCURRENCY)
+    after = await run_load(main.app, CONCURRENCY)
+
+    print(f"📊 并发 {CONCURRENCY}，Telegram 延迟 {TG_LATENCY * 1000:.0f}ms")
+    print(f"   改造前（阻塞）: {before:8.1f} req/s")
+    print(f"   改造后（异步）: {after:8.1f} req/s")
+    print(f"   提升: {after / before:.1f}x")
+
+    await tg_client.close_async_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(bench())
@@ -0,0 +1,99 @@
+"""测试缓存组件：single-flight 合并、磁盘后端和新闻搜索缓存"""
+import tempfile
+import threading
+import time
+
+import pytest
+
+from src.tools import search_tool
+from src.utils.cache import DiskBackend, SingleFlight, SWRCache
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = [0]
+    results = []
+
+    def slow():
+        calls[0] += 1
+        time.sleep(0.1)
+        return "value"
+
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+        for _ in range(10)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls[0] == 1
+    assert [value for value, _ in results] == ["value"] * 10
+    assert sum(1 for _, shared in results if shared) == 9
+
+
+def test_disk_backend_roundtrip():
+    with tempfile.TemporaryDirectory() as directory:
+        backend = DiskBackend(directory)
+        assert backend.get("missing") is None
+        backend.set("k", {"a": 1}, 123.0)
+        assert DiskBackend(directory).get("k") == ({"a": 1}, 123.0)
+        backend.delete("k")
+        assert backend.get("k") is None
+
+
+def test_swr_cache_serves_stale_and_refreshes():
+    cache = SWRCache(max_entries=2, ttl=0.05, stale_ttl=10)
+    version = [0]
+
+    def loader():
+        version[0] += 1
+        return version[0]
+
+    assert cache.get_or_load("k", loader) == 1
+    assert cache.get_or_load("k", loader) == 1
+
+    # 过期后先返回旧值，后台刷新完成后返回新值
+    time.sleep(0.06)
+    assert cache.get_or_load("k", loader) == 1
+    for _ in range(50):
+        if cache.get_or_load("k", loader) == 2:
+            break
+        time.sleep(0.01)
+    assert cache.get_or_load("k", loader) == 2
+
+    # LRU 淘汰最久未使用的条目
+    cache.get_or_load("a", lambda: "a")
+    cache.get_or_load("b", lambda: "b")
+    assert len(cache) == 2
+    assert cache.get_or_load("k", lambda: "reloaded") == "reloaded"
+
+    stats = cache.stats.snapshot()
+    print(f"📊 {stats}")
+    assert stats["stale"] >= 1
+
+
+def test_news_search_keeps_original_query(monkeypatch):
+    queries = []
+    monkeypatch.setattr(search_tool, "news_cache", SWRCache(ttl=60, stale_ttl=60))
+
+    def fake_search(query):
+        queries.append(query)
+        return f"results for {query}"
+
+    monkeypatch.setattr(search_tool, "_search", fake_search)
+
+    # 规范化的查询只用作缓存键，搜索时使用原始查询
+    first = search_tool.search_news_tool.run(query="QQQ ETF News?")
+    second = search_tool.search_news_tool.run(query=" qqq  etf news ")
+    assert queries == ["QQQ ETF News?"]
+    assert first == second == "results for QQQ ETF News?"
+
+
+if __name__ == "__main__":
+    test_single_flight_coalesces_concurrent_calls()
+    test_disk_backend_roundtrip()
+    test_swr_cache_serves_stale_and_refreshes()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_news_search_keeps_original_query(monkeypatch)
@@ -0,0 +1,67 @@
+"""测试成分股快照：权重贡献、涨跌家数和批量下载"""
+import numpy as np
+import pandas as pd
+
+from src.tools.constituents import (
+    compute_constituents,
+    format_constituents,
+    get_constituents_snapshot,
+)
+from src.tools.market_data import FixtureFetcher, MarketDataCache, set_market_data
+from src.utils.cache import MemoryBackend
+
+
+def _close() -> pd.DataFrame:
+    index = pd.bdate_range(end="2024-06-14", periods=3)
+    return pd.DataFrame(
+        {
+            "NVDA": [100.0, 100.0, 103.0],  # +3%
+            "MSFT": [200.0, 200.0, 198.0],  # -1%
+            "AAPL": [50.0, 50.0, 50.0],
+            "AMD": [20.0, np.nan, 21.0],  # 中间缺一天，用自己前一根有效 K 线：+5%
+            "TSLA": [10.0, 10.0, np.nan],  # 当日缺数据，记为缺少数据而不是平盘
+        },
+        index=index,
+    )
+
+
+def test_contribution_and_breadth():
+    weights = pd.Series(
+        {"NVDA": 10.0, "MSFT": 8.0, "AAPL": 7.0, "AMD": 2.0, "TSLA": 3.0, "GONE": 1.0}
+    )
+    snapshot = compute_constituents(_close(), weights)
+    assert snapshot["trade_date"] == "2024-06-14"
+    assert snapshot["constituents"] == 4
+    assert snapshot["missing"] == ["TSLA", "GONE"]
+    assert snapshot["covered_weight"] == 27.0
+    # 10% × 3% + 8% × (-1%) + 2% × 5% = 0.32 个百分点
+    assert snapshot["contribution_total"] == 0.32
+    breadth = (snapshot["advancers"], snapshot["decliners"], snapshot["unchanged"])
+    assert breadth == (2, 1, 1)
+    assert snapshot["advancing_weight"] == 12.0 and snapshot["declining_weight"] == 8.0
+    assert [m["symbol"] for m in snapshot["top_contributors"]] == ["NVDA", "AMD"]
+    assert snapshot["top_contributors"][0]["contribution"] == 0.3
+    assert [m["symbol"] for m in snapshot["top_gainers"]] == ["AMD", "NVDA"]
+    assert [m["symbol"] for m in snapshot["top_detractors"]] == ["MSFT"]
+    assert "NVDA +3.00%" in format_constituents(snapshot)
+
+
+def test_snapshot_uses_one_batched_download():
+    fetcher = FixtureFetcher(end=pd.Timestamp("2024-06-14").to_pydatetime())
+    calls = []
+    download = fetcher.download
+
+    def counting_download(symbols, period, interval):
+        calls.append(symbols)
+        return download(symbols, period, interval)
+
+    fetcher.download = counting_download
+    set_market_data(MarketDataCache(fetcher, MemoryBackend(), ttl_fn=lambda: 60))
+    try:
+        snapshot = get_constituents_snapshot(top_n=20)
+        assert get_constituents_snapshot(top_n=20) == snapshot
+    finally:
+        set_market_data(None)
+    assert len(calls) == 1 and len(calls[0]) == 20
+    assert snapshot["constituents"] == 20
+    assert snapshot["advancers"] + snapshot["decliners"] + snapshot["unchanged"] == 20
@@ -0,0 +1,140 @@
+"""测试本地 K 线历史库：增量追加、替换未完成的 K 线、区间读取和离线读取"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.tools.history_store import (
+    BAR_DTYPE,
+    HistoryFetcher,
+    HistoryStore,
+    update_period,
+)
+from src.tools.market_data import MARKET_TZ, FixtureFetcher
+
+
+def _bars(start: str, closes: list[float]) -> pd.DataFrame:
+    index = pd.bdate_range(start=start, periods=len(closes), tz=MARKET_TZ)
+    return pd.DataFrame(
+        {
+            "Open": closes,
+            "High": closes,
+            "Low": closes,
+            "Close": closes,
+            "Volume": [1000] * len(closes),
+        },
+        index=index,
+    )
+
+
+def test_append_only_writes_new_bars(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    assert store.last_timestamp("QQQ") is None
+    assert store.append("QQQ", "1d", _bars("2024-06-10", [1.0, 2.0, 3.0])) == 3
+
+    # 与已有数据重叠：更早的忽略，最后一根原地替换，之后的追加
+    assert store.append("QQQ", "1d", _bars("2024-06-11", [9.0, 3.5, 4.0, 5.0])) == 2
+    frame = store.read("QQQ")
+    assert frame["Close"].tolist() == [1.0, 2.0, 3.5, 4.0, 5.0]
+    assert store.last_timestamp("QQQ") == pd.Timestamp("2024-06-14", tz=MARKET_TZ)
+    assert store.append("QQQ", "1d", _bars("2024-06-10", [1.0])) == 0
+
+    window = store.read("QQQ", start="2024-06-11", end="2024-06-13")
+    assert window["Close"].tolist() == [2.0, 3.5, 4.0]
+    assert store.tail("QQQ", sessions=2)["Close"].tolist() == [4.0, 5.0]
+
+
+def test_partial_record_is_ignored_and_overwritten(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.append("QQQ", "1d", _bars("2024-06-10", [1.0, 2.0]))
+    with open(store._path("QQQ", "1d"), "ab") as f:
+        f.write(b"\0" * (BAR_DTYPE.itemsize // 2))
+    assert store.count("QQQ") == 2
+    store.append("QQQ", "1d", _bars("2024-06-12", [3.0]))
+    assert store.read("QQQ")["Close"].tolist() == [1.0, 2.0, 3.0]
+
+
+def test_timestamps_stored_in_ns_regardless_of_index_unit(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    frame = _bars("2024-06-10", [1.0, 2.0])
+    frame.index = frame.index.as_unit("us")
+    store.append("QQQ", "1d", frame)
+    assert store.last_timestamp("QQQ") == pd.Timestamp("2024-06-11", tz=MARKET_TZ)
+    assert store.read("QQQ", start="2024-06-11")["Close"].tolist() == [2.0]
+
+
+def test_update_period_covers_gap():
+    now = datetime(2024, 6, 14, 17, 0, tzinfo=MARKET_TZ)
+    assert update_period(None, "1d", now) == "2y"
+    assert update_period(pd.Timestamp("2024-06-13", tz=MARKET_TZ), "1d", now) == "5d"
+    assert update_period(pd.Timestamp("2024-05-01", tz=MARKET_TZ), "1d", now) == "3mo"
+    assert update_period(pd.Timestamp("2024-01-02", tz=MARKET_TZ), "1m", now) == "5d"
+
+
+class CountingFetcher(FixtureFetcher):
+    def __init__(self):
+        super().__init__(end=datetime(2024, 6, 14, 17, 0, tzinfo=MARKET_TZ))
+        self.calls = []
+
+    def history(self, symbol, period, interval):
+        self.calls.append(("history", symbol, period))
+        return super().history(symbol, period, interval)
+
+    def download(self, symbols, period, interval):
+        self.calls.append(("download", symbols, period))
+        return super().download(symbols, period, interval)
+
+
+def test_fetcher_batches_updates_and_reads_offline(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    upstream = CountingFetcher()
+    fetcher = HistoryFetcher(store, upstream)
+
+    wide = fetcher.download(("AAPL", "MSFT", "NVDA"), "5d", "1d")
+    assert upstream.calls == [("download", ("AAPL", "MSFT", "NVDA"), "2y")]
+    assert wide["Close"].shape == (5, 3)
+    assert store.count("NVDA") == 504
+
+    daily = fetcher.history("AAPL", "1y", "1d")
+    assert upstream.calls[-1][:2] == ("history", "AAPL")
+    assert len(daily) == 252
+
+    offline = HistoryFetcher(store)
+    assert offline.name == "history"
+    assert offline.history("AAPL", "1y", "1d").equals(store.tail("AAPL", "1d", 252))
+
+
+class SplitFetcher(CountingFetcher):
+    """拆股后上游返回的历史价格整体减半"""
+
+    def __init__(self):
+        super().__init__()
+        self.end = None
+        self.split = False
+
+    def history(self, symbol, period, interval):
+        frame = super().history(symbol, period, interval)
+        if self.split:
+            frame[["Open", "High", "Low", "Close"]] /= 2
+        return frame
+
+
+def test_price_adjustment_triggers_backfill(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    upstream = SplitFetcher()
+    fetcher = HistoryFetcher(store, upstream)
+    fetcher.update(("QQQ",), "1d")
+    before = store.read("QQQ")["Close"]
+
+    # 未调整：只做增量更新
+    fetcher.update(("QQQ",), "1d")
+    assert [call[2] for call in upstream.calls] == ["2y", "5d"]
+    assert store.read("QQQ")["Close"].equals(before)
+
+    # 重叠的已完成 K 线对不上：整段重新回填，不混入两种价格口径
+    upstream.split = True
+    fetcher.update(("QQQ",), "1d")
+    assert [call[2] for call in upstream.calls[2:]] == ["5d", "2y"]
+    after = store.read("QQQ")["Close"]
+    assert after.index.equals(before.index)
+    assert np.allclose(after, before / 2)
@@ -0,0 +1,100 @@
+"""测试技术指标引擎：指标取值、均线交叉和按最新 K 线缓存"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.tools.indicators import IndicatorEngine, compute_indicators, format_indicators
+from src.tools.market_data import (
+    MARKET_TZ,
+    FixtureFetcher,
+    MarketDataCache,
+    set_market_data,
+)
+from src.utils.cache import MemoryBackend
+
+
+def _frame(columns: dict) -> pd.DataFrame:
+    rows = len(next(iter(columns.values())))
+    return pd.DataFrame(columns, index=pd.bdate_range(end="2024-06-14", periods=rows))
+
+
+def test_indicators_on_simple_series():
+    rising = np.linspace(100, 200, 260)
+    flat = np.full(260, 50.0)
+    # 前 200 天下跌、之后上涨：50 日线会在最后一段上穿 200 日线
+    v_shape = np.concatenate([np.linspace(200, 100, 200), np.linspace(100, 260, 60)])
+    close = _frame({"UP": rising, "FLAT": flat, "V": v_shape})
+    result = compute_indicators(close + 1, close - 1, close)
+
+    assert result.loc["UP", "rsi"] == 100.0
+    assert result.loc["FLAT", "rsi"] == 50.0
+    assert result.loc["FLAT", "macd"] == 0.0
+    assert result.loc["FLAT", "bb_upper"] == result.loc["FLAT", "bb_lower"] == 50.0
+    assert result.loc["UP", "macd"] > 0 and result.loc["UP", "ma_trend"] == 1
+    # 最高价 - 最低价恒为 2，ATR 收敛到 2
+    assert abs(result.loc["FLAT", "atr"] - 2.0) < 1e-9
+    assert result.loc["FLAT", "realized_vol"] == 0.0
+    assert result.loc["V", "ma_trend"] == 1
+    assert 0 < result.loc["V", "days_since_cross"] < 60
+    assert np.isnan(result.loc["UP", "days_since_cross"])
+
+
+def test_short_history_leaves_slow_indicators_empty():
+    close = _frame({"NEW": np.linspace(10, 12, 30)})
+    result = compute_indicators(close, close, close)
+    assert np.isnan(result.loc["NEW", "ma_slow"])
+    assert np.isfinite(result.loc["NEW", "rsi"])
+
+
+class LiveBarFetcher(FixtureFetcher):
+    """最后一根 K 线的收盘价可调，模拟盘中未完成的 K 线"""
+
+    def __init__(self, end):
+        super().__init__(end=end)
+        self.last_close_bump = 0.0
+
+    def _generate(self, symbol, index):
+        frame = super()._generate(symbol, index)
+        frame.iloc[-1, frame.columns.get_loc("Close")] += self.last_close_bump
+        return frame
+
+
+def test_engine_caches_per_bar_date():
+    fetcher = FixtureFetcher(end=datetime(2024, 6, 14, 17, 0, tzinfo=MARKET_TZ))
+    set_market_data(MarketDataCache(fetcher, MemoryBackend(), ttl_fn=lambda: 60))
+    try:
+        engine = IndicatorEngine(period="2y")
+        first = engine.latest(("QQQ", "NVDA"))
+        assert engine.get_stats()["misses"] == 2
+        assert engine.latest(("QQQ",))["QQQ"] is first["QQQ"]
+        assert engine.get_stats()["hits"] == 1
+
+        # 新的一根 K 线出现后重新计算
+        fetcher.end = datetime(2024, 6, 17, 17, 0, tzinfo=MARKET_TZ)
+        set_market_data(MarketDataCache(fetcher, MemoryBackend(), ttl_fn=lambda: 60))
+        assert engine.latest(("QQQ",))["QQQ"] is not first["QQQ"]
+        assert engine.get_stats()["misses"] == 3
+    finally:
+        set_market_data(None)
+    text = format_indicators("QQQ", first["QQQ"])
+    assert "RSI(14)" in text and "MA200" in text
+
+
+def test_engine_recomputes_when_live_bar_moves():
+    fetcher = LiveBarFetcher(end=datetime(2024, 6, 14, 12, 0, tzinfo=MARKET_TZ))
+    set_market_data(MarketDataCache(fetcher, MemoryBackend(), ttl_fn=lambda: 0))
+    try:
+        engine = IndicatorEngine(period="2y")
+        first = engine.latest(("QQQ",))["QQQ"]
+        assert engine.latest(("QQQ",))["QQQ"] is first
+        assert engine.get_stats()["hits"] == 1
+
+        # 同一根 K 线，盘中价格变化后不能返回旧结果
+        fetcher.last_close_bump = 5.0
+        second = engine.latest(("QQQ",))["QQQ"]
+        assert second is not first
+        assert abs(second["close"] - first["close"] - 5.0) < 1e-3
+        assert engine.get_stats()["misses"] == 2
+    finally:
+        set_market_data(None)
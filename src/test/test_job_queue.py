@@ -0,0 +1,97 @@
+"""测试有界任务队列：准入限制、排队位置和统计"""
+import threading
+
+import pytest
+
+from src.utils.job_queue import (
+    REJECT_QUEUE_FULL,
+    REJECT_USER_LIMIT,
+    JobQueue,
+    JobRejected,
+)
+
+
+def test_admission_limits_and_positions():
+    queue = JobQueue(workers=1, max_queue=2, max_per_user=1, name="test")
+    started, release = threading.Event(), threading.Event()
+    positions = []
+
+    def block():
+        started.set()
+        release.wait()
+
+    queue.submit(block, user_key="a")
+    assert started.wait(timeout=2)
+    second = queue.submit(lambda: "b", user_key="b")
+    third = queue.submit(lambda: "c", user_key="c", on_position=positions.append)
+
+    # 同一用户已有任务
+    with pytest.raises(JobRejected) as exc:
+        queue.submit(lambda: None, user_key="a")
+    assert exc.value.reason == REJECT_USER_LIMIT
+
+    # 队列已满
+    with pytest.raises(JobRejected) as exc:
+        queue.submit(lambda: None, user_key="d")
+    assert exc.value.reason == REJECT_QUEUE_FULL
+
+    release.set()
+    assert second.future.result(timeout=2) == "b"
+    assert third.future.result(timeout=2) == "c"
+    # 单个工作线程按提交顺序执行
+    assert third.started_at >= second.started_at
+    # 第二个任务开始后，第三个任务前进到第 1 位
+    assert positions == [1]
+
+    # 用户的任务完成后可以再次提交
+    again = queue.submit(lambda: "again", user_key="a")
+    assert again.future.result(timeout=2) == "again"
+
+    queue.shutdown()
+    stats = queue.get_stats()
+    print(f"📊 {stats}")
+    assert stats["completed"] == 4
+    assert stats["rejected"] == 2
+    assert stats["queued"] == 0
+
+
+def test_failed_job_sets_exception():
+    queue = JobQueue(workers=1, max_queue=1, name="test")
+
+    def boom():
+        raise RuntimeError("boom")
+
+    job = queue.submit(boom)
+    with pytest.raises(RuntimeError):
+        job.future.result(timeout=2)
+    queue.shutdown()
+    assert queue.get_stats()["failed"] == 1
+
+
+def test_cancel_queued_job():
+    queue = JobQueue(workers=1, max_queue=2, max_per_user=1, name="test")
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait()
+
+    running = queue.submit(block, user_key="a")
+    assert started.wait(timeout=2)
+    queued = queue.submit(lambda: "b", user_key="b")
+
+    # 已开始的任务无法取消，排队中的可以，并释放用户名额
+    assert queue.cancel(running) is False
+    assert queue.cancel(queued) is True
+    assert queued.future.cancelled()
+    queue.submit(lambda: None, user_key="b")
+
+    release.set()
+    queue.shutdown()
+    assert queue.get_stats()["cancelled"] == 1
+
+
+if __name__ == "__main__":
+    test_admission_limits_and_positions()
+    test_failed_job_sets_exception()
+    test_cancel_queued_job()
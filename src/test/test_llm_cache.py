@@ -0,0 +1,74 @@
+"""测试 LLM 响应缓存：内容寻址、TTL、按大小淘汰和按任务开关"""
+import threading
+import time
+
+import pytest
+
+from src.utils.llm_cache import LLMResponseCache, cache_key
+
+
+def test_key_depends_on_model_params_and_messages():
+    messages = [{"role": "user", "content": "QQQ 今日走势"}]
+    key = cache_key("gpt-4o", messages, temperature=0.2)
+    assert key == cache_key("gpt-4o", [dict(m) for m in messages], temperature=0.2)
+    assert key != cache_key("gpt-4o-mini", messages, temperature=0.2)
+    assert key != cache_key("gpt-4o", messages, temperature=0.7)
+    # 追加工具结果后 key 随之变化
+    with_tool = messages + [{"role": "user", "content": "Observation: 最新价 500.12"}]
+    assert key != cache_key("gpt-4o", with_tool, temperature=0.2)
+    assert cache_key("m", "hi") == cache_key("m", [{"role": "user", "content": "hi"}])
+
+
+def test_ttl_and_size_eviction(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"), ttl=60, max_bytes=100)
+    cache.put("a", "m", "x" * 40)
+    cache.put("b", "m", "y" * 40)
+    assert cache.get("a") == "x" * 40  # a 最近使用过
+    cache.put("c", "m", "z" * 40)
+    cache.evict()
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+
+    cache.ttl = 0.01
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    cache.close()
+
+
+def test_cached_llm_hits_and_task_toggle(tmp_path):
+    pytest.importorskip("crewai")
+    from src.utils.cached_llm import CachedLLM
+
+    class Task:
+        def __init__(self, name):
+            self.name = name
+            self.id = name
+
+    class FakeLLM:
+        model = "fake"
+        temperature = 0
+        stop = []
+
+        def __init__(self):
+            self.calls = 0
+            self.lock = threading.Lock()
+
+        def call(self, messages, **kwargs):
+            with self.lock:
+                self.calls += 1
+            return f"answer {self.calls}"
+
+    inner = FakeLLM()
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"))
+    llm = CachedLLM(inner, cache, allow=lambda name: name != "no_cache")
+
+    assert llm.call("prompt", from_task=Task("report")) == "answer 1"
+    assert llm.call("prompt", from_task=Task("report")) == "answer 1"
+    assert inner.calls == 1
+    llm.call("prompt", from_task=Task("no_cache"))
+    llm.call("prompt", from_task=Task("no_cache"))
+    assert inner.calls == 3
+    # 写入 stop 等属性时落到原 LLM 上
+    llm.stop = ["Observation:"]
+    assert inner.stop == ["Observation:"]
+    assert cache.get_stats()["hits"] == 1
@@ -0,0 +1,46 @@
+"""测试日志子系统：模块级别解析、惰性格式化和 JSON 输出"""
+import io
+import json
+import logging
+
+from src.utils.logger import JsonFormatter, parse_levels
+
+
+def test_parse_levels():
+    assert parse_levels("src.crew=DEBUG, src.utils.notifier=warning,bad,x=NOPE") == {
+        "src.crew": logging.DEBUG,
+        "src.utils.notifier": logging.WARNING,
+    }
+
+
+def test_lazy_formatting_and_json():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    logger = logging.getLogger("test.logger")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+    class Expensive:
+        calls = 0
+
+        def __str__(self):
+            Expensive.calls += 1
+            return "expensive"
+
+    # 级别未开启时参数不会被格式化
+    logger.debug("step %s", Expensive())
+    assert Expensive.calls == 0
+
+    logger.info("step %s", Expensive(), extra={"chat_id": 42})
+    assert Expensive.calls == 1
+    record = json.loads(stream.getvalue())
+    assert record["msg"] == "step expensive"
+    assert record["level"] == "INFO"
+    assert record["chat_id"] == 42
+
+
+if __name__ == "__main__":
+    test_parse_levels()
+    test_lazy_formatting_and_json()
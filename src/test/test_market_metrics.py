@@ -0,0 +1,59 @@
+"""测试快速模式的 QQQ 指标计算"""
+import json
+
+import pandas as pd
+
+from src.tools.market_metrics import compute_snapshot, format_snapshot_context
+
+
+def _daily(rows: int = 22) -> pd.DataFrame:
+    index = pd.bdate_range(end="2024-06-14", periods=rows)
+    volume = [1_000_000] * (rows - 1) + [2_000_000]
+    close = [100.0] * (rows - 1) + [102.0]
+    return pd.DataFrame(
+        {"Open": [100.0] * (rows - 1) + [101.0], "High": [101.0] * (rows - 1) + [103.0],
+         "Low": [99.0] * (rows - 1) + [100.0], "Close": close, "Volume": volume},
+        index=index,
+    )
+
+
+def test_compute_snapshot():
+    snapshot = compute_snapshot(_daily())
+    assert snapshot["trade_date"] == "2024-06-14"
+    assert snapshot["latest_close"] == 102.0
+    assert snapshot["price_change"] == 2.0
+    assert snapshot["percentage_change"] == 2.0
+    assert snapshot["intraday_range"] == 3.0
+    assert snapshot["gap"] == 1.0
+    assert snapshot["gap_pct"] == 1.0
+    assert snapshot["avg_volume_20d"] == 1_000_000
+    assert snapshot["volume_ratio_20d"] == 2.0
+    assert "上涨" in snapshot["market_assessment"]
+
+
+def test_multi_day_context():
+    daily = _daily(260)
+    daily.iloc[10, daily.columns.get_loc("High")] = 120.0
+    snapshot = compute_snapshot(daily)
+    # 2024-06-14 是周五，本周以前收盘为上周五的 100
+    assert snapshot["week_to_date_pct"] == 2.0
+    assert snapshot["high_52w"] == 120.0
+    assert snapshot["low_52w"] == 99.0
+    assert snapshot["drawdown_from_high_pct"] == -15.0
+    # 超出 52 周窗口的高点不计入
+    daily.iloc[5, daily.columns.get_loc("High")] = 130.0
+    snapshot = compute_snapshot(daily)
+    assert snapshot["high_52w"] == 120.0
+
+
+def test_format_snapshot_context():
+    snapshot = compute_snapshot(_daily())
+    context = format_snapshot_context(snapshot)
+    payload = context.split("```json\n", 1)[1].split("\n```", 1)[0]
+    assert json.loads(payload) == snapshot
+
+
+if __name__ == "__main__":
+    test_compute_snapshot()
+    test_multi_day_context()
+    test_format_snapshot_context()
@@ -0,0 +1,65 @@
+"""测试 Prometheus 文本输出"""
+import pytest
+
+from src.db.config import statement_kind
+from src.utils.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    hist = registry.register(
+        Histogram("t_seconds", "耗时", ("tool",), buckets=(0.1, 1))
+    )
+    hist.observe(0.05, tool="a")
+    hist.observe(0.5, tool="a")
+    hist.observe(5, tool="a")
+    with hist.time(tool="b"):
+        pass
+
+    text = registry.render()
+    assert "# TYPE t_seconds histogram" in text
+    assert 't_seconds_bucket{tool="a",le="0.1"} 1' in text
+    assert 't_seconds_bucket{tool="a",le="1"} 2' in text
+    assert 't_seconds_bucket{tool="a",le="+Inf"} 3' in text
+    assert 't_seconds_sum{tool="a"} 5.55' in text
+    assert 't_seconds_count{tool="b"} 1' in text
+    assert hist.get_count(tool="a") == 3
+
+
+def test_counter_and_gauge():
+    registry = MetricsRegistry()
+    counter = registry.register(
+        Counter("calls_total", "调用次数", ("method", "status"))
+    )
+    counter.inc(method="sendMessage", status=200)
+    counter.inc(2, method="sendMessage", status=200)
+    counter.inc(method="editMessageText", status=429)
+    gauge = registry.register(Gauge("jobs", "任务数", ("state",)))
+    gauge.set_function(lambda: {("running",): 1, ("queued",): 3})
+    plain = registry.register(Gauge("up", "在线"))
+    plain.set(1)
+
+    text = registry.render()
+    assert 'calls_total{method="sendMessage",status="200"} 3' in text
+    assert 'calls_total{method="editMessageText",status="429"} 1' in text
+    assert 'jobs{state="queued"} 3' in text
+    assert "\nup 1" in text
+
+    with pytest.raises(ValueError):
+        counter.inc(method="sendMessage")
+    with pytest.raises(ValueError):
+        registry.register(Counter("up", "重复"))
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("c_total", "c", ("job",)))
+    counter.inc(job='a"b\\c\nd')
+    assert 'c_total{job="a\\"b\\\\c\\nd"} 1' in registry.render()
+
+
+def test_db_statement_kind_label():
+    assert statement_kind("  SELECT * FROM tg_user") == "select"
+    assert statement_kind(b"insert into report values (%s)") == "insert"
+    assert statement_kind("VACUUM") == "other"
+    assert statement_kind("") == "other"
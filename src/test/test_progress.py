@@ -0,0 +1,73 @@
+"""测试进度发送器：合并中间状态、跳过相同内容、遵守 429"""
+import threading
+import time
+
+from src.utils.progress import ProgressDispatcher
+
+
+class FakeResponse:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self._retry_after = retry_after
+
+    def json(self):
+        return {"parameters": {"retry_after": self._retry_after}}
+
+
+def test_coalesces_to_latest_state():
+    sent = []
+    gate = threading.Event()
+
+    def sender(chat_id, message_id, text):
+        gate.wait()
+        sent.append((chat_id, message_id, text))
+        return FakeResponse(200)
+
+    dispatcher = ProgressDispatcher(sender=sender, min_interval=0.05, global_rate=100)
+    started = time.perf_counter()
+    dispatcher.submit(1, 10, "step 0")
+    time.sleep(0.02)  # 第一条已在发送中
+    for i in range(1, 50):
+        dispatcher.submit(1, 10, f"step {i}")
+    dispatcher.submit(2, 20, "other")
+    # 提交不会等待网络请求
+    assert time.perf_counter() - started < 0.1
+
+    gate.set()
+    assert dispatcher.drain(timeout=2)
+    assert sent[0] == (1, 10, "step 0")
+    assert (1, 10, "step 49") in sent and (2, 20, "other") in sent
+    assert len(sent) == 3
+
+    # 与已显示内容相同的更新直接跳过
+    dispatcher.submit(1, 10, "step 49")
+    assert dispatcher.drain(timeout=1)
+    assert len(sent) == 3
+
+    stats = dispatcher.get_stats()
+    print(f"📊 {stats}")
+    assert stats["coalesced"] == 48
+    assert stats["unchanged"] == 1
+    dispatcher.close()
+
+
+def test_retries_after_rate_limit():
+    responses = [FakeResponse(429, retry_after=0.05), FakeResponse(200)]
+    sent = []
+
+    def sender(chat_id, message_id, text):
+        sent.append(time.perf_counter())
+        return responses.pop(0)
+
+    dispatcher = ProgressDispatcher(sender=sender, min_interval=0.01, global_rate=100)
+    dispatcher.submit(1, 10, "step")
+    assert dispatcher.drain(timeout=2)
+    assert len(sent) == 2
+    assert sent[1] - sent[0] >= 0.05
+    assert dispatcher.get_stats()["rate_limited"] == 1
+    dispatcher.close()
+
+
+if __name__ == "__main__":
+    test_coalesces_to_latest_state()
+    test_retries_after_rate_limit()
@@ -0,0 +1,57 @@
+"""测试令牌桶限流"""
+import time
+
+from src.utils.rate_limit import TokenBucket, parse_retry_after
+
+
+def test_token_bucket_burst_and_rate():
+    bucket = TokenBucket(rate=50, capacity=5)
+
+    # 桶满时允许突发 capacity 个请求
+    for _ in range(5):
+        assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() > 0
+
+    # 之后按 rate 放行：10 个令牌大约需要 0.2 秒
+    start = time.monotonic()
+    for _ in range(10):
+        bucket.acquire()
+    elapsed = time.monotonic() - start
+    print(f"⏱️ 10 个令牌耗时 {elapsed:.3f}s")
+    assert 0.15 <= elapsed < 0.5
+
+
+def test_token_bucket_pause():
+    bucket = TokenBucket(rate=1000, capacity=10)
+    bucket.pause(0.2)
+
+    # retry_after 期间不发放令牌
+    assert bucket.try_acquire() > 0.1
+    waited = bucket.acquire()
+    print(f"⏱️ 暂停后等待 {waited:.3f}s")
+    assert waited >= 0.15
+
+
+class _Response:
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        if isinstance(self.body, Exception):
+            raise self.body
+        return self.body
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(_Response({"parameters": {"retry_after": 7}})) == 7.0
+    # 响应体不是 JSON、不是字典或缺少字段时使用默认值，不中断发送
+    assert parse_retry_after(_Response(ValueError("not json"))) == 1.0
+    assert parse_retry_after(_Response(["oops"])) == 1.0
+    assert parse_retry_after(_Response({"parameters": None})) == 1.0
+    assert parse_retry_after(_Response({"ok": False}), default=2.0) == 2.0
+
+
+if __name__ == "__main__":
+    test_token_bucket_burst_and_rate()
+    test_token_bucket_pause()
+    test_parse_retry_after()
@@ -0,0 +1,46 @@
+from datetime import date
+
+from src.db.report.report import SLOT_ON_DEMAND, Report
+from src.db.report.report_service import ReportService
+from src.utils import notifier
+
+
+def test_save_report_versions():
+    trade_date = date(2026, 10, 16)
+    first = ReportService.save(Report(
+        trade_date=trade_date,
+        slot=SLOT_ON_DEMAND,
+        content="测试报告 v1",
+        data_mode="fast",
+        market_snapshot={"latest_close": 500.0},
+        timings={"total": 1.5},
+    ))
+    second = ReportService.save(
+        Report(trade_date=trade_date, slot=SLOT_ON_DEMAND, content="测试报告 v2")
+    )
+    assert second.version == first.version + 1
+
+    # 查询返回最新版本
+    latest = ReportService.get_latest(trade_date)
+    print(latest)
+    assert latest.id == second.id
+    assert latest.content == "测试报告 v2"
+
+    history = ReportService.list_range(trade_date, trade_date, SLOT_ON_DEMAND)
+    assert [r.version for r in history][-2:] == [first.version, second.version]
+    assert history[-2].market_snapshot == {"latest_close": 500.0}
+
+
+def test_save_report_uses_market_trade_date(monkeypatch):
+    saved = []
+    monkeypatch.setattr(
+        notifier.ReportService, "save", lambda report: saved.append(report) or report
+    )
+
+    snapshot = {"trade_date": "2024-06-14"}
+    notifier.save_report("报告", SLOT_ON_DEMAND, {"market_snapshot": snapshot})
+    assert saved[-1].trade_date == date(2024, 6, 14)
+
+    # 没有行情快照时取美东时间的当前日期，而不是服务器本地日期
+    notifier.save_report("报告", SLOT_ON_DEMAND, {"market_snapshot": None})
+    assert saved[-1].trade_date == notifier.datetime.now(notifier.MARKET_TZ).date()
@@ -0,0 +1,54 @@
+"""测试命令路由：规范化、别名和管理员权限"""
+import asyncio
+
+from src.utils import router as router_module
+from src.utils.router import CommandContext, CommandRouter, normalize_command
+
+
+def test_normalize_command():
+    assert normalize_command("/subscribe") == ("/subscribe", "")
+    assert normalize_command("/Subscribe@MyBot") == ("/subscribe", "")
+    assert normalize_command("  /report 2026-10-16 ") == ("/report", "2026-10-16")
+    assert normalize_command("/订阅") == ("/订阅", "")
+    assert normalize_command("hello") == (None, "")
+
+
+def test_dispatch_aliases_and_admin(monkeypatch):
+    router = CommandRouter()
+    calls = []
+    replies = []
+
+    @router.command("/subscribe", "/订阅")
+    async def subscribe(ctx):
+        calls.append(ctx.command)
+
+    @router.command("/status", admin_only=True)
+    async def status(ctx):
+        calls.append(ctx.command)
+
+    async def fake_reply(self, text, **extra):
+        replies.append(text)
+
+    monkeypatch.setattr(CommandContext, "reply", fake_reply)
+    monkeypatch.setattr(
+        router_module, "check_admin_permission", lambda chat_id: (False, "❌ 权限不足")
+    )
+
+    def dispatch(text):
+        ctx = CommandContext(chat_id=1, text=text, user_data={}, background_tasks=None)
+        return asyncio.run(router.dispatch(ctx))
+
+    assert dispatch("/订阅") is True
+    assert dispatch("/SUBSCRIBE@bot") is True
+    assert calls == ["/subscribe", "/subscribe"]
+
+    # 非管理员调用管理员命令只会收到提示，不会执行处理函数
+    assert dispatch("/status") is True
+    assert calls == ["/subscribe", "/subscribe"]
+    assert replies == ["❌ 权限不足"]
+
+    assert dispatch("/unknown") is False
+
+
+if __name__ == "__main__":
+    test_normalize_command()
@@ -0,0 +1,66 @@
+"""测试运行登记表：并发请求合并与结果复用"""
+import time
+
+from src.utils.run_registry import ROLE_CACHED, ROLE_FOLLOWER, ROLE_LEADER, RunRegistry
+
+
+def test_concurrent_requests_share_one_run():
+    registry = RunRegistry(result_ttl=60)
+    run, role = registry.join("summary", (1, 10), snapshot="a")
+    assert role == ROLE_LEADER
+
+    follower, role = registry.join("summary", (2, 20), snapshot="a")
+    assert role == ROLE_FOLLOWER and follower is run
+    assert registry.publish(run, "50%") == [(1, 10), (2, 20)]
+    assert run.progress == "50%"
+
+    # 运行期间跨过行情快照分桶边界，仍然挂到同一次运行上
+    _, role = registry.join("summary", (3, 30), snapshot="b")
+    assert role == ROLE_FOLLOWER
+    # 不同的报告类型互不影响
+    _, role = registry.join("other", (4, 40), snapshot="a")
+    assert role == ROLE_LEADER
+
+    assert registry.finish(run, result="report") == [(1, 10), (2, 20), (3, 30)]
+    cached, role = registry.join("summary", (5, 50), snapshot="a")
+    assert role == ROLE_CACHED and cached.result == "report"
+    # 已完成的结果只在行情快照相同时复用
+    _, role = registry.join("summary", (6, 60), snapshot="b")
+    assert role == ROLE_LEADER
+    assert registry.get_stats() == {
+        "started": 3, "joined": 2, "cached": 1, "failed": 0, "running": 2,
+    }
+
+
+def test_failed_and_expired_runs_are_not_reused():
+    registry = RunRegistry(result_ttl=0.05)
+    run, _ = registry.join("k", (1, 10))
+    registry.finish(run, error=RuntimeError("boom"))
+    _, role = registry.join("k", (2, 20))
+    assert role == ROLE_LEADER
+
+    run = registry.get("k")
+    registry.finish(run, result="report")
+    time.sleep(0.06)
+    _, role = registry.join("k", (3, 30))
+    assert role == ROLE_LEADER
+
+
+def test_expired_runs_are_swept_for_every_key():
+    registry = RunRegistry(result_ttl=0.05)
+    for key in ("a", "b"):
+        run, _ = registry.join(key, (1, 10))
+        registry.finish(run, result=key)
+    time.sleep(0.06)
+
+    # 其他 key 的 join / finish 会清理过期的运行，不会越积越多
+    run, _ = registry.join("c", (1, 10))
+    assert registry.get("a") is None and registry.get("b") is None
+    registry.finish(run, result="c")
+    assert registry.get("c") is run
+
+
+if __name__ == "__main__":
+    test_concurrent_requests_share_one_run()
+    test_failed_and_expired_runs_are_not_reused()
+    test_expired_runs_are_swept_for_every_key()
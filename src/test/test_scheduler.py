@@ -0,0 +1,30 @@
+"""测试定时推送：报告生成失败时安排重试"""
+from src.utils import scheduler
+
+
+def test_generation_failure_schedules_retry(monkeypatch):
+    retries = []
+    monkeypatch.setattr(
+        scheduler.UserService, "list_subscribed_users", lambda: [(1, "u", "f", "l")]
+    )
+    monkeypatch.setattr(scheduler, "schedule_retry", lambda *args: retries.append(args))
+
+    def broken(slot, slot_key):
+        raise RuntimeError("LLM 超时")
+
+    monkeypatch.setattr(scheduler, "prepare_broadcast", broken)
+    runs = scheduler.SCHEDULER_JOB_RUNS
+    retried = runs.get(job="evening_report", status="retry")
+    failed = runs.get(job="evening_report", status="error")
+    scheduler.send_scheduled_report("evening", "2026-10-16-evening")
+    assert retries == [("evening", "2026-10-16-evening", 2)]
+    # 失败在函数内部处理，运行结果按实际情况记录，而不是 ok
+    assert runs.get(job="evening_report", status="retry") == retried + 1
+
+    # 达到最大尝试次数后不再重试
+    scheduler.send_scheduled_report(
+        "evening", "2026-10-16-evening", scheduler.MAX_GENERATION_ATTEMPTS
+    )
+    assert len(retries) == 1
+    assert runs.get(job="evening_report", status="error") == failed + 1
+    assert scheduler._job_label("retry_2026-10-16-evening") == "evening_report"
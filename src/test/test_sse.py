@@ -0,0 +1,94 @@
+"""测试事件驱动的 SSE 流：跨线程投递、心跳、断线续传和空闲回调"""
+import asyncio
+import threading
+
+from src.utils.sse import HEARTBEAT, StreamRegistry, parse_event_id, stream_events
+
+
+def test_parse_event_id():
+    assert parse_event_id("abc123:17") == ("abc123", 17)
+    assert parse_event_id(None) == (None, 0)
+    assert parse_event_id("garbage") == (None, 0)
+
+
+def test_stream_replay_heartbeat_and_idle():
+    async def scenario():
+        registry = StreamRegistry()
+        idle = []
+        stream = registry.create(asyncio.get_running_loop(), on_idle=idle.append)
+
+        # 从工作线程投递事件
+        def worker():
+            for i in range(3):
+                stream.publish({"type": "log", "content": str(i)})
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        await asyncio.sleep(0)
+
+        chunks = []
+        gen = stream_events(stream, heartbeat=0.01)
+        for _ in range(4):
+            chunks.append(await gen.__anext__())
+        await gen.aclose()
+        assert chunks[:3] == [
+            f"id: {stream.run_id}:{i + 1}\n"
+            f'data: {{"type": "log", "content": "{i}"}}\n\n'
+            for i in range(3)
+        ]
+        assert chunks[3] == HEARTBEAT
+        # 最后一个订阅者离开且运行未结束
+        assert idle == [stream]
+
+        # 断线续传：只补发序号 2 之后的事件，事件流关闭后结束
+        stream.publish({"type": "result", "content": "done"})
+        stream.close()
+        await asyncio.sleep(0)
+        resumed = [chunk async for chunk in stream_events(stream, after=2)]
+        assert [parse_event_id(c.split("\n")[0][4:])[1] for c in resumed] == [3, 4]
+        assert registry.get(stream.run_id) is stream
+
+    asyncio.run(scenario())
+
+
+def test_multiple_viewers_share_one_run():
+    async def scenario():
+        registry = StreamRegistry()
+        stream = registry.create(asyncio.get_running_loop(), history=3)
+        assert registry.active() is stream
+
+        for i in range(5):
+            stream.publish({"type": "log", "content": str(i)})
+        await asyncio.sleep(0)
+
+        # 环形缓冲区只保留最近 3 个事件，新观看者先收到缺口提示再回放
+        late = stream_events(stream, heartbeat=1)
+        assert await late.__anext__() == 'data: {"type": "gap", "missed": 2}\n\n'
+        replay = [await late.__anext__() for _ in range(3)]
+        ids = [c.split("\n")[0] for c in replay]
+        assert ids == [f"id: {stream.run_id}:{i}" for i in (3, 4, 5)]
+
+        # 实时事件只产生一次，扇出给所有观看者
+        early = stream_events(stream, after=5, heartbeat=1)
+        pending = [asyncio.ensure_future(gen.__anext__()) for gen in (late, early)]
+        await asyncio.sleep(0)
+        assert stream.subscriber_count == 2
+        stream.publish({"type": "result", "content": "done"})
+        results = await asyncio.gather(*pending)
+        assert results[0] == results[1]
+        assert results[0].startswith(f"id: {stream.run_id}:6\n")
+
+        stream.close()
+        await asyncio.sleep(0)
+        assert registry.active() is None
+        for gen in (late, early):
+            assert [chunk async for chunk in gen] == []
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_parse_event_id()
+    test_stream_replay_heartbeat_and_idle()
+    test_multiple_viewers_share_one_run()
@@ -0,0 +1,50 @@
+"""测试任务记忆：按输入哈希存取、工具调用记录与重放校验"""
+import time
+
+from src.utils.task_memo import TaskMemoStore, ToolCallRecorder, digest, replay_matches
+
+
+def test_store_returns_latest_unexpired_entry(tmp_path):
+    store = TaskMemoStore(str(tmp_path / "memo.sqlite"), ttl=60)
+    assert store.get("research_key_news", "k1") is None
+    store.put("research_key_news", "k1", "旧新闻摘要", [])
+    store.put("research_key_news", "k1", "新闻摘要", [])
+    store.put("research_key_news", "k2", "其它输入", [])
+    entry = store.get("research_key_news", "k1")
+    assert entry.output == "新闻摘要" and entry.tool_calls == []
+    assert store.get("write_final_report", "k1") is None
+
+    store.ttl = 0.01
+    time.sleep(0.02)
+    assert store.get("research_key_news", "k1") is None
+    store.close()
+
+
+def test_recorder_collects_calls_per_task():
+    recorder = ToolCallRecorder()
+    recorder.track("t1")
+    recorder.record("t1", "get_nasdaq_data", '{"ticker": "QQQ"}', "最新价 500.12")
+    recorder.record("t1", "search_news", "not json", "新闻")
+    recorder.record("untracked", "get_nasdaq_data", {}, "忽略")
+    calls = recorder.pop("t1")
+    assert [c.args for c in calls] == [{"ticker": "QQQ"}, {"input": "not json"}]
+    assert calls[0].result_hash == digest("最新价 500.12")
+    assert recorder.pop("t1") == [] and recorder.pop("untracked") == []
+
+
+def test_replay_detects_changed_tool_results(tmp_path):
+    store = TaskMemoStore(str(tmp_path / "memo.sqlite"))
+    recorder = ToolCallRecorder()
+    recorder.track("t1")
+    recorder.record("t1", "get_nasdaq_data", {"ticker": "QQQ"}, "最新价 500.12")
+    store.put("fetch_and_analyze_data", "k", "QQQ 分析", recorder.pop("t1"))
+    entry = store.get("fetch_and_analyze_data", "k")
+
+    assert replay_matches(entry, lambda tool, args: "最新价 500.12")
+    assert not replay_matches(entry, lambda tool, args: "最新价 501.00")
+
+    def broken(tool, args):
+        raise RuntimeError("行情接口超时")
+
+    assert not replay_matches(entry, broken)
+    store.close()
@@ -1,3 +1,8 @@
+import asyncio
+import threading
+
+from src.db.tg_user.tg_user import TgUser
+from src.db.tg_user.user_buffer import UserUpsertBuffer, get_user_buffer
 from src.db.tg_user.user_service import UserService
 
 
@@ -24,5 +29,68 @@ def test_insert_user():
     subscribed = UserService.list_subscribed_users()
     print(subscribed)
 
+
+def test_buffered_touch_user():
+    user_data = {
+        "id": 123457,
+        "username": "caius_buffer",
+        "first_name": "Caius",
+        "last_name": "Lin",
+        "language_code": "zh-hans"
+    }
+
+    buffer = get_user_buffer()
+    buffer.flush()
+
+    # 同一用户多次互动只保留一条待写入记录
+    for _ in range(10):
+        UserService.touch_user(user_data)
+    assert buffer.pending_count() == 1
+
+    assert buffer.flush() == 1
+    subscribed = UserService.list_subscribed_users()
+    assert any(row[0] == user_data["id"] for row in subscribed)
+
+    # 资料没有变化时不会再次写入
+    assert UserService.touch_user(user_data) is False
+    assert buffer.pending_count() == 0
+
+
+def test_cancelled_write_through_releases_lock():
+    buffer = UserUpsertBuffer(flush_interval=60)
+    user = TgUser(tg_user_id=123458, is_subscribed=True)
+    other = TgUser(tg_user_id=123459, is_subscribed=True)
+
+    async def write_once():
+        async with buffer.awrite_through(user):
+            pass
+
+    def write_once_sync():
+        with buffer.write_through(user):
+            pass
+
+    async def cancel_while_waiting():
+        # 另一次直写占着锁时，异步直写在等锁
+        holder = buffer.write_through(other)
+        holder.__enter__()
+        task = asyncio.create_task(write_once())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        # 取消之后线程才拿到锁
+        holder.__exit__(None, None, None)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # 被取消的等待者拿到锁后会立即释放，后续的直写不会永远阻塞
+        writer = threading.Thread(target=write_once_sync, daemon=True)
+        writer.start()
+        await asyncio.to_thread(writer.join, 1)
+        assert not writer.is_alive()
+
+    asyncio.run(cancel_while_waiting())
+    buffer.close()
+
 if __name__ == "__main__":
     test_insert_user()
+    test_buffered_touch_user()
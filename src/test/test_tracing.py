@@ -0,0 +1,74 @@
+"""测试链路追踪：span 父子关系、跨线程按 task_id 查找、时间线和 JSON 导出"""
+import json
+import threading
+import time
+
+import pytest
+
+from src.utils.tracing import (
+    KIND_LLM,
+    KIND_TASK,
+    KIND_TELEGRAM,
+    TraceStore,
+    current_trace,
+    export_json,
+    use_trace,
+)
+
+
+def test_spans_nest_under_tasks_and_summarize():
+    store = TraceStore(max_traces=2, export="none")
+    trace = store.start("run1")
+    store.bind_task("task-uuid", trace, "span-task")
+
+    def llm_event():
+        # 模拟 crewai 线程池中的事件处理函数
+        found, parent = store.for_task("task-uuid")
+        now = time.time()
+        found.add_span("gpt", KIND_LLM, now - 2, now, parent)
+
+    worker = threading.Thread(target=llm_event)
+    worker.start()
+    worker.join()
+    now = time.time()
+    trace.add_span("research", KIND_TASK, now - 3, now, span_id="span-task")
+    with pytest.raises(RuntimeError):
+        with trace.span("editMessageText", KIND_TELEGRAM):
+            raise RuntimeError("boom")
+    store.finish(trace)
+
+    data = trace.to_dict()
+    llm = next(span for span in data["spans"] if span["kind"] == KIND_LLM)
+    assert llm["parent_id"] == "span-task"
+    assert data["summary"][KIND_LLM] == pytest.approx(2, abs=0.01)
+    telegram = next(s for s in data["spans"] if s["kind"] == KIND_TELEGRAM)
+    assert telegram["status"] == "error"
+    # 结束后解除 task 索引
+    assert store.for_task("task-uuid") == (None, None)
+
+    timeline = trace.render_timeline(width=20).splitlines()
+    assert timeline[0].startswith("run run1")
+    assert "task:research" in timeline[1]
+    assert "  llm:gpt" in timeline[2]
+
+
+def test_store_keeps_recent_traces():
+    store = TraceStore(max_traces=2, export="none")
+    for run_id in ("a", "b", "c"):
+        store.start(run_id)
+    assert store.get("a") is None
+    assert [t.run_id for t in store.recent()] == ["c", "b"]
+
+
+def test_use_trace_and_json_export(tmp_path):
+    store = TraceStore(export="none")
+    trace = store.start("run2")
+    assert current_trace() is None
+    with use_trace(trace):
+        assert current_trace() is trace
+    assert current_trace() is None
+
+    store.finish(trace)
+    path = export_json(trace, directory=str(tmp_path))
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["run_id"] == "run2"
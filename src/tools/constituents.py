@@ -0,0 +1,137 @@
+"""纳指 100 成分股快照：权重贡献、涨跌家数和领涨 / 领跌股（不经过 LLM）
+
+前 N 大成分股通过一次批量下载获取（经过行情缓存层，100 个代码与 1 个代码的开销相当），
+所有指标都用 pandas / NumPy 向量化计算，不逐个代码循环。
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.tools.market_data import get_market_data
+
+# 纳指 100 主要成分股的近似权重（%），用于估算各股对指数涨跌的贡献；
+# 权重随市值变化，需定期更新
+NDX_WEIGHTS = {
+    "NVDA": 9.6, "MSFT": 8.4, "AAPL": 7.7, "AMZN": 5.5, "AVGO": 5.0,
+    "META": 3.7, "TSLA": 2.9, "NFLX": 2.6, "GOOGL": 2.6, "GOOG": 2.5,
+    "COST": 2.4, "PLTR": 2.1, "AMD": 1.7, "CSCO": 1.5, "TMUS": 1.3,
+    "ASML": 1.2, "LIN": 1.1, "INTU": 1.0, "PEP": 1.0, "SHOP": 1.0,
+    "ISRG": 0.9, "TXN": 0.9, "QCOM": 0.9, "AMGN": 0.8, "BKNG": 0.8,
+    "ADBE": 0.8, "AMAT": 0.8, "MU": 0.8, "HON": 0.7, "PDD": 0.7,
+}
+
+# 默认取权重最大的前 N 只
+CONSTITUENTS_TOP_N = int(os.getenv("CONSTITUENTS_TOP_N", 20))
+# 领涨 / 领跌榜的长度
+TOP_MOVERS = 5
+# 取 5 个交易日，个别代码中间缺一天时仍能找到前两根有效 K 线
+CONSTITUENTS_PERIOD = "5d"
+
+
+def top_weights(top_n: int = CONSTITUENTS_TOP_N) -> pd.Series:
+    """权重最大的前 top_n 只成分股，按权重降序"""
+    return pd.Series(NDX_WEIGHTS, dtype=np.float64).nlargest(top_n)
+
+
+def _movers(frame: pd.DataFrame, column: str, ascending: bool) -> list[dict]:
+    rows = frame.sort_values(column, ascending=ascending).head(TOP_MOVERS)
+    rows = rows[rows[column] < 0] if ascending else rows[rows[column] > 0]
+    return rows.reset_index().round(3).to_dict("records")
+
+
+def compute_constituents(close: pd.DataFrame, weights: pd.Series) -> dict:
+    """根据成分股日收盘价（列为代码）计算最新交易日的贡献和市场宽度
+
+    贡献（百分点）= 权重(%) × 当日涨跌幅，所有贡献之和近似为这些成分股带来的指数涨跌幅
+    """
+    close = close.reindex(columns=weights.index).dropna(how="all")
+    if len(close) < 2:
+        raise ValueError("成分股日线数据不足，至少需要 2 根 K 线")
+
+    # 每个代码用自己最后两根有效 K 线计算涨跌幅，不用前值补齐（补齐会把缺数据当成平盘）
+    prices = close.to_numpy(dtype=np.float64)
+    has_price = np.isfinite(prices)
+    count = has_price.cumsum(axis=0)
+    total = count[-1]
+    last = np.argmax(has_price & (count == total), axis=0)
+    prev = np.argmax(has_price & (count == total - 1), axis=0)
+    columns = np.arange(prices.shape[1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = (prices[last, columns] / prices[prev, columns] - 1) * 100
+    # 最新交易日没有 K 线的代码（停牌、数据延迟）记为缺少数据
+    valid = (total >= 2) & (last == len(close) - 1) & np.isfinite(pct)
+    pct = np.where(valid, pct, np.nan)
+    w = weights.to_numpy(dtype=np.float64)
+    contribution = np.where(valid, w * pct / 100, np.nan)
+
+    frame = pd.DataFrame(
+        {"weight": w, "pct_change": pct, "contribution": contribution},
+        index=pd.Index(weights.index, name="symbol"),
+    )[valid]
+    advancing = pct[valid] > 0
+    declining = pct[valid] < 0
+
+    return {
+        "trade_date": pd.Timestamp(close.index[-1]).strftime("%Y-%m-%d"),
+        "constituents": int(valid.sum()),
+        "missing": weights.index[~valid].tolist(),
+        "covered_weight": round(float(w[valid].sum()), 2),
+        "contribution_total": round(float(np.nansum(contribution)), 3),
+        "advancers": int(advancing.sum()),
+        "decliners": int(declining.sum()),
+        "unchanged": int(valid.sum() - advancing.sum() - declining.sum()),
+        "advancing_weight": round(float(w[valid][advancing].sum()), 2),
+        "declining_weight": round(float(w[valid][declining].sum()), 2),
+        "top_contributors": _movers(frame, "contribution", ascending=False),
+        "top_detractors": _movers(frame, "contribution", ascending=True),
+        "top_gainers": _movers(frame, "pct_change", ascending=False),
+        "top_losers": _movers(frame, "pct_change", ascending=True),
+    }
+
+
+def get_constituents_snapshot(top_n: int = CONSTITUENTS_TOP_N) -> dict:
+    """一次批量下载前 top_n 只成分股的日线并计算快照"""
+    weights = top_weights(top_n)
+    wide = get_market_data().download(
+        tuple(weights.index), period=CONSTITUENTS_PERIOD, interval="1d"
+    )
+    return compute_constituents(wide["Close"], weights)
+
+
+def _format_movers(movers: list[dict]) -> str:
+    return "、".join(
+        f"{m['symbol']} {m['pct_change']:+.2f}%（{m['contribution']:+.3f} 点）"
+        for m in movers
+    ) or "无"
+
+
+def format_constituents(snapshot: dict) -> str:
+    """渲染成工具返回给 Agent 的文本"""
+    s = snapshot
+    lines = [
+        f"交易日 {s['trade_date']}，前 {s['constituents']} 大成分股"
+        f"（合计权重 {s['covered_weight']:.1f}%）"
+        f"共贡献指数涨跌 {s['contribution_total']:+.3f} 个百分点",
+        f"涨跌家数：上涨 {s['advancers']}（权重 {s['advancing_weight']:.1f}%）/ "
+        f"下跌 {s['decliners']}（权重 {s['declining_weight']:.1f}%）/ "
+        f"平盘 {s['unchanged']}",
+        f"正贡献最大：{_format_movers(s['top_contributors'])}",
+        f"负贡献最大：{_format_movers(s['top_detractors'])}",
+        f"涨幅最大：{_format_movers(s['top_gainers'])}",
+        f"跌幅最大：{_format_movers(s['top_losers'])}",
+    ]
+    if s["missing"]:
+        lines.append(f"缺少数据：{', '.join(s['missing'])}")
+    return "\n".join(lines)
+
+
+def format_constituents_context(snapshot: dict) -> str:
+    """快速模式下注入报告任务的 context 文本"""
+    payload = json.dumps(snapshot, ensure_ascii=False, indent=2)
+    return (
+        "【纳指 100 成分股表现】以下数据由程序根据行情直接计算，"
+        "贡献单位为指数百分点，可直接引用：\n"
+        f"```json\n{payload}\n```\n"
+    )
@@ -1,16 +1,47 @@
 # 封装 yfinance 获取数据的逻辑
 from crewai.tools import tool
-import yfinance as yf
+
+from src.tools.constituents import format_constituents, get_constituents_snapshot
+from src.tools.indicators import format_indicators, get_indicator_engine
+from src.tools.market_data import get_market_data
+from src.tools.market_metrics import get_qqq_snapshot
+from src.utils.metrics import TOOL_SECONDS
 
 
 @tool("nasdaq_data_tool")
 def get_nasdaq_data() -> str:
     """获取纳斯达克100指数(QQQ)的最新价格和今日涨跌幅"""
-    ticker = yf.Ticker("QQQ")
-    data = ticker.history(period="1d")
+    with TOOL_SECONDS.time(tool="nasdaq_data_tool"):
+        data = get_market_data().history("QQQ", period="1d")
+        # 多日指标从本地历史库读取，不需要额外下载
+        snapshot = get_qqq_snapshot()
     latest_price = data["Close"].iloc[-1]
     change = data["Close"].iloc[-1] - data["Open"].iloc[0]
     pct_change = (change / data["Open"].iloc[0]) * 100
     return (
-        f"最新价: {latest_price:.2f}, 涨跌额: {change:.2f}, 涨跌幅: {pct_change:.2f}%"
+        f"最新价: {latest_price:.2f}, 涨跌额: {change:.2f}, 涨跌幅: {pct_change:.2f}%, "
+        f"本周以来: {snapshot['week_to_date_pct']:+.2f}%, "
+        f"52 周高/低: {snapshot['high_52w']:.2f}/{snapshot['low_52w']:.2f}, "
+        f"距 52 周高点回撤: {abs(snapshot['drawdown_from_high_pct']):.2f}%"
     )
+
+
+@tool("constituents_tool")
+def get_constituents() -> str:
+    """获取纳斯达克100前几大成分股今日的涨跌幅、对指数涨跌的贡献、涨跌家数和领涨领跌股"""
+    with TOOL_SECONDS.time(tool="constituents_tool"):
+        snapshot = get_constituents_snapshot()
+    return format_constituents(snapshot)
+
+
+@tool("technical_indicators_tool")
+def get_technical_indicators() -> str:
+    """获取纳斯达克100指数(QQQ)的技术指标
+
+    包括 RSI、MACD、布林带、50/200 日均线交叉、ATR 和已实现波动率。
+    """
+    with TOOL_SECONDS.time(tool="technical_indicators_tool"):
+        values = get_indicator_engine().latest(("QQQ",))
+    if "QQQ" not in values:
+        return "QQQ 暂无行情数据，无法计算技术指标"
+    return format_indicators("QQQ", values["QQQ"])
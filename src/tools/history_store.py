@@ -0,0 +1,349 @@
+"""本地 OHLCV 历史库：定长记录的二进制文件 + 内存映射读取
+
+每个 (周期, 代码) 一个文件 HISTORY_DIR/<interval>/<symbol>.bars，记录按时间升序排列，
+每条记录为 BAR_DTYPE（UTC 纳秒时间戳 + OHLCV）：
+- 更新时只下载上次存储之后的 K 线并追加到文件末尾，不重写已有数据；
+  最后一根 K 线可能是盘中未完成的，更新时原地替换
+- 存储未复权价格（两条下载路径都用 auto_adjust=False）；拆股等调整会改写历史价格，
+  增量下载与本地重叠的 K 线对不上时，整段重新回填
+- 读取通过 np.memmap 映射文件，按时间戳二分查找区间，只拷贝需要的那一段
+- 写入中途崩溃留下的半条记录在读取时忽略，下次追加前截掉
+
+HistoryFetcher 实现与 YFinanceFetcher 相同的接口，由 get_market_data() 放在数据源前面：
+HISTORY_STORE=on 时先增量更新再从本地读取，offline 时只读本地
+（可用已有的历史库快照离线运行）。
+"""
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.tools.market_data import _PERIOD_DAYS, MARKET_TZ
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# on | offline | off
+HISTORY_STORE = os.getenv("HISTORY_STORE", "on")
+HISTORY_DIR = os.getenv("HISTORY_DIR", ".cache/history")
+
+BAR_DTYPE = np.dtype([
+    ("ts", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+COLUMNS = {
+    "open": "Open",
+    "high": "High",
+    "low": "Low",
+    "close": "Close",
+    "volume": "Volume",
+}
+
+# 首次下载的回填长度：日线覆盖 52 周指标，分钟线受 yfinance 的历史长度限制
+BACKFILL_PERIOD = {"1d": "2y", "1m": "5d", "60m": "1y", "1h": "1y"}
+DEFAULT_INTRADAY_BACKFILL = "1mo"
+# 重叠 K 线收盘价的相对误差超过该值，视为上游做了拆股等价格调整
+ADJUSTMENT_RTOL = 1e-4
+# 按天数从小到大，增量更新时选能覆盖缺口的最短 period
+_PERIODS = sorted(
+    (p for p in _PERIOD_DAYS if p not in ("ytd", "max")), key=lambda p: _PERIOD_DAYS[p]
+)
+
+
+def _to_ns(value) -> int:
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is None:
+        stamp = stamp.tz_localize(MARKET_TZ)
+    # 统一按纳秒存储，与索引自身的精度（pandas 3 默认微秒）无关
+    return stamp.as_unit("ns").value
+
+
+def to_bars(frame: pd.DataFrame) -> np.ndarray:
+    """yfinance 格式的 OHLCV DataFrame 转成 BAR_DTYPE 数组（丢弃收盘价缺失的行）"""
+    if frame.empty:
+        return np.empty(0, dtype=BAR_DTYPE)
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is None:
+        index = index.tz_localize(MARKET_TZ)
+    bars = np.empty(len(frame), dtype=BAR_DTYPE)
+    bars["ts"] = index.as_unit("ns").asi8
+    for field, column in COLUMNS.items():
+        bars[field] = frame[column].to_numpy(dtype=np.float64)
+    bars = bars[np.isfinite(bars["close"])]
+    return bars[np.argsort(bars["ts"], kind="stable")]
+
+
+def to_frame(bars: np.ndarray) -> pd.DataFrame:
+    index = pd.to_datetime(bars["ts"], unit="ns", utc=True).tz_convert(MARKET_TZ)
+    columns = {column: bars[field] for field, column in COLUMNS.items()}
+    frame = pd.DataFrame(columns, index=index)
+    frame["Volume"] = frame["Volume"].astype(np.int64)
+    return frame
+
+
+class HistoryStore:
+    """按 (周期, 代码) 分文件存储的 K 线库，可在多个线程中使用"""
+
+    def __init__(self, root: str = HISTORY_DIR):
+        self.root = root
+        self._locks: dict[tuple[str, str], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, interval, f"{symbol}.bars")
+
+    def _lock(self, symbol: str, interval: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault((symbol, interval), threading.Lock())
+
+    def _bars(self, symbol: str, interval: str) -> np.ndarray:
+        """内存映射整个文件（只映射完整的记录）"""
+        path = self._path(symbol, interval)
+        try:
+            count = os.path.getsize(path) // BAR_DTYPE.itemsize
+        except FileNotFoundError:
+            count = 0
+        if count == 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.memmap(path, dtype=BAR_DTYPE, mode="r", shape=(count,))
+
+    def count(self, symbol: str, interval: str = "1d") -> int:
+        return len(self._bars(symbol, interval))
+
+    def last_timestamp(
+        self, symbol: str, interval: str = "1d"
+    ) -> Optional[pd.Timestamp]:
+        bars = self._bars(symbol, interval)
+        if not len(bars):
+            return None
+        last = pd.Timestamp(int(bars["ts"][-1]), unit="ns", tz="UTC")
+        return last.tz_convert(MARKET_TZ)
+
+    def read(
+        self, symbol: str, interval: str = "1d", start=None, end=None
+    ) -> pd.DataFrame:
+        """[start, end] 区间内的 K 线，不指定时取到两端"""
+        bars = self._bars(symbol, interval)
+        ts = bars["ts"]
+        lo, hi = 0, len(bars)
+        if start is not None:
+            lo = int(np.searchsorted(ts, _to_ns(start), "left"))
+        if end is not None:
+            hi = int(np.searchsorted(ts, _to_ns(end), "right"))
+        return to_frame(np.array(bars[lo:hi]))
+
+    def tail(
+        self, symbol: str, interval: str = "1d", sessions: int = 1
+    ) -> pd.DataFrame:
+        """最近 sessions 个交易日的 K 线（与 yfinance 的 period 语义一致）"""
+        bars = self._bars(symbol, interval)
+        if not len(bars):
+            return to_frame(bars)
+        index = pd.to_datetime(bars["ts"], unit="ns", utc=True)
+        dates = index.tz_convert(MARKET_TZ).normalize().unique()
+        start = dates[-min(sessions, len(dates))]
+        return self.read(symbol, interval, start=start)
+
+    def append(self, symbol: str, interval: str, frame: pd.DataFrame) -> int:
+        """追加上次存储之后的 K 线，返回新增的条数
+
+        与最后一条时间相同的 K 线替换它（盘中未完成的 K 线），更早的忽略
+        """
+        bars = to_bars(frame)
+        path = self._path(symbol, interval)
+        size = BAR_DTYPE.itemsize
+        with self._lock(symbol, interval):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "ab").close()
+            with open(path, "r+b") as f:
+                end = f.seek(0, os.SEEK_END)
+                # 丢掉末尾不完整的半条记录
+                offset = end - end % size
+                replaced = False
+                if offset:
+                    f.seek(offset - size)
+                    last_ts = int(np.frombuffer(f.read(size), dtype=BAR_DTYPE)["ts"][0])
+                    bars = bars[bars["ts"] >= last_ts]
+                    if len(bars) and bars["ts"][0] == last_ts:
+                        # 原地覆盖，不截断文件：其他线程可能正映射着这条记录
+                        offset -= size
+                        replaced = True
+                if not len(bars):
+                    return 0
+                f.seek(offset)
+                f.write(bars.tobytes())
+                if f.tell() < end:
+                    f.truncate()
+        return len(bars) - replaced
+
+
+    def matches(self, symbol: str, interval: str, frame: pd.DataFrame) -> bool:
+        """frame 与本地已完成（最后一根之前）的 K 线重叠部分的收盘价是否一致"""
+        stored = self._bars(symbol, interval)
+        if len(stored) < 2:
+            return True
+        ts = stored["ts"]
+        bars = to_bars(frame)
+        bars = bars[bars["ts"] < ts[-1]]
+        positions = np.searchsorted(ts, bars["ts"])
+        found = ts[positions] == bars["ts"]
+        return bool(np.allclose(
+            stored["close"][positions[found]],
+            bars["close"][found],
+            rtol=ADJUSTMENT_RTOL,
+        ))
+
+    def rewrite(self, symbol: str, interval: str, frame: pd.DataFrame) -> int:
+        """用 frame 整体替换该代码的历史，返回写入的条数
+
+        先写临时文件再原子替换：正在映射旧文件的读取方不受影响
+        """
+        bars = to_bars(frame)
+        path = self._path(symbol, interval)
+        with self._lock(symbol, interval):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(bars.tobytes())
+            os.replace(tmp_path, path)
+        return len(bars)
+
+
+def update_period(
+    last: Optional[pd.Timestamp], interval: str, now: datetime = None
+) -> str:
+    """覆盖从 last 到现在的缺口所需的最短 period；没有本地数据时返回回填长度
+
+    至少多取一个交易日，与本地已完成的 K 线重叠，用来发现上游的价格调整
+    """
+    backfill = BACKFILL_PERIOD.get(interval, DEFAULT_INTRADAY_BACKFILL)
+    if last is None:
+        return backfill
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    gap = len(pd.bdate_range(last.tz_convert(MARKET_TZ).date(), now.date()))
+    for period in _PERIODS:
+        if _PERIOD_DAYS[period] > gap:
+            break
+    # 缺口超过回填长度时只补回填长度（分钟线更早的数据 yfinance 也不提供）
+    return min(period, backfill, key=lambda p: _PERIOD_DAYS[p])
+
+
+class HistoryFetcher:
+    """先增量更新本地历史库，再从本地读取；upstream 为 None 时只读本地"""
+
+    def __init__(self, store: HistoryStore, upstream=None):
+        self.store = store
+        self.upstream = upstream
+        self.name = f"history+{upstream.name}" if upstream is not None else "history"
+
+    def update(self, symbols, interval: str) -> int:
+        """把 symbols 更新到最新，多个代码合并成一次批量下载，返回新增的 K 线数"""
+        symbols = tuple(symbols)
+        periods = [
+            update_period(self.store.last_timestamp(s, interval), interval)
+            for s in symbols
+        ]
+        period = max(periods, key=lambda p: _PERIOD_DAYS[p])
+        frames = self._fetch(symbols, period, interval)
+        adjusted = tuple(
+            s for s, frame in frames.items()
+            if not self.store.matches(s, interval, frame)
+        )
+        added = sum(
+            self.store.append(s, interval, frame)
+            for s, frame in frames.items()
+            if s not in adjusted
+        )
+        if adjusted:
+            # 历史价格被调整过，增量追加会混入两种价格口径，整段重新回填
+            backfill = BACKFILL_PERIOD.get(interval, DEFAULT_INTRADAY_BACKFILL)
+            logger.warning(
+                "历史价格已调整，重新回填 %s（%s, period=%s）",
+                ", ".join(adjusted),
+                interval,
+                backfill,
+            )
+            for s, frame in self._fetch(adjusted, backfill, interval).items():
+                before = self.store.count(s, interval)
+                added += max(0, self.store.rewrite(s, interval, frame) - before)
+        logger.debug(
+            "历史库更新 %d 个代码（%s, period=%s），新增 %d 根 K 线",
+            len(symbols),
+            interval,
+            period,
+            added,
+        )
+        return added
+
+    def _fetch(self, symbols: tuple, period: str, interval: str) -> dict:
+        """从上游下载，返回 代码 -> OHLCV DataFrame（上游没有数据的代码不出现）"""
+        if len(symbols) == 1:
+            return {symbols[0]: self.upstream.history(symbols[0], period, interval)}
+        wide = self.upstream.download(symbols, period, interval)
+        present = set(wide.columns.get_level_values(1))
+        return {s: wide.xs(s, axis=1, level=1) for s in symbols if s in present}
+
+    def _refresh(self, symbols: tuple, interval: str):
+        """增量更新失败时，本地已有数据的继续使用本地数据"""
+        try:
+            self.update(symbols, interval)
+        except Exception as e:
+            if not all(self.store.count(s, interval) for s in symbols):
+                raise
+            logger.warning("历史库更新失败，使用本地数据 (%s): %s", interval, e)
+
+    def history(self, symbol: str, period: str, interval: str) -> pd.DataFrame:
+        if self.upstream is not None:
+            self._refresh((symbol,), interval)
+        return self.store.tail(symbol, interval, _PERIOD_DAYS.get(period, 21))
+
+    def download(self, symbols: tuple, period: str, interval: str) -> pd.DataFrame:
+        """批量读取，列为 (字段, 代码) 的 MultiIndex"""
+        if self.upstream is not None:
+            self._refresh(tuple(symbols), interval)
+        sessions = _PERIOD_DAYS.get(period, 21)
+        frames = {
+            symbol: self.store.tail(symbol, interval, sessions) for symbol in symbols
+        }
+        wide = pd.concat(frames, axis=1)
+        return wide.swaplevel(0, 1, axis=1).sort_index(axis=1)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HistoryStore()
+    return _store
+
+
+if __name__ == "__main__":
+    # 预先下载 QQQ 和成分股日线，生成可离线使用的历史库快照
+    # 运行: uv run python -m src.tools.history_store
+    from src.tools.constituents import NDX_WEIGHTS
+    from src.tools.market_data import (
+        MARKET_DATA_SOURCE,
+        FixtureFetcher,
+        YFinanceFetcher,
+    )
+
+    if MARKET_DATA_SOURCE == "fixture":
+        upstream = FixtureFetcher()
+    else:
+        upstream = YFinanceFetcher()
+    fetcher = HistoryFetcher(get_history_store(), upstream)
+    symbols = ("QQQ", *NDX_WEIGHTS)
+    added = fetcher.update(symbols, "1d")
+    print(f"{len(symbols)} 个代码已更新到 {HISTORY_DIR}，新增 {added} 根日线")
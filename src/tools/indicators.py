@@ -0,0 +1,252 @@
+"""技术指标引擎：RSI、MACD、布林带、均线交叉、ATR 和已实现波动率（不经过 LLM）
+
+所有代码的日线排成 (日期 × 代码) 的二维表，一次向量化计算全部指标，不逐个代码循环。
+结果按 (代码, 周期, 最新 K 线时间, 最新收盘价) 缓存：先用几天的短行情探测最新 K 线，
+命中时不再下载完整历史；新 K 线出现或盘中未完成的 K 线价格变化时才重新计算。
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from src.tools.market_data import get_market_data
+from src.utils.cache import CacheStats
+
+# 200 日均线需要足够的预热数据，默认取两年日线（来自本地历史库，只增量下载）
+INDICATOR_PERIOD = os.getenv("INDICATOR_PERIOD", "2y")
+INDICATOR_CACHE_MAX_ENTRIES = int(os.getenv("INDICATOR_CACHE_MAX_ENTRIES", 4096))
+# 探测最新 K 线用的短行情长度
+PROBE_PERIOD = "5d"
+
+RSI_WINDOW = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BB_WINDOW, BB_STD = 20, 2.0
+MA_FAST, MA_SLOW = 50, 200
+ATR_WINDOW = 14
+VOL_WINDOW = 20
+TRADING_DAYS = 252
+
+
+def _wilder(frame: pd.DataFrame, window: int) -> pd.DataFrame:
+    return frame.ewm(alpha=1 / window, adjust=False).mean()
+
+
+def compute_indicators(
+    high: pd.DataFrame, low: pd.DataFrame, close: pd.DataFrame
+) -> pd.DataFrame:
+    """根据 (日期 × 代码) 的最高价、最低价、收盘价计算每个代码最新一根 K 线的指标
+
+    返回以代码为索引、指标为列的 DataFrame；数据不足的指标为 NaN
+    """
+    close = close.ffill()
+    high = high.reindex_like(close).fillna(close)
+    low = low.reindex_like(close).fillna(close)
+
+    # RSI（Wilder 平滑）；涨跌都为 0 时记为 50
+    delta = close.diff()
+    avg_gain = _wilder(delta.clip(lower=0), RSI_WINDOW)
+    avg_loss = _wilder(-delta.clip(upper=0), RSI_WINDOW)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    rsi = rsi.mask((avg_gain == 0) & (avg_loss == 0), 50.0)
+
+    # MACD
+    ema_fast = close.ewm(span=MACD_FAST, adjust=False).mean()
+    ema_slow = close.ewm(span=MACD_SLOW, adjust=False).mean()
+    macd = ema_fast - ema_slow
+    macd_signal = macd.ewm(span=MACD_SIGNAL, adjust=False).mean()
+
+    # 布林带
+    middle = close.rolling(BB_WINDOW).mean()
+    std = close.rolling(BB_WINDOW).std(ddof=0)
+    upper = middle + BB_STD * std
+    lower = middle - BB_STD * std
+
+    # 均线交叉：快线减慢线的符号变化处即为金叉 / 死叉
+    ma_fast = close.rolling(MA_FAST).mean()
+    ma_slow = close.rolling(MA_SLOW).mean()
+    trend = np.sign((ma_fast - ma_slow).to_numpy())
+    before, after = trend[:-1], trend[1:]
+    crossed = (
+        np.isfinite(before)
+        & np.isfinite(after)
+        & (before != 0)
+        & (after != 0)
+        & (before != after)
+    )
+    rows = np.arange(1, len(close))[:, None]
+    last_cross = np.where(crossed, rows, -1).max(axis=0, initial=-1)
+
+    # ATR（Wilder 平滑）
+    prev_close = close.shift()
+    true_range = np.fmax.reduce([
+        (high - low).to_numpy(),
+        (high - prev_close).abs().to_numpy(),
+        (low - prev_close).abs().to_numpy(),
+    ])
+    true_range = pd.DataFrame(true_range, index=close.index, columns=close.columns)
+    atr = _wilder(true_range, ATR_WINDOW)
+
+    # 已实现波动率：对数收益率的滚动标准差，年化
+    log_returns = np.log(close).diff()
+    realized_vol = log_returns.rolling(VOL_WINDOW).std() * np.sqrt(TRADING_DAYS) * 100
+
+    last = close.iloc[-1]
+    result = pd.DataFrame({
+        "close": last,
+        "rsi": rsi.iloc[-1],
+        "macd": macd.iloc[-1],
+        "macd_signal": macd_signal.iloc[-1],
+        "macd_hist": (macd - macd_signal).iloc[-1],
+        "bb_upper": upper.iloc[-1],
+        "bb_middle": middle.iloc[-1],
+        "bb_lower": lower.iloc[-1],
+        "bb_percent_b": ((close - lower) / (upper - lower)).iloc[-1],
+        "ma_fast": ma_fast.iloc[-1],
+        "ma_slow": ma_slow.iloc[-1],
+        "ma_trend": trend[-1] if len(trend) else np.nan,
+        "days_since_cross": np.where(
+            last_cross >= 0, len(close) - 1 - last_cross, np.nan
+        ),
+        "atr": atr.iloc[-1],
+        "atr_pct": (atr.iloc[-1] / last) * 100,
+        "realized_vol": realized_vol.iloc[-1],
+    })
+    result.index.name = "symbol"
+    return result
+
+
+def last_bars(close: pd.DataFrame) -> dict[str, tuple[int, float]]:
+    """每个代码最后一根有效 K 线的 (UTC 纳秒时间戳, 收盘价)，没有数据的代码不出现"""
+    if close.empty:
+        return {}
+    valid = close.notna().to_numpy()
+    position = len(close) - 1 - valid[::-1].argmax(axis=0)
+    stamps = pd.DatetimeIndex(close.index).as_unit("ns").asi8[position]
+    values = close.to_numpy()[position, np.arange(close.shape[1])]
+    return {
+        symbol: (int(ts), float(value))
+        for symbol, ts, value, has_data in zip(
+            close.columns, stamps, values, valid.any(axis=0)
+        )
+        if has_data
+    }
+
+
+class IndicatorEngine:
+    """按 (代码, 周期, 最新 K 线时间, 最新收盘价) 缓存指标，只为缓存未命中的代码计算"""
+
+    def __init__(
+        self,
+        max_entries: int = INDICATOR_CACHE_MAX_ENTRIES,
+        period: str = INDICATOR_PERIOD,
+    ):
+        self.max_entries = max_entries
+        self.period = period
+        self.stats = CacheStats()
+        self._entries: OrderedDict[tuple, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def latest(self, symbols, interval: str = "1d") -> dict[str, dict]:
+        """symbols 中每个代码最新一根 K 线的指标（代码 -> 指标字典）"""
+        symbols = tuple(symbols)
+        market = get_market_data()
+        # 先用短行情确定每个代码的最新 K 线；盘中 K 线的收盘价变化也会换成新的键
+        probe = market.download(symbols, period=PROBE_PERIOD, interval=interval)
+        bars = last_bars(probe["Close"].reindex(columns=list(symbols)))
+        keys = {symbol: (symbol, interval, *bar) for symbol, bar in bars.items()}
+
+        results, missing = {}, []
+        with self._lock:
+            for symbol, key in keys.items():
+                entry = self._entries.get(key)
+                if entry is None:
+                    missing.append(symbol)
+                else:
+                    self._entries.move_to_end(key)
+                    results[symbol] = entry
+        self.stats.incr("hits", len(results))
+        if not missing:
+            return results
+
+        # 只为未命中的代码下载完整历史
+        self.stats.incr("misses", len(missing))
+        wide = market.download(tuple(missing), period=self.period, interval=interval)
+        close = wide["Close"].reindex(columns=missing)
+        high = wide["High"].reindex(columns=missing)
+        low = wide["Low"].reindex(columns=missing)
+        computed = compute_indicators(high, low, close)
+        computed = computed.astype(np.float64).round(4)
+        computed = computed.astype(object).where(computed.notna(), None)
+        computed = computed.to_dict("index")
+        with self._lock:
+            for symbol, values in computed.items():
+                self._entries[keys[symbol]] = values
+                results[symbol] = values
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return results
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            entries = len(self._entries)
+        return {**self.stats.snapshot(), "entries": entries}
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_indicator_engine() -> IndicatorEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = IndicatorEngine()
+    return _engine
+
+
+def _fmt(value, spec: str = ".2f") -> str:
+    return "N/A" if value is None else format(value, spec)
+
+
+def format_indicators(symbol: str, values: dict) -> str:
+    """渲染成工具返回给 Agent 的文本"""
+    v = values
+    rsi = v["rsi"]
+    rsi_state = ""
+    if rsi is not None and rsi >= 70:
+        rsi_state = "（超买）"
+    elif rsi is not None and rsi <= 30:
+        rsi_state = "（超卖）"
+    if v["ma_trend"] is None:
+        cross = "数据不足"
+    else:
+        side = "高于" if v["ma_trend"] > 0 else "低于"
+        cross = f"{MA_FAST} 日线{side} {MA_SLOW} 日线"
+        if v["days_since_cross"] is not None:
+            kind = "金叉" if v["ma_trend"] > 0 else "死叉"
+            cross += f"，{int(v['days_since_cross'])} 个交易日前{kind}"
+    return "\n".join([
+        f"{symbol} 技术指标（收盘 {_fmt(v['close'])}）",
+        f"RSI({RSI_WINDOW}): {_fmt(rsi)}{rsi_state}",
+        f"MACD({MACD_FAST},{MACD_SLOW},{MACD_SIGNAL}): {_fmt(v['macd'], '.3f')}，"
+        f"信号线 {_fmt(v['macd_signal'], '.3f')}，柱 {_fmt(v['macd_hist'], '+.3f')}",
+        f"布林带({BB_WINDOW},{BB_STD:g}): 上轨 {_fmt(v['bb_upper'])} / "
+        f"中轨 {_fmt(v['bb_middle'])} / "
+        f"下轨 {_fmt(v['bb_lower'])}，%B {_fmt(v['bb_percent_b'])}",
+        f"均线: MA{MA_FAST} {_fmt(v['ma_fast'])} / "
+        f"MA{MA_SLOW} {_fmt(v['ma_slow'])}，{cross}",
+        f"ATR({ATR_WINDOW}): {_fmt(v['atr'])}（{_fmt(v['atr_pct'])}%）",
+        f"{VOL_WINDOW} 日已实现波动率（年化）: {_fmt(v['realized_vol'])}%",
+    ])
+
+
+def format_indicators_context(symbol: str, values: dict) -> str:
+    """快速模式下注入报告任务的 context 文本"""
+    return (
+        "【技术指标】以下数据由程序根据行情直接计算，可直接引用：\n"
+        f"```\n{format_indicators(symbol, values)}\n```\n"
+    )
@@ -0,0 +1,296 @@
+"""行情数据缓存层
+
+所有工具都通过 get_market_data() 获取行情，不再各自直接调用 yfinance：
+- TTL 随交易时段变化：盘中较短，收盘后缓存到下一次开盘
+- 同一份数据的并发请求只会触发一次下载（single-flight）
+- 存储后端可插拔（内存 / 磁盘），数据源可切换为离线 fixture，方便基准测试
+- 默认经过本地历史库（src/tools/history_store.py），只下载上次存储之后的 K 线
+"""
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from src.utils.cache import CacheStats, DiskBackend, MemoryBackend, SingleFlight
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = (9, 30)
+MARKET_CLOSE = (16, 0)
+
+# 盘中 TTL（秒）
+REGULAR_TTL = float(os.getenv("MARKET_DATA_REGULAR_TTL", 60))
+# 收盘后的一段时间内数据可能还在修正，继续使用短 TTL
+CLOSE_GRACE = timedelta(minutes=15)
+
+MARKET_DATA_SOURCE = os.getenv("MARKET_DATA_SOURCE", "yfinance")  # yfinance | fixture
+MARKET_DATA_CACHE = os.getenv("MARKET_DATA_CACHE", "memory")  # memory | disk
+MARKET_DATA_CACHE_DIR = os.getenv("MARKET_DATA_CACHE_DIR", ".cache/market_data")
+
+
+def _session_bounds(day: datetime) -> tuple[datetime, datetime]:
+    midnight = day.replace(hour=0, minute=0, second=0, microsecond=0)
+    open_at = midnight.replace(hour=MARKET_OPEN[0], minute=MARKET_OPEN[1])
+    close_at = midnight.replace(hour=MARKET_CLOSE[0], minute=MARKET_CLOSE[1])
+    return open_at, close_at
+
+
+def next_market_open(now: datetime = None) -> datetime:
+    """下一次开盘时间（只跳过周末，未计入交易所假日）"""
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    day = now
+    while True:
+        open_at, _ = _session_bounds(day)
+        if day.weekday() < 5 and open_at > now:
+            return open_at
+        day = (day + timedelta(days=1)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+
+
+def is_regular_session(now: datetime = None) -> bool:
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    if now.weekday() >= 5:
+        return False
+    open_at, close_at = _session_bounds(now)
+    return open_at <= now < close_at
+
+
+def _is_live(now: datetime) -> bool:
+    """盘中或收盘后的修正窗口内，行情仍在变化"""
+    if is_regular_session(now):
+        return True
+    _, close_at = _session_bounds(now)
+    return now.weekday() < 5 and close_at <= now < close_at + CLOSE_GRACE
+
+
+def market_ttl(now: datetime = None) -> float:
+    """根据交易时段计算缓存有效期（秒）"""
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    if _is_live(now):
+        return REGULAR_TTL
+    return max(REGULAR_TTL, (next_market_open(now) - now).total_seconds())
+
+
+def market_snapshot_key(now: datetime = None) -> str:
+    """当前行情快照的标识：盘中按 REGULAR_TTL 分桶，休市期间到下次开盘前保持不变"""
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    if _is_live(now):
+        return f"live:{int(now.timestamp() // REGULAR_TTL)}"
+    return f"closed:{next_market_open(now):%Y-%m-%d}"
+
+
+class YFinanceFetcher:
+    """从 yfinance 下载行情"""
+
+    name = "yfinance"
+
+    def history(self, symbol: str, period: str, interval: str) -> pd.DataFrame:
+        import yfinance as yf
+
+        # 与 download() 一致使用未复权价格，两条路径写入历史库的口径相同
+        return yf.Ticker(symbol).history(
+            period=period, interval=interval, auto_adjust=False
+        )
+
+    def download(self, symbols: tuple, period: str, interval: str) -> pd.DataFrame:
+        """批量下载，列为 (字段, 代码) 的 MultiIndex"""
+        import yfinance as yf
+
+        return yf.download(
+            list(symbols),
+            period=period,
+            interval=interval,
+            group_by="column",
+            auto_adjust=False,
+            threads=True,
+            progress=False,
+        )
+
+
+_PERIOD_DAYS = {
+    "1d": 1, "5d": 5, "1mo": 21, "3mo": 63, "6mo": 126,
+    "1y": 252, "2y": 504, "5y": 1260, "10y": 2520, "ytd": 200, "max": 5040,
+}
+_INTERVAL_MINUTES = {
+    "1m": 1, "2m": 2, "5m": 5, "15m": 15, "30m": 30, "60m": 60, "1h": 60, "90m": 90,
+}
+
+
+def _hash_uniform(seed: int, stamps: np.ndarray, salt: int) -> np.ndarray:
+    """按 (代码, 时间戳) 生成 [0, 1) 的确定性均匀随机数（splitmix64）"""
+    offset = (seed * 0x9E3779B97F4A7C15 + salt * 0xBF58476D1CE4E5B9) % (1 << 64)
+    x = stamps.astype(np.uint64) + np.uint64(offset)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _hash_normal(seed: int, stamps: np.ndarray, salt: int) -> np.ndarray:
+    u1 = _hash_uniform(seed, stamps, 2 * salt)
+    u2 = _hash_uniform(seed, stamps, 2 * salt + 1)
+    return np.sqrt(-2 * np.log1p(-u1)) * np.cos(2 * np.pi * u2)
+
+
+class FixtureFetcher:
+    """离线数据源：按代码生成确定性的模拟行情，用于测试和基准
+
+    每根 K 线的价格只由 (代码, 时间戳) 决定，与请求的 period 无关，
+    增量下载的 K 线与此前下载的完全一致（和真实数据源一样）
+    """
+
+    name = "fixture"
+
+    def __init__(self, end: datetime = None):
+        self.end = end
+
+    def history(self, symbol: str, period: str, interval: str) -> pd.DataFrame:
+        return self._generate(symbol, self._index(period, interval))
+
+    def download(self, symbols: tuple, period: str, interval: str) -> pd.DataFrame:
+        # 直接生成，不经过可被子类覆盖的 history()；所有代码共用一个时间索引
+        index = self._index(period, interval)
+        frames = {symbol: self._generate(symbol, index) for symbol in symbols}
+        wide = pd.concat(frames, axis=1)
+        return wide.swaplevel(0, 1, axis=1).sort_index(axis=1)
+
+    def _generate(self, symbol: str, index: pd.DatetimeIndex) -> pd.DataFrame:
+        seed = zlib.crc32(symbol.encode("utf-8"))
+        stamps = pd.DatetimeIndex(index).as_unit("ns").asi8
+        years = stamps / (365.25 * 86400 * 1e9)
+        phase = seed % 628 / 100
+        base = 50 + seed % 500
+        # 趋势 + 两个周期的波动 + 每根 K 线独立的噪声
+        log_close = (
+            np.log(base)
+            + 0.08 * (years - 50)
+            + 0.15 * np.sin(2 * np.pi * years / 1.3 + phase)
+            + 0.05 * np.sin(2 * np.pi * years / 0.25 + 2 * phase)
+            + 0.012 * _hash_normal(seed, stamps, 0)
+        )
+        close = np.exp(log_close)
+        open_ = close * np.exp(0.005 * _hash_normal(seed, stamps, 1))
+        spread = np.abs(0.008 * _hash_normal(seed, stamps, 2))
+        high = np.maximum(open_, close) * (1 + spread)
+        low = np.minimum(open_, close) * (1 - spread)
+        volume = (1_000_000 + _hash_uniform(seed, stamps, 7) * 49_000_000).astype(
+            np.int64
+        )
+        return pd.DataFrame(
+            {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+            index=index,
+        )
+
+    def _index(self, period: str, interval: str) -> pd.DatetimeIndex:
+        end = (self.end or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+        days = _PERIOD_DAYS.get(period, 21)
+        if interval in _INTERVAL_MINUTES:
+            step = _INTERVAL_MINUTES[interval]
+            sessions = pd.bdate_range(end=end.date(), periods=days)
+            open_minute = MARKET_OPEN[0] * 60 + MARKET_OPEN[1]
+            close_minute = MARKET_CLOSE[0] * 60 + MARKET_CLOSE[1]
+            per_day = (close_minute - open_minute) // step
+            offsets = pd.to_timedelta(open_minute + np.arange(per_day) * step, unit="m")
+            stamps = (sessions.values[:, None] + offsets.values[None, :]).ravel()
+            return pd.DatetimeIndex(stamps).tz_localize(MARKET_TZ)
+        return pd.bdate_range(end=end.date(), periods=days, tz=MARKET_TZ)
+
+
+class MarketDataCache:
+    """带交易时段 TTL、请求合并和命中统计的行情缓存"""
+
+    def __init__(self, fetcher=None, backend=None, ttl_fn=market_ttl):
+        self.fetcher = fetcher or YFinanceFetcher()
+        self.backend = backend or MemoryBackend()
+        self.ttl_fn = ttl_fn
+        self.stats = CacheStats()
+        self._flight = SingleFlight()
+
+    def _get(self, key: str, loader):
+        entry = self.backend.get(key)
+        if entry is not None and entry[1] > time.time():
+            self.stats.incr("hits")
+            return entry[0]
+
+        def load():
+            # 排队期间可能已被其他调用方写入
+            entry = self.backend.get(key)
+            if entry is not None and entry[1] > time.time():
+                return entry[0]
+            value = loader()
+            self.backend.set(key, value, time.time() + self.ttl_fn())
+            return value
+
+        try:
+            value, shared = self._flight.do(key, load)
+        except Exception:
+            self.stats.incr("errors")
+            raise
+        self.stats.incr("coalesced" if shared else "misses")
+        return value
+
+    def history(
+        self, symbol: str, period: str = "1d", interval: str = "1d"
+    ) -> pd.DataFrame:
+        """单个标的的 OHLCV（返回的 DataFrame 为共享对象，请勿原地修改）"""
+        key = f"{self.fetcher.name}:history:{symbol}:{period}:{interval}"
+        return self._get(key, lambda: self.fetcher.history(symbol, period, interval))
+
+    def download(
+        self, symbols, period: str = "5d", interval: str = "1d"
+    ) -> pd.DataFrame:
+        """批量 OHLCV，列为 (字段, 代码) 的 MultiIndex"""
+        symbols = tuple(sorted(set(symbols)))
+        key = f"{self.fetcher.name}:download:{','.join(symbols)}:{period}:{interval}"
+        return self._get(key, lambda: self.fetcher.download(symbols, period, interval))
+
+    def get_stats(self) -> dict:
+        return {
+            "source": self.fetcher.name,
+            "backend": self.backend.name,
+            **self.stats.snapshot(),
+        }
+
+
+_market_data = None
+_market_data_lock = threading.Lock()
+
+
+def get_market_data() -> MarketDataCache:
+    """获取全局行情缓存（数据源和后端由环境变量决定）"""
+    global _market_data
+    if _market_data is None:
+        with _market_data_lock:
+            if _market_data is None:
+                # 避免循环导入：history_store 依赖本模块的常量
+                from src.tools.history_store import (
+                    HISTORY_STORE,
+                    HistoryFetcher,
+                    get_history_store,
+                )
+
+                if MARKET_DATA_SOURCE == "fixture":
+                    fetcher = FixtureFetcher()
+                else:
+                    fetcher = YFinanceFetcher()
+                if HISTORY_STORE == "on":
+                    fetcher = HistoryFetcher(get_history_store(), fetcher)
+                elif HISTORY_STORE == "offline":
+                    fetcher = HistoryFetcher(get_history_store())
+                if MARKET_DATA_CACHE == "disk":
+                    backend = DiskBackend(MARKET_DATA_CACHE_DIR)
+                else:
+                    backend = MemoryBackend()
+                _market_data = MarketDataCache(fetcher, backend)
+    return _market_data
+
+
+def set_market_data(cache: MarketDataCache):
+    """替换全局行情缓存（用于测试和基准）"""
+    global _market_data
+    _market_data = cache
@@ -0,0 +1,109 @@
+"""QQQ 行情指标的确定性计算（不经过 LLM）
+
+快速模式下由程序直接算出任务 1 需要的数据，作为结构化 context 注入报告任务，
+省掉一整轮 Agent 推理。
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.tools.market_data import get_market_data
+
+SNAPSHOT_SYMBOL = "QQQ"
+# 52 周指标需要一年的日线（来自本地历史库，只增量下载）
+SNAPSHOT_PERIOD = "1y"
+VOLUME_WINDOW = 20
+YEAR_WINDOW = 252
+
+
+def compute_snapshot(daily: pd.DataFrame, symbol: str = SNAPSHOT_SYMBOL) -> dict:
+    """根据日线 OHLCV 计算最新交易日的核心指标"""
+    if len(daily) < 2:
+        raise ValueError(f"{symbol} 日线数据不足，至少需要 2 根 K 线")
+
+    ohlcv = daily[["Open", "High", "Low", "Close", "Volume"]].to_numpy(dtype=np.float64)
+    open_, high, low, close, volume = ohlcv[-1]
+    prev_close = ohlcv[-2, 3]
+
+    # 20 日均量不含当日
+    window = ohlcv[-VOLUME_WINDOW - 1:-1, 4]
+    avg_volume = float(window.mean()) if window.size else float("nan")
+
+    change = close - prev_close
+    pct_change = change / prev_close * 100
+    intraday_change = close - open_
+    intraday_range = high - low
+    gap = open_ - prev_close
+
+    # 多日指标：本周以来涨跌幅、52 周高低点和距高点回撤（不足一年时按已有数据计算）
+    year = ohlcv[-YEAR_WINDOW:]
+    high_52w = year[:, 1].max()
+    low_52w = year[:, 2].min()
+    dates = pd.DatetimeIndex(daily.index)
+    weeks = (dates.tz_localize(None) if dates.tz else dates).to_period("W").asi8
+    week_start = int(np.searchsorted(weeks, weeks[-1]))
+    week_base = ohlcv[week_start - 1, 3] if week_start > 0 else ohlcv[week_start, 0]
+
+    snapshot = {
+        "index": "NASDAQ 100 (QQQ)",
+        "trade_date": pd.Timestamp(daily.index[-1]).strftime("%Y-%m-%d"),
+        "latest_close": round(float(close), 2),
+        "previous_close": round(float(prev_close), 2),
+        "price_change": round(float(change), 2),
+        "percentage_change": round(float(pct_change), 2),
+        "intraday_change": round(float(intraday_change), 2),
+        "intraday_change_pct": round(float(intraday_change / open_ * 100), 2),
+        "intraday_high": round(float(high), 2),
+        "intraday_low": round(float(low), 2),
+        "intraday_range": round(float(intraday_range), 2),
+        "intraday_range_pct": round(float(intraday_range / open_ * 100), 2),
+        "gap": round(float(gap), 2),
+        "gap_pct": round(float(gap / prev_close * 100), 2),
+        "volume": int(volume),
+        "avg_volume_20d": int(avg_volume) if np.isfinite(avg_volume) else None,
+        "volume_ratio_20d": (
+            round(float(volume / avg_volume), 2) if avg_volume else None
+        ),
+        "week_to_date_pct": round(float((close / week_base - 1) * 100), 2),
+        "high_52w": round(float(high_52w), 2),
+        "low_52w": round(float(low_52w), 2),
+        "drawdown_from_high_pct": round(float((close / high_52w - 1) * 100), 2),
+    }
+    snapshot["market_assessment"] = _assess(snapshot)
+    return snapshot
+
+
+def _assess(s: dict) -> str:
+    direction = "上涨" if s["price_change"] >= 0 else "下跌"
+    text = (
+        f"QQQ 收于 {s['latest_close']:.2f}，"
+        f"较前收{direction} {abs(s['price_change']):.2f}"
+        f"（{s['percentage_change']:+.2f}%），日内振幅 {s['intraday_range_pct']:.2f}%，"
+        f"开盘跳空 {s['gap_pct']:+.2f}%"
+    )
+    if s["volume_ratio_20d"] is not None:
+        text += f"，成交量为 20 日均量的 {s['volume_ratio_20d']:.2f} 倍"
+    text += (
+        f"；本周以来 {s['week_to_date_pct']:+.2f}%，距 52 周高点 {s['high_52w']:.2f} "
+        f"回撤 {abs(s['drawdown_from_high_pct']):.2f}%"
+    )
+    return text + "。"
+
+
+def get_qqq_snapshot() -> dict:
+    """从行情缓存读取 QQQ 日线并计算快照"""
+    daily = get_market_data().history(
+        SNAPSHOT_SYMBOL, period=SNAPSHOT_PERIOD, interval="1d"
+    )
+    return compute_snapshot(daily, SNAPSHOT_SYMBOL)
+
+
+def format_snapshot_context(snapshot: dict) -> str:
+    """把快照渲染成注入报告任务的 context 文本"""
+    payload = json.dumps(snapshot, ensure_ascii=False, indent=2)
+    return (
+        "【QQQ 真实市场数据】以下数据由程序根据行情直接计算，"
+        "可直接引用，禁止修改或编造：\n"
+        f"```json\n{payload}\n```\n"
+    )
@@ -1,39 +1,80 @@
 import os
+import re
+import threading
 from crewai.tools import tool
 from tavily import TavilyClient
 
+from src.utils.cache import SWRCache
+from src.utils.metrics import TOOL_SECONDS
+
+# 新闻缓存：新鲜期 / 过期后仍可先返回旧值的窗口（秒）/ 最大条目数
+NEWS_CACHE_TTL = float(os.getenv("NEWS_CACHE_TTL", 900))
+NEWS_CACHE_STALE_TTL = float(os.getenv("NEWS_CACHE_STALE_TTL", 3600))
+NEWS_CACHE_MAX_ENTRIES = int(os.getenv("NEWS_CACHE_MAX_ENTRIES", 256))
+
+SEARCH_DEPTH = "advanced"
+INCLUDE_DOMAINS = [
+    "reuters.com",
+    "bloomberg.com",
+    "cnbc.com",
+    "wsj.com",
+]
+
+_client = None
+_client_lock = threading.Lock()
+
+news_cache = SWRCache(
+    max_entries=NEWS_CACHE_MAX_ENTRIES,
+    ttl=NEWS_CACHE_TTL,
+    stale_ttl=NEWS_CACHE_STALE_TTL,
+)
+
+
+def get_tavily_client() -> TavilyClient:
+    """共享的长连接 Tavily 客户端"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+    return _client
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询，使 'QQQ ETF news' 与 ' qqq  etf NEWS? ' 命中同一条缓存"""
+    query = re.sub(r"[\"'“”‘’?？!！.,，。]+", " ", query or "")
+    return " ".join(query.lower().split())
+
+
+def _search(query: str) -> str:
+    response = get_tavily_client().search(
+        query=query,
+        search_depth=SEARCH_DEPTH,
+        include_domains=INCLUDE_DOMAINS,
+        topic="news",
+    )
+
+    results = []
+    if "results" in response:
+        for item in response["results"]:
+            title = item.get("title", "No Title")
+            url = item.get("url", "#")
+            content = item.get("content", "No Content")
+            results.append(f"Title: {title}\nLink: {url}\nSnippet: {content}\n---")
+
+    return "\n".join(results) if results else "No relevant news found."
+
 
 @tool("search_news_tool")
 def search_news_tool(query: str) -> str:
     """Search for news articles related to the NASDAQ 100 index (QQQ)"""
 
-    search_depth = "advanced"
-    include_domains = [
-        "reuters.com",
-        "bloomberg.com",
-        "cnbc.com",
-        "wsj.com",
-    ]
-
-    client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
-
+    # 规范化后的查询只用作缓存键，实际搜索保留原始查询（大小写、标点可能影响结果）
+    key = normalize_query(query)
     try:
-        response = client.search(
-            query=query,
-            search_depth=search_depth,
-            include_domains=include_domains,
-            topic="news",
-        )
-
-        results = []
-        if "results" in response:
-            for item in response["results"]:
-                title = item.get("title", "No Title")
-                url = item.get("url", "#")
-                content = item.get("content", "No Content")
-                results.append(f"Title: {title}\nLink: {url}\nSnippet: {content}\n---")
-
-        return "\n".join(results) if results else "No relevant news found."
+        # 只缓存成功的结果，失败时不写入缓存
+        with TOOL_SECONDS.time(tool="search_news_tool"):
+            return news_cache.get_or_load(key, lambda: _search(query))
 
     except Exception as e:
         return f"Error performing news search: {str(e)}"
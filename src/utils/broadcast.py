@@ -0,0 +1,227 @@
+"""Telegram 广播引擎：有界线程池 + 令牌桶限流 + 连接复用"""
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import requests
+
+from src.utils.metrics import TELEGRAM_REQUEST_SECONDS
+from src.utils.notifier import TG_API_URL, get_tg_session
+from src.utils.rate_limit import TokenBucket, parse_retry_after
+
+# Telegram 限制：全局约 30 条/秒，同一会话约 1 条/秒
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", 16))
+BROADCAST_GLOBAL_RATE = float(os.getenv("BROADCAST_GLOBAL_RATE", 30))
+BROADCAST_PER_CHAT_RATE = float(os.getenv("BROADCAST_PER_CHAT_RATE", 1))
+# 网络错误 / 5xx 的重试次数
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", 3))
+# 单条消息最多等待几次 429
+BROADCAST_MAX_RATE_LIMITED = 5
+
+# 投递结果
+RESULT_SENT = "sent"
+RESULT_BLOCKED = "blocked"
+RESULT_FAILED = "failed"
+
+
+@dataclass
+class DeliveryResult:
+    chat_id: int
+    status: str
+    latency: float = 0.0
+    error: str = None
+    reason: str = None  # 失败原因分类，例如 http_400 / timeout
+
+
+@dataclass
+class BroadcastStats:
+    """单次广播的统计：吞吐量、延迟分位数、失败分类"""
+
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: float = None
+    latencies: list = field(default_factory=list)
+    sent: int = 0
+    blocked: int = 0
+    failed: int = 0
+    rate_limited: int = 0  # 收到 429 的次数
+    failures: dict = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def note_rate_limited(self):
+        with self._lock:
+            self.rate_limited += 1
+
+    def record(self, result: DeliveryResult):
+        self.latencies.append(result.latency)
+        if result.status == RESULT_SENT:
+            self.sent += 1
+        elif result.status == RESULT_BLOCKED:
+            self.blocked += 1
+        else:
+            self.failed += 1
+        if result.reason:
+            self.failures[result.reason] = self.failures.get(result.reason, 0) + 1
+
+    def finish(self):
+        self.finished_at = time.monotonic()
+
+    @property
+    def total(self) -> int:
+        return self.sent + self.blocked + self.failed
+
+    @property
+    def duration(self) -> float:
+        end = self.finished_at or time.monotonic()
+        return end - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        return self.total / self.duration if self.duration > 0 else 0.0
+
+    def percentile(self, pct: float) -> float:
+        """最近秩法计算延迟分位数（秒）"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        rank = math.ceil(pct / 100 * len(ordered))
+        return ordered[min(len(ordered), max(rank, 1)) - 1]
+
+    def summary(self) -> dict:
+        return {
+            "total": self.total,
+            "sent": self.sent,
+            "blocked": self.blocked,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "duration_s": round(self.duration, 2),
+            "throughput_per_s": round(self.throughput, 2),
+            "p50_ms": round(self.percentile(50) * 1000, 1),
+            "p99_ms": round(self.percentile(99) * 1000, 1),
+            "failures": dict(self.failures),
+        }
+
+
+class BroadcastEngine:
+    """并发发送同一条消息给大量用户
+
+    - 有界线程池，共享 keep-alive 连接池
+    - 全局和单会话两级令牌桶限流
+    - 遵守 429 响应里的 retry_after
+    """
+
+    def __init__(
+        self,
+        workers: int = BROADCAST_WORKERS,
+        global_rate: float = BROADCAST_GLOBAL_RATE,
+        per_chat_rate: float = BROADCAST_PER_CHAT_RATE,
+        max_retries: int = BROADCAST_MAX_RETRIES,
+        session: requests.Session = None,
+    ):
+        self.workers = workers
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self.session = session or get_tg_session()
+        self.global_bucket = TokenBucket(global_rate)
+        self._chat_buckets = {}
+        self._chat_lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        with self._chat_lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = TokenBucket(self.per_chat_rate, 1)
+                self._chat_buckets[chat_id] = bucket
+            return bucket
+
+    def send(
+        self, chat_id: int, payload: dict, stats: BroadcastStats = None
+    ) -> DeliveryResult:
+        """发送单条消息，处理限流与重试"""
+        url = f"{TG_API_URL}/sendMessage"
+        payload = {**payload, "chat_id": chat_id}
+        chat_bucket = self._chat_bucket(chat_id)
+        started = time.monotonic()
+        attempt = 0
+        rate_limited = 0
+        while True:
+            chat_bucket.acquire()
+            self.global_bucket.acquire()
+            sent_at = time.perf_counter()
+            try:
+                response = self.session.post(url, json=payload, timeout=30)
+            except requests.exceptions.Timeout as e:
+                error, reason = str(e), "timeout"
+                _observe_request(sent_at, reason)
+            except requests.exceptions.RequestException as e:
+                error, reason = str(e), "network"
+                _observe_request(sent_at, reason)
+            else:
+                status_code = response.status_code
+                _observe_request(sent_at, status_code)
+                if status_code == 200:
+                    elapsed = time.monotonic() - started
+                    return DeliveryResult(chat_id, RESULT_SENT, elapsed)
+                if status_code == 429:
+                    # 遵守 Telegram 给出的 retry_after，全局暂停
+                    retry_after = parse_retry_after(response)
+                    if stats is not None:
+                        stats.note_rate_limited()
+                    self.global_bucket.pause(retry_after)
+                    chat_bucket.pause(retry_after)
+                    rate_limited += 1
+                    if rate_limited <= BROADCAST_MAX_RATE_LIMITED:
+                        continue
+                    return DeliveryResult(
+                        chat_id, RESULT_FAILED, time.monotonic() - started,
+                        response.text, "http_429",
+                    )
+                if status_code == 403:
+                    return DeliveryResult(
+                        chat_id, RESULT_BLOCKED, time.monotonic() - started,
+                        response.text, "http_403",
+                    )
+                error, reason = response.text, f"http_{status_code}"
+                if status_code < 500:
+                    # 4xx 错误重试也不会成功
+                    return DeliveryResult(
+                        chat_id, RESULT_FAILED, time.monotonic() - started,
+                        error, reason,
+                    )
+
+            attempt += 1
+            if attempt > self.max_retries:
+                return DeliveryResult(
+                    chat_id, RESULT_FAILED, time.monotonic() - started, error, reason
+                )
+            time.sleep(min(2 ** attempt, 10))
+
+    def broadcast(
+        self, chat_ids: list[int], payload: dict, on_result=None
+    ) -> BroadcastStats:
+        """把同一条消息发给所有 chat_ids
+
+        on_result(result) 会在调用线程中依次执行，可用于落库投递状态
+        """
+        stats = BroadcastStats()
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="tg-broadcast"
+        ) as pool:
+            futures = [
+                pool.submit(self.send, chat_id, payload, stats) for chat_id in chat_ids
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                stats.record(result)
+                if on_result:
+                    on_result(result)
+        stats.finish()
+        return stats
+
+
+def _observe_request(sent_at: float, status):
+    TELEGRAM_REQUEST_SECONDS.observe(
+        time.perf_counter() - sent_at, method="sendMessage", status=status
+    )
@@ -0,0 +1,244 @@
+"""通用缓存组件：请求合并（single-flight）与可插拔存储后端"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Call:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """同一个 key 同时只执行一次，其他并发调用方等待并共享结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        """执行 fn，返回 (结果, 是否复用了其他调用方的结果)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.value, False
+
+    def in_flight(self, key) -> bool:
+        with self._lock:
+            return key in self._calls
+
+
+class MemoryBackend:
+    """进程内存储，value 连同过期时间（time.time() 时间戳）一起保存"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key: str, value: Any, expires_at: float):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DiskBackend:
+    """磁盘存储：每个 key 一个 pickle 文件，进程重启后仍然有效"""
+
+    name = "disk"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.pkl")
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # 文件损坏时当作未命中
+            self.delete(key)
+            return None
+
+    def set(self, key: str, value: Any, expires_at: float):
+        # 先写临时文件再原子替换，避免并发读到半个文件
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((value, expires_at), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                os.remove(os.path.join(self.directory, name))
+
+
+class CacheStats:
+    """命中率计数器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # 合并到其他调用方的请求数
+        self.stale = 0  # 返回旧值并后台刷新的次数
+        self.errors = 0
+
+    def incr(self, field: str, n: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            served = self.hits + self.stale
+            total = served + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "stale": self.stale,
+                "errors": self.errors,
+                "hit_rate": round(served / total, 4) if total else 0.0,
+            }
+
+
+class SWRCache:
+    """内存 LRU 缓存，支持 stale-while-revalidate
+
+    - ttl 内直接命中
+    - 过期但仍在 stale_ttl 窗口内：先返回旧值，后台刷新
+    - 完全过期或不存在：同步加载，相同 key 的并发请求只加载一次
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 600,
+        stale_ttl: float = 3600,
+        refresh_workers: int = 2,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.stats = CacheStats()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._refresher = ThreadPoolExecutor(
+            max_workers=refresh_workers, thread_name_prefix="swr-refresh"
+        )
+
+    def _store(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def _load(self, key, loader):
+        value = loader()
+        self._store(key, value)
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            self._flight.do(key, lambda: self._load(key, loader))
+        except Exception as e:
+            self.stats.incr("errors")
+            logger.warning("后台刷新缓存失败 (%s): %s", key, e)
+
+    def get_or_load(self, key, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+
+        if entry is not None:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl:
+                self.stats.incr("hits")
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stats.incr("stale")
+                if not self._flight.in_flight(key):
+                    self._refresher.submit(self._refresh, key, loader)
+                return value
+
+        try:
+            value, shared = self._flight.do(key, lambda: self._load(key, loader))
+        except Exception:
+            self.stats.incr("errors")
+            raise
+        self.stats.incr("coalesced" if shared else "misses")
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,146 @@
+"""包装 Agent 的 LLM，按内容寻址缓存文本响应
+
+- 是否允许缓存按任务配置（task.yaml 的 llm_cache，默认允许）
+- 相同 key 的并发请求只调用一次 LLM
+- 命中时不产生 LLM 事件，另外记一个 cached=True 的 llm span
+"""
+import copy
+import sqlite3
+import time
+from typing import Any, Callable, Optional
+
+from crewai.llms.base_llm import BaseLLM
+
+from src.utils.cache import SingleFlight
+from src.utils.llm_cache import LLM_CACHE_REQUESTS, LLMResponseCache, cache_key
+from src.utils.logger import get_logger
+from src.utils.tracing import KIND_LLM, traces
+
+logger = get_logger(__name__)
+
+
+class CachedLLM(BaseLLM):
+    """包装 Agent 的 LLM，命中缓存时直接返回文本响应
+
+    只缓存纯文本调用：带原生工具调用（tools / available_functions）或结构化输出
+    （response_model）的调用直接交给原 LLM。其余属性和方法都委托给原 LLM。
+    """
+
+    def __init__(
+        self,
+        llm: BaseLLM,
+        cache: LLMResponseCache,
+        allow: Callable[[Optional[str]], bool] = None,
+    ):
+        # 不调用 BaseLLM.__init__：所有状态都在被包装的 LLM 上
+        object.__setattr__(self, "_llm", llm)
+        object.__setattr__(self, "_cache", cache)
+        object.__setattr__(self, "_allow", allow or (lambda task_name: True))
+        object.__setattr__(self, "_flight", SingleFlight())
+
+    @property
+    def wrapped(self) -> BaseLLM:
+        return self._llm
+
+    @property
+    def is_litellm(self) -> bool:
+        return getattr(self._llm, "is_litellm", False)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__") or name in ("_llm", "_cache", "_allow", "_flight"):
+            # 复制、反序列化过程中实例还没有 _llm
+            raise AttributeError(name)
+        return getattr(self._llm, name)
+
+    def __copy__(self) -> "CachedLLM":
+        # Agent.copy() 会浅复制 llm，原 LLM 也要复制，
+        # 避免多个 Agent 共享 stop 等可变属性
+        clone = CachedLLM(copy.copy(self._llm), self._cache, self._allow)
+        object.__setattr__(clone, "_flight", self._flight)
+        return clone
+
+    def __setattr__(self, name: str, value: Any):
+        # Agent 执行器会写入 llm.stop 等属性，同样写到原 LLM 上
+        setattr(self._llm, name, value)
+
+    def _key(self, messages) -> str:
+        return cache_key(
+            self._llm.model,
+            messages,
+            temperature=getattr(self._llm, "temperature", None),
+            stop=sorted(getattr(self._llm, "stop", None) or []),
+        )
+
+    def call(
+        self,
+        messages,
+        tools=None,
+        callbacks=None,
+        available_functions=None,
+        from_task=None,
+        from_agent=None,
+        response_model=None,
+    ):
+        def direct():
+            return self._llm.call(
+                messages,
+                tools=tools,
+                callbacks=callbacks,
+                available_functions=available_functions,
+                from_task=from_task,
+                from_agent=from_agent,
+                response_model=response_model,
+            )
+
+        task_name = getattr(from_task, "name", None)
+        if tools or available_functions or response_model or not self._allow(task_name):
+            return direct()
+
+        started = time.time()
+        key = self._key(messages)
+        try:
+            cached = self._cache.get(key)
+        except sqlite3.Error as e:
+            logger.warning("读取 LLM 缓存失败: %s", e)
+            return direct()
+        if cached is not None:
+            self._cache.stats.incr("hits")
+            LLM_CACHE_REQUESTS.inc(result="hit")
+            logger.debug("LLM 缓存命中: %s %s", task_name, key[:12])
+            trace, task_span_id = traces.for_task(getattr(from_task, "id", None))
+            if trace is not None:
+                trace.add_span(
+                    self._llm.model,
+                    KIND_LLM,
+                    started,
+                    time.time(),
+                    task_span_id,
+                    cached=True,
+                )
+            return cached
+
+        def load():
+            response = direct()
+            if isinstance(response, str) and response:
+                try:
+                    self._cache.put(key, self._llm.model, response)
+                except sqlite3.Error as e:
+                    logger.warning("写入 LLM 缓存失败: %s", e)
+            return response
+
+        response, shared = self._flight.do(key, load)
+        self._cache.stats.incr("coalesced" if shared else "misses")
+        LLM_CACHE_REQUESTS.inc(result="coalesced" if shared else "miss")
+        return response
+
+    def supports_stop_words(self) -> bool:
+        return self._llm.supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self._llm.get_context_window_size()
+
+    def get_token_usage_summary(self):
+        return self._llm.get_token_usage_summary()
+
+    def supports_function_calling(self) -> bool:
+        return self._llm.supports_function_calling()
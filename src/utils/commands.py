@@ -0,0 +1,317 @@
+"""Telegram Bot 命令处理函数
+
+静态回复在导入时渲染一次，处理函数通过 router 注册，webhook 只需查表分发。
+"""
+from datetime import date, datetime
+
+from src.db.config import get_async_pool_stats
+from src.db.report.report import SLOT_EVENING, SLOT_MORNING, SLOT_ON_DEMAND
+from src.db.report.report_service import ReportService
+from src.db.tg_user.user_service import UserService
+from src.tools.indicators import get_indicator_engine
+from src.tools.market_data import MARKET_TZ, get_market_data
+from src.tools.search_tool import news_cache
+from src.utils.auth import get_admin_help, is_admin
+from src.utils.job_queue import REJECT_USER_LIMIT, JobRejected, get_crew_queue
+from src.utils.llm_cache import get_llm_cache
+from src.utils.logger import get_logger
+from src.utils.notifier import queue_progress, run_agent_and_notify, run_registry
+from src.utils.progress import get_progress_dispatcher
+from src.utils.router import CommandContext, CommandRouter
+from src.utils.tg_client import edit_message
+from src.utils.tracing import KIND_LABELS, KIND_LLM, KIND_TELEGRAM, KIND_TOOL, traces
+
+logger = get_logger(__name__)
+
+router = CommandRouter()
+
+# ---------------------------------------------------------------------------
+# 预渲染的静态回复
+# ---------------------------------------------------------------------------
+
+START_SUMMARY_MSG = "🚀 收到请求！正在调动 AI 智能体分析纳指数据，请稍候..."
+QUEUE_POSITION_MSG = (
+    "🕒 当前请求较多，正在排队：第 {position} 位\n轮到您时会自动开始分析"
+)
+JOB_USER_LIMIT_MSG = "⏳ 您已有一个分析任务在排队或进行中，完成后会自动发送结果。"
+JOB_BUSY_MSG = "🚦 系统繁忙，排队人数已满，请稍后再试。"
+UNSUBSCRIBED_MSG = "❌ 已取消订阅定时推送。如需重新订阅，请发送 /subscribe"
+UNSUBSCRIBE_FAILED_MSG = "⚠️ 取消订阅失败，请稍后重试。"
+SUBSCRIBED_MSG = "✅ 订阅成功！您将在每日 09:00 和 20:00 收到纳斯达克100指数分析报告。"
+SUBSCRIBE_FAILED_MSG = "⚠️ 订阅失败，请稍后重试。"
+REPORT_USAGE_MSG = (
+    "ℹ️ 用法：/report 查看今天的报告，/report 2026-10-16 查看指定日期的报告"
+)
+REPORT_NOT_FOUND_MSG = (
+    "📭 {trade_date} 暂无已生成的报告。发送 /start_summary 立即生成。"
+)
+REPORT_FAILED_MSG = "⚠️ 查询报告失败，请稍后重试。"
+REPORT_HEADER = "📚 {trade_date} {slot}报告（第 {version} 版）"
+SLOT_NAMES = {SLOT_MORNING: "开盘前", SLOT_EVENING: "盘后", SLOT_ON_DEMAND: "手动生成"}
+
+ADMIN_HELP_MSG = get_admin_help().strip()
+
+# 管理员帮助信息
+HELP_MSG_ADMIN = """
+🤖 纳斯达克100指数分析机器人 (管理员模式)
+
+👋 欢迎管理员！您拥有完全访问权限。
+
+📋 普通命令：
+• /start_summary - 立即生成分析报告
+• /report [日期] 或 /报告 - 查看已生成的报告（例如 /report 2026-10-16）
+• /unsubscribe 或 /取消订阅 - 取消定时推送
+• /subscribe 或 /订阅 - 重新订阅定时推送
+• /help 或 /帮助 - 显示此帮助信息
+
+🛡️ 管理员专用命令：
+• /status 或 /状态 - 查看系统状态和用户统计
+• /admin_help - 显示管理员详细帮助
+
+⏰ 定时推送时间：
+• 上午 09:00 - 开盘前分析
+• 晚上 20:00 - 盘后分析
+
+💡 所有与机器人互动的用户都会自动订阅定时推送
+💾 用户数据安全存储在数据库中
+🔐 您当前以管理员身份登录
+""".strip()
+
+# 普通用户帮助信息
+HELP_MSG_USER = """
+🤖 纳斯达克100指数分析机器人
+
+👋 欢迎！您已自动订阅定时推送。
+
+📋 可用命令：
+• /start_summary - 立即生成分析报告
+• /report [日期] 或 /报告 - 查看已生成的报告（例如 /report 2026-10-16）
+• /unsubscribe 或 /取消订阅 - 取消定时推送
+• /subscribe 或 /订阅 - 重新订阅定时推送
+• /help 或 /帮助 - 显示此帮助信息
+
+⏰ 定时推送时间：
+• 上午 09:00 - 开盘前分析
+• 晚上 20:00 - 盘后分析
+
+💡 所有与机器人互动的用户都会自动订阅定时推送
+💾 用户数据安全存储在数据库中
+""".strip()
+
+STATUS_TEMPLATE = """
+🛡️ 系统管理面板
+
+📊 用户统计：
+• 订阅用户数：{subscribed_count}
+• 活跃用户：{active_count}
+
+⏰ 定时任务：
+• 推送时间：每日 09:00 和 20:00
+• 状态：运行中 ✅
+
+💾 数据存储：
+• 类型：PostgreSQL 数据库
+• 状态：连接正常 ✅
+• 连接池：使用中 {pool_in_use} / 空闲 {pool_idle} / 上限 {pool_max}
+• 等待：{pool_waiting} 个请求，平均 {pool_wait_ms} ms
+• 行情缓存：命中 {md_hits} / 未命中 {md_misses} / 合并 {md_coalesced}
+• 指标缓存：命中 {ind_hits} / 未命中 {ind_misses} / 条目 {ind_entries}
+• 新闻缓存：命中 {news_hits} / 旧值 {news_stale} / 未命中 {news_misses}
+• LLM 缓存：命中 {llm_hits} / 未命中 {llm_misses} / 条目 {llm_entries}
+• 报告运行：执行 {runs_started} / 合并 {runs_joined} / \
+复用 {runs_cached} / 进行中 {runs_running}
+• 任务队列：运行 {jobs_running}/{jobs_workers} / 排队 {jobs_queued}/{jobs_capacity} / \
+拒绝 {jobs_rejected}
+• 排队耗时：p50 {jobs_wait_p50} ms / p99 {jobs_wait_p99} ms，\
+运行耗时 p50 {jobs_run_p50} s
+• 进度编辑：发送 {progress_sent} / 合并 {progress_coalesced} / \
+跳过 {progress_unchanged} / 限流 {progress_rate_limited}
+
+🧵 最近运行（详情：GET /runs/<run_id>/trace?format=text）：
+{recent_traces}
+
+🤖 Bot 信息：
+• 管理员ID：{chat_id}
+• 权限：完全访问 🔓
+
+📋 最近订阅用户：
+{recent_users}
+""".strip()
+
+
+def format_trace_line(trace) -> str:
+    """一次运行的耗时分布：总耗时以及 LLM / 工具 / Telegram 各自的累计耗时"""
+    summary = trace.summary()
+    parts = [f"{trace.root.duration:.1f}s" + ("" if trace.finished else "（进行中）")]
+    for kind in (KIND_LLM, KIND_TOOL, KIND_TELEGRAM):
+        if kind in summary:
+            parts.append(f"{KIND_LABELS[kind]} {summary[kind]:.1f}s")
+    return f"• {trace.run_id}：" + " / ".join(parts)
+
+
+# ---------------------------------------------------------------------------
+# 命令处理
+# ---------------------------------------------------------------------------
+
+@router.command("/start_summary")
+async def start_summary(ctx: CommandContext):
+    """立即生成分析报告"""
+    result = await ctx.reply(START_SUMMARY_MSG)
+    if not result:
+        logger.error("Failed to send initial message to %s", ctx.chat_id)
+        return
+
+    # 拿回发出的消息ID，用于后续更新进度
+    chat_id = ctx.chat_id
+    status_msg_id = result["message_id"]
+
+    def on_position(position: int):
+        text = QUEUE_POSITION_MSG.format(position=position)
+        queue_progress(chat_id, status_msg_id, text)
+
+    try:
+        job = get_crew_queue().submit(
+            run_agent_and_notify,
+            chat_id,
+            status_msg_id,
+            user_key=chat_id,
+            on_position=on_position,
+        )
+    except JobRejected as e:
+        logger.warning("任务被拒绝 (%s): %s", e.reason, chat_id)
+        msg = JOB_USER_LIMIT_MSG if e.reason == REJECT_USER_LIMIT else JOB_BUSY_MSG
+        await edit_message(chat_id, status_msg_id, msg)
+        return
+
+    if job.position and job.started_at is None:
+        text = QUEUE_POSITION_MSG.format(position=job.position)
+        await edit_message(chat_id, status_msg_id, text)
+
+
+@router.command("/report", "/报告")
+async def report(ctx: CommandContext):
+    """查看已存档的报告，无需重新生成"""
+    try:
+        if ctx.args:
+            trade_date = date.fromisoformat(ctx.args)
+        else:
+            trade_date = datetime.now(MARKET_TZ).date()
+    except ValueError:
+        await ctx.reply(REPORT_USAGE_MSG)
+        return
+    try:
+        saved = await ReportService.aget_latest(trade_date)
+    except Exception as e:
+        logger.error("查询报告失败: %s", e)
+        await ctx.reply(REPORT_FAILED_MSG)
+        return
+    if saved is None:
+        await ctx.reply(REPORT_NOT_FOUND_MSG.format(trade_date=trade_date.isoformat()))
+        return
+    header = REPORT_HEADER.format(
+        trade_date=saved.trade_date.isoformat(),
+        slot=SLOT_NAMES.get(saved.slot, saved.slot),
+        version=saved.version,
+    )
+    await ctx.reply(f"{header}\n\n{saved.content}", parse_mode="Markdown")
+
+
+@router.command("/unsubscribe", "/取消订阅")
+async def unsubscribe(ctx: CommandContext):
+    """取消订阅定时推送"""
+    try:
+        await UserService.aunsubscribe_user(ctx.user_data)
+        msg = UNSUBSCRIBED_MSG
+    except Exception as e:
+        logger.error("取消订阅失败: %s", e)
+        msg = UNSUBSCRIBE_FAILED_MSG
+    await ctx.reply(msg)
+
+
+@router.command("/subscribe", "/订阅")
+async def subscribe(ctx: CommandContext):
+    """重新订阅定时推送"""
+    try:
+        await UserService.asubscribe_user(ctx.user_data)
+        msg = SUBSCRIBED_MSG
+    except Exception as e:
+        logger.error("订阅失败: %s", e)
+        msg = SUBSCRIBE_FAILED_MSG
+    await ctx.reply(msg)
+
+
+@router.command("/status", "/状态", admin_only=True)
+async def status(ctx: CommandContext):
+    """查看系统状态和用户统计"""
+    try:
+        users = await UserService.alist_subscribed_users()
+        pool_stats = get_async_pool_stats()
+        md_stats = get_market_data().get_stats()
+        ind_stats = get_indicator_engine().get_stats()
+        news_stats = news_cache.stats.snapshot()
+        llm_cache = get_llm_cache()
+        llm_stats = llm_cache.get_stats() if llm_cache else {}
+        run_stats = run_registry.get_stats()
+        job_stats = get_crew_queue().get_stats()
+        progress_stats = get_progress_dispatcher().get_stats()
+        status_msg = STATUS_TEMPLATE.format(
+            subscribed_count=len(users),
+            active_count=len([u for u in users if u]),
+            pool_in_use=pool_stats.get("in_use", 0),
+            pool_idle=pool_stats.get("idle", 0),
+            pool_max=pool_stats.get("max_size", "-"),
+            pool_waiting=pool_stats.get("waiting", 0),
+            pool_wait_ms=pool_stats.get("wait_ms_avg", 0),
+            md_hits=md_stats["hits"],
+            md_misses=md_stats["misses"],
+            md_coalesced=md_stats["coalesced"],
+            ind_hits=ind_stats["hits"],
+            ind_misses=ind_stats["misses"],
+            ind_entries=ind_stats["entries"],
+            news_hits=news_stats["hits"],
+            news_stale=news_stats["stale"],
+            news_misses=news_stats["misses"],
+            llm_hits=llm_stats.get("hits", "-"),
+            llm_misses=llm_stats.get("misses", "-"),
+            llm_entries=llm_stats.get("entries", "已关闭" if llm_cache is None else 0),
+            runs_started=run_stats["started"],
+            runs_joined=run_stats["joined"],
+            runs_cached=run_stats["cached"],
+            runs_running=run_stats["running"],
+            jobs_running=job_stats["running"],
+            jobs_workers=job_stats["workers"],
+            jobs_queued=job_stats["queued"],
+            jobs_capacity=job_stats["capacity"],
+            jobs_rejected=job_stats["rejected"],
+            jobs_wait_p50=job_stats["wait_ms_p50"],
+            jobs_wait_p99=job_stats["wait_ms_p99"],
+            jobs_run_p50=job_stats["run_s_p50"],
+            progress_sent=progress_stats["sent"],
+            progress_coalesced=progress_stats["coalesced"],
+            progress_unchanged=progress_stats["unchanged"],
+            progress_rate_limited=progress_stats["rate_limited"],
+            recent_traces="\n".join(format_trace_line(t) for t in traces.recent())
+            or "• 暂无",
+            chat_id=ctx.chat_id,
+            recent_users="\n".join(
+                f"• {u[1] or u[2] or 'Unknown'} ({u[0]})" for u in users[:5]
+            ),
+        )
+        if len(users) > 5:
+            status_msg += f"\n... 还有 {len(users) - 5} 个用户"
+    except Exception as e:
+        logger.error("获取状态失败: %s", e)
+        status_msg = f"⚠️ 获取系统状态失败：{str(e)}"
+    await ctx.reply(status_msg)
+
+
+@router.command("/admin_help", "/管理员帮助", admin_only=True)
+async def admin_help(ctx: CommandContext):
+    """管理员帮助"""
+    await ctx.reply(ADMIN_HELP_MSG)
+
+
+@router.command("/help", "/帮助", "/start")
+async def help_command(ctx: CommandContext):
+    """帮助信息 - 根据用户权限显示不同内容"""
+    await ctx.reply(HELP_MSG_ADMIN if is_admin(ctx.chat_id) else HELP_MSG_USER)
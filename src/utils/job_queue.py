@@ -0,0 +1,283 @@
+"""Crew 运行的有界任务队列
+
+所有 crew 运行（/start_summary、/invoke）都提交到这里，由固定数量的工作线程执行：
+- 队列有上限，满了直接拒绝，而不是无限制地并发启动 crew
+- 同一用户同时排队 / 运行的任务数有上限
+- 排队位置变化时通过 on_position 回调通知调用方（用于更新进度消息）
+- 统计队列深度、排队等待时间和运行时间
+
+crew 的进度回调和运行登记表都在进程内，所以只提供线程工作者。
+"""
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from src.utils.logger import get_logger
+from src.utils.metrics import JOB_QUEUE
+
+logger = get_logger(__name__)
+
+# 同时执行的 crew 数（受 CPU、内存和 LLM 限流约束）
+CREW_WORKERS = int(os.getenv("CREW_WORKERS", 2))
+# 最多排队的任务数（不含正在运行的）
+CREW_QUEUE_SIZE = int(os.getenv("CREW_QUEUE_SIZE", 20))
+# 每个用户同时排队 + 运行的任务数
+CREW_MAX_JOBS_PER_USER = int(os.getenv("CREW_MAX_JOBS_PER_USER", 1))
+
+# 统计保留最近多少个任务的耗时
+STATS_WINDOW = 500
+
+# 拒绝原因
+REJECT_QUEUE_FULL = "queue_full"
+REJECT_USER_LIMIT = "user_limit"
+REJECT_SHUTDOWN = "shutdown"
+
+
+class JobRejected(Exception):
+    """任务未被接收"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+@dataclass
+class Job:
+    id: int
+    fn: Callable
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    user_key: Any = None
+    on_position: Optional[Callable[[int], None]] = None
+    submitted_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    position: int = 0  # 排队位置，1 表示下一个执行；开始运行后为 0
+    future: Future = field(default_factory=Future, repr=False)
+
+    @property
+    def wait_time(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return self.started_at - self.submitted_at
+
+    @property
+    def run_time(self) -> Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+class JobQueue:
+    """有界 FIFO 队列 + 固定数量的工作线程"""
+
+    def __init__(
+        self,
+        workers: int = CREW_WORKERS,
+        max_queue: int = CREW_QUEUE_SIZE,
+        max_per_user: int = CREW_MAX_JOBS_PER_USER,
+        name: str = "crew",
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.name = name
+        self._queue: deque[Job] = deque()
+        self._user_jobs: dict[Any, int] = {}
+        self._running = 0
+        self._closed = False
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._counters = {
+            "submitted": 0,
+            "rejected": 0,
+            "cancelled": 0,
+            "completed": 0,
+            "failed": 0,
+        }
+        self._wait_times = deque(maxlen=STATS_WINDOW)
+        self._run_times = deque(maxlen=STATS_WINDOW)
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(
+        self, fn: Callable, *args, user_key=None, on_position=None, **kwargs
+    ) -> Job:
+        """提交任务，超出限制时抛出 JobRejected
+
+        返回的 Job.position 为提交时的排队位置（0 表示有空闲工作线程，马上执行）。
+        """
+        with self._cond:
+            if self._closed:
+                self._counters["rejected"] += 1
+                raise JobRejected(REJECT_SHUTDOWN, "任务队列已关闭")
+            user_jobs = self._user_jobs.get(user_key, 0)
+            if user_key is not None and user_jobs >= self.max_per_user:
+                self._counters["rejected"] += 1
+                raise JobRejected(REJECT_USER_LIMIT, "已有任务在排队或运行中")
+            if len(self._queue) >= self.max_queue:
+                self._counters["rejected"] += 1
+                raise JobRejected(REJECT_QUEUE_FULL, "任务队列已满")
+
+            job = Job(next(self._ids), fn, args, kwargs, user_key, on_position)
+            self._queue.append(job)
+            idle = self.workers - self._running
+            job.position = max(0, len(self._queue) - idle)
+            if user_key is not None:
+                self._user_jobs[user_key] = self._user_jobs.get(user_key, 0) + 1
+            self._counters["submitted"] += 1
+            self._cond.notify()
+        return job
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                job = self._queue.popleft()
+                self._running += 1
+                job.started_at = time.monotonic()
+                job.position = 0
+                self._wait_times.append(job.wait_time)
+                moved = self._reposition()
+
+            self._notify_positions(moved)
+            self._run(job)
+
+    def cancel(self, job: Job) -> bool:
+        """取消尚未开始的任务，已开始运行的任务无法取消"""
+        with self._cond:
+            try:
+                self._queue.remove(job)
+            except ValueError:
+                return False
+            self._release_user(job)
+            self._counters["cancelled"] += 1
+            job.future.cancel()
+            moved = self._reposition()
+        self._notify_positions(moved)
+        return True
+
+    def _release_user(self, job: Job):
+        """释放用户名额（需持有锁）"""
+        if job.user_key is None:
+            return
+        remaining = self._user_jobs.get(job.user_key, 1) - 1
+        if remaining:
+            self._user_jobs[job.user_key] = remaining
+        else:
+            self._user_jobs.pop(job.user_key, None)
+
+    def _reposition(self) -> list[Job]:
+        """重新计算排队位置，返回位置发生变化的任务（需持有锁）"""
+        moved = []
+        idle = self.workers - self._running
+        for index, job in enumerate(self._queue):
+            position = max(0, index + 1 - idle)
+            if position != job.position:
+                job.position = position
+                moved.append(job)
+        return moved
+
+    def _notify_positions(self, jobs: list[Job]):
+        # 在锁外回调，避免网络请求阻塞队列
+        for job in jobs:
+            if job.on_position and job.position:
+                try:
+                    job.on_position(job.position)
+                except Exception as e:
+                    logger.warning("排队位置通知失败 (job %s): %s", job.id, e)
+
+    def _run(self, job: Job):
+        result, error = None, None
+        try:
+            result = job.fn(*job.args, **job.kwargs)
+        except BaseException as e:
+            error = e
+            logger.error("任务执行失败 (%s job %s): %s", self.name, job.id, e)
+
+        job.finished_at = time.monotonic()
+        with self._cond:
+            self._running -= 1
+            self._run_times.append(job.run_time)
+            self._counters["failed" if error else "completed"] += 1
+            self._release_user(job)
+
+        # 先释放名额再通知调用方，保证拿到结果后可以立即再次提交
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            wait_times = list(self._wait_times)
+            run_times = list(self._run_times)
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": len(self._queue),
+                "capacity": self.max_queue,
+                **self._counters,
+                "wait_ms_p50": round(_percentile(wait_times, 50) * 1000, 1),
+                "wait_ms_p99": round(_percentile(wait_times, 99) * 1000, 1),
+                "run_s_p50": round(_percentile(run_times, 50), 2),
+                "run_s_p99": round(_percentile(run_times, 99), 2),
+            }
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """停止接收新任务；cancel_pending 时丢弃尚未开始的任务"""
+        with self._cond:
+            self._closed = True
+            if cancel_pending:
+                while self._queue:
+                    job = self._queue.popleft()
+                    job.future.cancel()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+_crew_queue = None
+_crew_queue_lock = threading.Lock()
+
+
+def _queue_gauge() -> dict:
+    stats = _crew_queue.get_stats()
+    return {("running",): stats["running"], ("queued",): stats["queued"]}
+
+
+def get_crew_queue() -> JobQueue:
+    """获取全局 crew 任务队列（首次调用时启动工作线程）"""
+    global _crew_queue
+    if _crew_queue is None:
+        with _crew_queue_lock:
+            if _crew_queue is None:
+                _crew_queue = JobQueue()
+                JOB_QUEUE.set_function(_queue_gauge)
+    return _crew_queue
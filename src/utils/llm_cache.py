@@ -0,0 +1,179 @@
+"""LLM 响应缓存（按内容寻址）的存储
+
+同一行情快照、同一批新闻下重复运行时，Agent 发给 LLM 的 prompt 完全相同。
+以 (模型, 参数, 完整消息列表) 的哈希为 key 缓存文本响应：
+- 消息列表里已经包含渲染后的任务 prompt 和此前所有工具调用的结果，
+  工具结果变化时 key 随之变化
+- 存储在本地 SQLite，按 TTL 过期，总大小超过上限时淘汰最久未使用的条目
+
+包装 Agent LLM 的 CachedLLM 见 src/utils/cached_llm.py。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from src.utils.cache import CacheStats
+from src.utils.metrics import counter
+
+# on | off
+LLM_CACHE = os.getenv("LLM_CACHE", "on")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite")
+# 缓存有效期（秒），默认覆盖一个交易时段
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 6 * 3600))
+# 缓存总大小上限（MB）
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", 64))
+
+# 每写入多少次检查一次过期和大小
+EVICT_EVERY = 50
+
+LLM_CACHE_REQUESTS = counter(
+    "qqq_llm_cache_requests_total", "LLM 响应缓存查询结果", ("result",)
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_response (
+    key        TEXT PRIMARY KEY,
+    model      TEXT NOT NULL,
+    response   TEXT NOT NULL,
+    size       INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_response_used_at ON llm_response (used_at);
+"""
+
+
+def cache_key(model: str, messages, **params) -> str:
+    """模型、生成参数和完整消息列表的 SHA-256"""
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    payload = json.dumps(
+        {"model": model, "params": params, "messages": messages},
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite 存储的响应缓存，可在多个线程中使用"""
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        ttl: float = LLM_CACHE_TTL,
+        max_bytes: int = None,
+    ):
+        self.path = path
+        self.ttl = ttl
+        if max_bytes is None:
+            max_bytes = int(LLM_CACHE_MAX_MB * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_response WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM llm_response WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE llm_response SET used_at = ? WHERE key = ?", (now, key)
+            )
+            return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_response "
+                "(key, model, response, size, created_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict(now)
+
+    def evict(self):
+        with self._lock:
+            self._evict(time.time())
+
+    def _evict(self, now: float):
+        """删除过期条目；总大小超出上限时按最久未使用淘汰到上限的 90%（需持有锁）"""
+        expired = self._conn.execute(
+            "DELETE FROM llm_response WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_response"
+        ).fetchone()[0]
+        removed = 0
+        if total > self.max_bytes:
+            target = int(self.max_bytes * 0.9)
+            keys = []
+            rows = self._conn.execute(
+                "SELECT key, size FROM llm_response ORDER BY used_at"
+            )
+            for key, size in rows:
+                if total <= target:
+                    break
+                keys.append((key,))
+                total -= size
+            self._conn.executemany("DELETE FROM llm_response WHERE key = ?", keys)
+            removed = len(keys)
+        self.evictions += expired + removed
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_response"
+            ).fetchone()
+        return {
+            **self.stats.snapshot(),
+            "entries": entries,
+            "bytes": size,
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_response")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """全局响应缓存，LLM_CACHE=off 时返回 None"""
+    global _cache
+    if LLM_CACHE != "on":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache()
+    return _cache
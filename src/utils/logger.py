@@ -0,0 +1,108 @@
+"""结构化、分级的日志
+
+- 调用方只把日志记录放进队列（QueueHandler），格式化输出由后台线程完成，不阻塞热路径
+- 使用 logger.debug("... %s", value) 的惰性格式化，级别未开启时不做任何字符串拼接
+- LOG_LEVEL 设置全局级别，LOG_LEVELS 按模块覆盖，
+  例如 "src.crew=DEBUG,src.utils.notifier=WARNING"
+- LOG_FORMAT=json 时每行输出一个 JSON 对象，extra 里的字段会一并输出
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text | json
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+# LogRecord 自带的属性，JSON 输出时其余属性视为 extra 字段
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+}
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def parse_levels(spec: str) -> dict[str, int]:
+    """解析 "模块=级别,模块=级别"，忽略无法识别的条目"""
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.partition("=")
+        level = logging.getLevelName(level.strip().upper())
+        if sep and name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def setup_logging(
+    level: str = LOG_LEVEL,
+    levels: str = LOG_LEVELS,
+    fmt: str = LOG_FORMAT,
+    stream=None,
+) -> logging.handlers.QueueListener:
+    """配置根 logger（只生效一次），返回后台输出线程"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        formatter = (
+            JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+        )
+        output.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        root.handlers = [logging.handlers.QueueHandler(log_queue)]
+        root.setLevel(level)
+        for name, module_level in parse_levels(levels).items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _listener = logging.handlers.QueueListener(
+            log_queue, output, respect_handler_level=True
+        )
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _listener
+
+
+def shutdown_logging():
+    """输出队列中剩余的日志并停止后台线程"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """获取模块 logger，首次调用时完成全局配置"""
+    setup_logging()
+    return logging.getLogger(name)
@@ -0,0 +1,264 @@
+"""Prometheus 文本格式的指标
+
+不依赖 prometheus_client，只实现本项目用到的 Counter / Gauge / Histogram，
+由 GET /metrics 输出。所有指标集中定义在本文件底部，各模块直接导入使用：
+
+    with TOOL_SECONDS.time(tool="nasdaq_data_tool"):
+        ...
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 普通请求（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# crew / 任务 / LLM 调用（秒）
+LONG_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """生成 (后缀, 标签文本, 值)"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield "", _format_labels(self.labelnames, key), value
+
+
+class Gauge(_Metric):
+    """可直接 set，也可以用 set_function 在抓取时计算
+
+    set_function 的回调返回一个数值（无标签），或 {标签值元组: 数值} 字典
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+        self._fn: Callable = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable):
+        self._fn = fn
+
+    def samples(self):
+        if self._fn is not None:
+            try:
+                result = self._fn()
+            except Exception:
+                return
+            items = result.items() if isinstance(result, dict) else [((), result)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        for key, value in sorted(items, key=lambda item: tuple(map(str, item[0]))):
+            yield "", _format_labels(self.labelnames, tuple(key)), value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数..., 总和, 总数]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """记录代码块耗时（出错时同样记录）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def get_count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[-1] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                yield "_bucket", _format_labels(self.labelnames, key, le), cumulative
+            inf = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield "_bucket", inf, state[-1]
+            yield "_sum", _format_labels(self.labelnames, key), state[-2]
+            yield "_count", _format_labels(self.labelnames, key), state[-1]
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标重复注册: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, help: str, labels: tuple = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def gauge(name: str, help: str, labels: tuple = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labels))
+
+
+def histogram(
+    name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+# ---------------------------------------------------------------------------
+# 指标定义
+# ---------------------------------------------------------------------------
+
+CREW_KICKOFF_SECONDS = histogram(
+    "qqq_crew_kickoff_seconds",
+    "Crew kickoff 总耗时",
+    ("data_mode", "status"),
+    LONG_BUCKETS,
+)
+CREW_TASK_SECONDS = histogram(
+    "qqq_crew_task_seconds", "单个任务从开始到完成的耗时", ("task",), LONG_BUCKETS
+)
+CREW_STEPS = counter(
+    "qqq_crew_agent_steps_total", "Agent step 回调次数", ("step_type",)
+)
+TOOL_SECONDS = histogram("qqq_tool_seconds", "工具调用耗时", ("tool",))
+LLM_CALL_SECONDS = histogram(
+    "qqq_llm_call_seconds", "LLM 调用耗时", ("model", "status"), LONG_BUCKETS
+)
+LLM_TOKENS = counter("qqq_llm_tokens_total", "LLM token 用量", ("kind",))
+TELEGRAM_REQUEST_SECONDS = histogram(
+    "qqq_telegram_request_seconds", "Telegram Bot API 请求耗时", ("method", "status")
+)
+DB_QUERY_SECONDS = histogram(
+    "qqq_db_query_seconds", "SQL 语句执行耗时", ("pool", "statement")
+)
+ACTIVE_RUNS = gauge("qqq_active_runs", "正在进行的报告生成", ("source",))
+JOB_QUEUE = gauge("qqq_job_queue_jobs", "Crew 任务队列中的任务数", ("state",))
+SCHEDULER_JOB_NEXT_RUN = gauge(
+    "qqq_scheduler_job_next_run_timestamp_seconds",
+    "定时任务下次运行时间（0 表示已暂停）",
+    ("job",),
+)
+SCHEDULER_JOB_RUNS = counter(
+    "qqq_scheduler_job_runs_total", "定时任务运行结果", ("job", "status")
+)
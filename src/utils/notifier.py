@@ -1,87 +1,239 @@
 from src.crew import NasdaqSummaryCrew
+from src.db.report.report import Report, SLOT_ON_DEMAND
+from src.db.report.report_service import ReportService
+from src.tools.market_data import MARKET_TZ, market_snapshot_key
+from src.utils.logger import get_logger
+from src.utils.metrics import TELEGRAM_REQUEST_SECONDS
+from src.utils.run_registry import ROLE_CACHED, ROLE_FOLLOWER, RunRegistry
+from src.utils.tracing import KIND_TELEGRAM, current_trace
 import os
+import threading
+import time
+from datetime import date, datetime
 import requests
+from requests.adapters import HTTPAdapter
+
+logger = get_logger(__name__)
 
 TG_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TG_API_URL = f"https://api.telegram.org/bot{TG_TOKEN}"
+# Telegram HTTP 连接池大小（需不小于广播并发数）
+TG_POOL_SIZE = int(os.getenv("TG_POOL_SIZE", 32))
+
+# 报告生成完成后，相同行情快照下的请求直接复用结果的时长（秒），也是已完成运行的保留时长
+RUN_RESULT_TTL = float(os.getenv("RUN_RESULT_TTL", 300))
+SUMMARY_REPORT_TYPE = "nasdaq_summary"
+
+_session = None
+_session_lock = threading.Lock()
+
+run_registry = RunRegistry(result_ttl=RUN_RESULT_TTL)
+
+
+def get_tg_session() -> requests.Session:
+    """获取共享的 Telegram HTTP 会话，复用 keep-alive 连接"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TG_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def tg_post(method: str, payload: dict, timeout: float = 30) -> requests.Response:
+    """调用 Telegram Bot API（同步），记录耗时和状态码；有当前 Trace 时同时记录 span"""
+    started = time.perf_counter()
+    started_at = time.time()
+    status = "error"
+    try:
+        response = get_tg_session().post(
+            f"{TG_API_URL}/{method}", json=payload, timeout=timeout
+        )
+        status = response.status_code
+        return response
+    except requests.exceptions.Timeout:
+        status = "timeout"
+        raise
+    finally:
+        TELEGRAM_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, method=method, status=status
+        )
+        trace = current_trace()
+        if trace is not None:
+            trace.add_span(
+                method, KIND_TELEGRAM, started_at, time.time(),
+                status="ok" if status == 200 else "error", status_code=status,
+            )
+
+
+def generate_report(
+    chat_id: int = None,
+    status_msg_id: int = None,
+    on_progress=None,
+    slot: str = SLOT_ON_DEMAND,
+) -> str:
+    """运行 crew_ai 任务并返回最终报告文本，同时把报告和运行记录存档
+
+    传入 chat_id 和 status_msg_id 时会实时更新该消息的进度；
+    传入 on_progress 时进度交给它分发
+    """
+    crew_instance = NasdaqSummaryCrew(chat_id, status_msg_id, on_progress=on_progress)
+    logger.info("开始执行任务")
+    result = crew_instance.kickoff()
+    logger.info("任务执行完成")
+
+    content = result.raw if hasattr(result, "raw") else str(result)
+    save_report(content, slot, crew_instance.run_metadata(result))
+    return content
+
+
+def report_trade_date(metadata: dict) -> date:
+    """报告所属的交易日：优先取行情快照中的交易日，否则取美东时间的当前日期"""
+    snapshot = metadata.get("market_snapshot") or {}
+    if snapshot.get("trade_date"):
+        return date.fromisoformat(snapshot["trade_date"])
+    return datetime.now(MARKET_TZ).date()
+
+
+def save_report(content: str, slot: str, metadata: dict):
+    """保存报告版本；存档失败不影响本次推送"""
+    try:
+        report = ReportService.save(Report(
+            trade_date=report_trade_date(metadata),
+            slot=slot,
+            content=content,
+            **metadata,
+        ))
+        logger.info(
+            "报告已存档: %s %s v%s", report.trade_date, report.slot, report.version
+        )
+        return report
+    except Exception as e:
+        logger.warning("报告存档失败: %s", e)
+        return None
+
+
+def send_report(chat_id: int, content: str, header: str = "✅ 总结生成完毕："):
+    """将报告发送给用户，返回 Telegram 响应"""
+    payload_info = {
+        "chat_id": chat_id,
+        "text": f"{header}\n\n{content}",
+        "parse_mode": "Markdown",
+    }
+    return tg_post("sendMessage", payload_info)
 
 
 def run_agent_and_notify(chat_id: int, status_msg_id: int):
-    """运行 crew_ai 任务并通知用户"""
-    import traceback
-    
+    """运行 crew_ai 任务并通知用户
+
+    相同报告正在生成时只挂到已有运行上，共享进度和结果；
+    刚生成完且行情快照未变则直接复用
+    """
+    run, role = run_registry.join(
+        SUMMARY_REPORT_TYPE, (chat_id, status_msg_id), snapshot=market_snapshot_key()
+    )
+    if role == ROLE_CACHED:
+        logger.info("复用已生成的报告: %s -> %s", run.key, chat_id)
+        queue_progress(chat_id, status_msg_id, "♻️ 刚刚已生成同一份报告，直接发送结果")
+        _deliver_report(chat_id, run.result)
+        return
+    if role == ROLE_FOLLOWER:
+        logger.info("加入正在进行的运行: %s <- %s", run.key, chat_id)
+        text = "🔗 已有相同的分析正在进行，已为您加入，完成后会一起发送结果"
+        if run.progress:
+            text += f"\n\n{run.progress}"
+        queue_progress(chat_id, status_msg_id, text)
+        return
+
+    def on_progress(text):
+        # 进度同步给所有订阅者
+        for sub_chat_id, sub_msg_id in run_registry.publish(run, text):
+            queue_progress(sub_chat_id, sub_msg_id, text)
+
     try:
         # 发送开始消息
-        from src.utils.notifier import update_tg_progress
-        update_tg_progress(chat_id, status_msg_id, "🚀 任务开始执行...\n正在初始化 AI Agent...")
+        queue_progress(
+            chat_id, status_msg_id, "🚀 任务开始执行...\n正在初始化 AI Agent..."
+        )
         
         # 1. 后台执行crew_ai任务
-        # 传入 chat_id 和 status_msg_id 以便 Agent 更新进度
-        crew_instance = NasdaqSummaryCrew(chat_id, status_msg_id)
-        crew = crew_instance.crew()
-        
-        print(f"✅ Crew 已创建，开始执行任务...")
-        result = crew.kickoff()
-        print(f"✅ 任务执行完成！")
+        final_content = generate_report(on_progress=on_progress)
+    except Exception as e:
+        # 如果出错，也要通知所有订阅者
+        logger.exception("执行出错: %s", e)
+        for sub_chat_id, _ in run_registry.finish(run, error=e):
+            _send_error(sub_chat_id, e)
+        return
 
-        # 2. 获取最终结果
-        final_content = result.raw if hasattr(result, "raw") else str(result)
-        
-        # 3. 结果返回用户
-        send_url = f"{TG_API_URL}/sendMessage"
-        payload_info = {
-            "chat_id": chat_id,
-            "text": f"✅ 总结生成完毕：\n\n{final_content}",
-            "parse_mode": "Markdown",
-        }
-        response = requests.post(send_url, json=payload_info)
-        
+    # 2. 结果返回所有订阅者
+    for sub_chat_id, _ in run_registry.finish(run, result=final_content):
+        _deliver_report(sub_chat_id, final_content)
+
+
+def _deliver_report(chat_id: int, content: str):
+    try:
+        response = send_report(chat_id, content)
         if response.status_code != 200:
-            print(f"❌ 发送结果失败: {response.text}")
+            logger.error("发送结果失败: %s", response.text)
         else:
-            print(f"✅ 结果已发送到 chat_id: {chat_id}")
-            
+            logger.info("结果已发送到 chat_id: %s", chat_id)
     except Exception as e:
-        # 如果出错，也要通知用户
-        error_msg = f"❌ 执行出错：{str(e)}\n\n{traceback.format_exc()}"
-        print(error_msg)
-        
-        send_url = f"{TG_API_URL}/sendMessage"
-        payload_info = {
-            "chat_id": chat_id,
-            "text": f"❌ 抱歉，分析过程中出现错误：\n\n{str(e)}",
-        }
-        requests.post(send_url, json=payload_info)
+        logger.error("发送结果出错: %s", e)
+
+
+def _send_error(chat_id: int, error: Exception):
+    payload_info = {
+        "chat_id": chat_id,
+        "text": f"❌ 抱歉，分析过程中出现错误：\n\n{str(error)}",
+    }
+    try:
+        tg_post("sendMessage", payload_info)
+    except Exception as e:
+        logger.error("发送错误通知失败: %s", e)
+
+
+def queue_progress(chat_id, message_id, text):
+    """把最新进度交给后台发送器，立即返回（同一消息的中间状态会被合并）"""
+    from src.utils.progress import get_progress_dispatcher
+
+    get_progress_dispatcher().submit(chat_id, message_id, text, trace=current_trace())
 
 
 def update_tg_progress(chat_id, message_id, text):
-    """更新 Telegram 消息内容"""
+    """更新 Telegram 消息内容（同步发送），返回 Telegram 响应，网络出错时返回 None
+
+    Agent 运行期间的进度请使用 queue_progress()，不阻塞调用方
+    """
     try:
-        send_url = f"{TG_API_URL}/editMessageText"
         payload_info = {
             "chat_id": chat_id,
             "message_id": message_id,
             "text": f"⏳ 实时进度：\n\n{text}",
         }
         
-        response = requests.post(send_url, json=payload_info, timeout=5)
+        response = tg_post("editMessageText", payload_info, timeout=5)
         
         if response.status_code == 200:
-            print(f"✅ 进度已更新: {text[:50]}...")
+            logger.debug("进度已更新: %.50s", text)
         elif response.status_code == 400:
             # 消息内容相同时 Telegram 会返回 400，这是正常的
             resp_json = response.json()
             if "message is not modified" in resp_json.get("description", "").lower():
-                print(f"ℹ️ 消息内容未变化，跳过更新")
+                logger.debug("消息内容未变化，跳过更新")
             else:
-                print(f"⚠️ 更新进度失败 (400): {response.text}")
+                logger.warning("更新进度失败 (400): %s", response.text)
         elif response.status_code == 429:
             # 触发限流
-            print(f"⚠️ Telegram API 限流，请降低更新频率")
+            logger.warning("Telegram API 限流，请降低更新频率")
         else:
-            print(f"⚠️ 更新进度失败 ({response.status_code}): {response.text}")
+            logger.warning("更新进度失败 (%s): %s", response.status_code, response.text)
+        return response
             
     except requests.exceptions.Timeout:
-        print(f"⚠️ 更新进度超时")
+        logger.warning("更新进度超时")
     except Exception as e:
-        print(f"❌ 更新进度出错: {str(e)}")
+        logger.error("更新进度出错: %s", e)
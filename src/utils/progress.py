@@ -0,0 +1,195 @@
+"""Telegram 进度消息的合并发送器
+
+Agent 回调只把最新进度写进对应消息的槽位后立即返回，不再等待 Telegram 网络请求。
+后台线程按消息限速发送，每次只发该消息的最新内容：
+- 同一条消息两次编辑至少间隔 PROGRESS_MIN_INTERVAL 秒，期间的中间状态被新状态覆盖
+- 所有消息共享全局令牌桶，收到 429 时按 retry_after 暂停
+- 内容与上次发送的相同时跳过
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from src.utils.logger import get_logger
+from src.utils.rate_limit import TokenBucket, parse_retry_after
+from src.utils.tracing import Trace, use_trace
+
+logger = get_logger(__name__)
+
+# 同一条消息两次编辑的最小间隔（秒）
+PROGRESS_MIN_INTERVAL = float(os.getenv("PROGRESS_MIN_INTERVAL", 1.0))
+# 所有进度编辑的全局速率（次/秒）
+PROGRESS_GLOBAL_RATE = float(os.getenv("PROGRESS_GLOBAL_RATE", 20))
+# 空闲多久后丢弃消息槽位（秒）
+SLOT_TTL = 300
+
+
+@dataclass
+class _Slot:
+    pending: Optional[str] = None  # 等待发送的最新内容
+    last_sent: Optional[str] = None
+    next_allowed: float = 0.0
+    in_flight: bool = False
+    trace: Optional[Trace] = None  # 最近一次提交所属的运行，发送耗时记入该 Trace
+
+
+class ProgressDispatcher:
+    """按消息合并进度编辑，后台限速发送"""
+
+    def __init__(
+        self,
+        sender: Callable = None,
+        min_interval: float = PROGRESS_MIN_INTERVAL,
+        global_rate: float = PROGRESS_GLOBAL_RATE,
+    ):
+        if sender is None:
+            # 延迟导入避免循环依赖
+            from src.utils.notifier import update_tg_progress as sender
+        self.sender = sender
+        self.min_interval = min_interval
+        self.bucket = TokenBucket(global_rate)
+        self._slots: dict[tuple, _Slot] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {
+            "submitted": 0, "coalesced": 0, "unchanged": 0,
+            "sent": 0, "rate_limited": 0, "errors": 0,
+        }
+        self._thread = threading.Thread(
+            target=self._work, name="tg-progress", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, chat_id: int, message_id: int, text: str, trace: Trace = None):
+        """写入最新进度并立即返回"""
+        key = (chat_id, message_id)
+        with self._cond:
+            self._stats["submitted"] += 1
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = _Slot()
+            if trace is not None:
+                slot.trace = trace
+            if slot.pending is not None:
+                self._stats["coalesced"] += 1
+            elif text == slot.last_sent and not slot.in_flight:
+                self._stats["unchanged"] += 1
+                return
+            slot.pending = text
+            self._cond.notify()
+
+    def _next_due(self, now: float) -> tuple[Optional[tuple], Optional[float]]:
+        """找出最早可以发送的消息（需持有锁）
+
+        返回 (key, None) 或 (None, 需要等待的秒数)。
+        """
+        best_key, best_at = None, None
+        for key, slot in list(self._slots.items()):
+            if slot.pending is None:
+                if not slot.in_flight and now - slot.next_allowed > SLOT_TTL:
+                    del self._slots[key]
+                continue
+            if slot.in_flight:
+                continue
+            if best_at is None or slot.next_allowed < best_at:
+                best_key, best_at = key, slot.next_allowed
+        if best_key is None:
+            return None, None
+        if best_at <= now:
+            return best_key, None
+        return None, best_at - now
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while True:
+                    key, wait = self._next_due(time.monotonic())
+                    if key is not None:
+                        break
+                    if self._closed and wait is None:
+                        return
+                    self._cond.wait(wait)
+                slot = self._slots[key]
+                text, slot.pending = slot.pending, None
+                if text == slot.last_sent:
+                    self._stats["unchanged"] += 1
+                    self._cond.notify_all()
+                    continue
+                slot.in_flight = True
+
+            self.bucket.acquire()
+            self._send(key, slot, text)
+
+    def _send(self, key: tuple, slot: _Slot, text: str):
+        try:
+            with use_trace(slot.trace):
+                response = self.sender(key[0], key[1], text)
+        except Exception as e:
+            logger.error("进度发送出错: %s", e)
+            response = None
+
+        status_code = getattr(response, "status_code", None)
+        with self._cond:
+            slot.in_flight = False
+            now = time.monotonic()
+            if status_code == 429:
+                # 限流：稍后重发（如果期间没有更新的内容）
+                retry_after = parse_retry_after(response)
+                self.bucket.pause(retry_after)
+                self._stats["rate_limited"] += 1
+                slot.next_allowed = now + retry_after
+                if slot.pending is None:
+                    slot.pending = text
+            else:
+                if status_code == 200 or status_code == 400:
+                    # 400 多为 "message is not modified"，同样视为已是最新内容
+                    slot.last_sent = text
+                    self._stats["sent" if status_code == 200 else "unchanged"] += 1
+                else:
+                    self._stats["errors"] += 1
+                slot.next_allowed = now + self.min_interval
+            self._cond.notify_all()
+
+    def drain(self, timeout: float = None) -> bool:
+        """等待所有待发送的进度发送完毕"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while any(
+                slot.pending is not None or slot.in_flight
+                for slot in self._slots.values()
+            ):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            pending = sum(
+                1 for slot in self._slots.values() if slot.pending is not None
+            )
+            return {**self._stats, "pending": pending, "messages": len(self._slots)}
+
+    def close(self, timeout: float = 5):
+        """发送完剩余进度后停止后台线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_progress_dispatcher() -> ProgressDispatcher:
+    """获取全局进度发送器"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = ProgressDispatcher()
+    return _dispatcher
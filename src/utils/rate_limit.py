@@ -0,0 +1,66 @@
+"""限流工具：线程安全的令牌桶"""
+import threading
+import time
+
+
+class TokenBucket:
+    """令牌桶限流器
+
+    rate 为每秒补充的令牌数，capacity 为桶容量（允许的突发量）。
+    收到 429 时可以调用 pause() 让所有调用方一起等待 retry_after。
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """尝试取一个令牌，成功返回 0，否则返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> float:
+        """阻塞直到取得令牌，返回实际等待的秒数"""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float):
+        """暂停发放令牌（用于响应 429 的 retry_after）"""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._blocked_until:
+                self._blocked_until = until
+                # 暂停期间不累积令牌
+                self._tokens = 0.0
+                self._updated = until
+
+
+def parse_retry_after(response, default: float = 1.0) -> float:
+    """从 Telegram 的 429 响应中解析 retry_after（秒），响应体无法解析时返回 default"""
+    try:
+        body = response.json()
+        value = float(body["parameters"]["retry_after"])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return default
+    return value if value > 0 else default
@@ -0,0 +1,98 @@
+"""Bot 命令路由：按规范化后的命令名查表分发"""
+import os
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import BackgroundTasks
+
+from src.utils.auth import check_admin_permission
+from src.utils.tg_client import send_message
+
+# Bot 用户名（不含 @），配置后只响应发给本 Bot 的 /cmd@botname
+BOT_USERNAME = (os.getenv("TELEGRAM_BOT_USERNAME") or "").lstrip("@").lower()
+
+
+@dataclass
+class CommandContext:
+    """单条消息的处理上下文"""
+
+    chat_id: int
+    text: str
+    user_data: dict
+    background_tasks: BackgroundTasks
+    command: str = ""
+    args: str = ""
+
+    async def reply(self, text: str, **extra) -> Optional[dict]:
+        """所有回复都通过共享的异步客户端发送"""
+        return await send_message(self.chat_id, text, **extra)
+
+
+Handler = Callable[[CommandContext], Awaitable[Any]]
+
+
+@dataclass(frozen=True)
+class Command:
+    name: str
+    handler: Handler
+    aliases: tuple = field(default_factory=tuple)
+    admin_only: bool = False
+
+
+def normalize_command(text: str) -> tuple[Optional[str], str]:
+    """把 '/Subscribe@MyBot 参数' 规范化为 ('/subscribe', '参数')
+
+    不是命令或发给其他 Bot 的命令返回 (None, "")
+    """
+    text = (text or "").strip()
+    if not text.startswith("/"):
+        return None, ""
+    head, _, args = text.partition(" ")
+    name, _, bot = head.partition("@")
+    if bot and BOT_USERNAME and bot.lower() != BOT_USERNAME:
+        return None, ""
+    return name.lower(), args.strip()
+
+
+class CommandRouter:
+
+    def __init__(self):
+        self._commands: dict[str, Command] = {}
+
+    def command(self, name: str, *aliases: str, admin_only: bool = False):
+        """注册命令的装饰器
+
+        @router.command("/subscribe", "/订阅")
+        async def subscribe(ctx): ...
+        """
+
+        def decorator(handler: Handler) -> Handler:
+            cmd = Command(name, handler, tuple(aliases), admin_only)
+            for key in (name, *aliases):
+                key = key.lower()
+                if key in self._commands:
+                    raise ValueError(f"命令重复注册: {key}")
+                self._commands[key] = cmd
+            return handler
+
+        return decorator
+
+    def get(self, name: str) -> Optional[Command]:
+        return self._commands.get(name)
+
+    async def dispatch(self, ctx: CommandContext) -> bool:
+        """分发一条消息，返回是否匹配到命令"""
+        name, args = normalize_command(ctx.text)
+        cmd = self._commands.get(name) if name else None
+        if cmd is None:
+            return False
+
+        ctx.command, ctx.args = cmd.name, args
+        if cmd.admin_only:
+            has_permission, error_msg = check_admin_permission(ctx.chat_id)
+            if not has_permission:
+                await ctx.reply(error_msg)
+                return True
+
+        await cmd.handler(ctx)
+        return True
@@ -0,0 +1,111 @@
+"""进程内的运行登记表：相同报告同一时间只跑一次
+
+同一报告类型正在生成时，新的请求只登记为订阅者，共享进度和最终结果（与行情快照无关，
+避免跨过快照分桶边界的两个请求各跑一次）；已完成的结果只在行情快照相同且未超过
+result_ttl 时直接复用。过期的运行在每次 join / finish 时清理。
+本模块只负责登记和状态，消息发送由调用方完成。
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+ROLE_LEADER = "leader"  # 负责实际执行
+ROLE_FOLLOWER = "follower"  # 挂到正在执行的运行上
+ROLE_CACHED = "cached"  # 直接复用已完成的结果
+
+
+@dataclass
+class Run:
+    key: str
+    snapshot: Optional[str] = None  # 运行开始时的行情快照，决定结果能否复用
+    subscribers: list = field(default_factory=list)
+    progress: Optional[str] = None  # 最近一次进度文本
+    result: Any = None
+    error: Optional[BaseException] = None
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+
+class RunRegistry:
+    """按 key 合并并发运行，并短暂缓存成功的结果"""
+
+    def __init__(self, result_ttl: float = 300):
+        self.result_ttl = result_ttl
+        self._runs: dict[str, Run] = {}
+        self._lock = threading.Lock()
+        self._stats = {"started": 0, "joined": 0, "cached": 0, "failed": 0}
+
+    def _sweep(self, now: float):
+        """清理超过 result_ttl 的已完成运行（调用方持有锁）"""
+        expired = [
+            key for key, run in self._runs.items()
+            if run.done and now - run.finished_at > self.result_ttl
+        ]
+        for key in expired:
+            del self._runs[key]
+
+    def join(self, key: str, subscriber, snapshot: str = None) -> tuple[Run, str]:
+        """登记一个请求，返回 (运行, 角色)
+
+        key 相同的运行正在进行时一律挂上去；已完成的运行只在 snapshot 相同时复用。
+        leader 需要执行任务并在结束时调用 finish()；follower 会在 finish() 的返回值中
+        收到结果；cached 可以直接使用 run.result。
+        """
+        with self._lock:
+            self._sweep(time.time())
+            run = self._runs.get(key)
+            if run is not None and not run.done:
+                run.subscribers.append(subscriber)
+                self._stats["joined"] += 1
+                return run, ROLE_FOLLOWER
+            if run is not None and run.snapshot == snapshot:
+                self._stats["cached"] += 1
+                return run, ROLE_CACHED
+
+            run = Run(key=key, snapshot=snapshot, subscribers=[subscriber])
+            self._runs[key] = run
+            self._stats["started"] += 1
+            return run, ROLE_LEADER
+
+    def publish(self, run: Run, text: str) -> list:
+        """记录最新进度，返回需要通知的订阅者"""
+        with self._lock:
+            run.progress = text
+            return list(run.subscribers)
+
+    def finish(self, run: Run, result: Any = None, error: BaseException = None) -> list:
+        """结束运行，返回需要收到结果的全部订阅者
+
+        失败的运行不会被缓存，下一个请求会重新执行。
+        """
+        with self._lock:
+            run.result = result
+            run.error = error
+            run.finished_at = time.time()
+            run._done.set()
+            self._sweep(run.finished_at)
+            if error is not None:
+                self._stats["failed"] += 1
+                if self._runs.get(run.key) is run:
+                    del self._runs[run.key]
+            return list(run.subscribers)
+
+    def get(self, key: str) -> Optional[Run]:
+        with self._lock:
+            return self._runs.get(key)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "running": sum(1 for run in self._runs.values() if not run.done),
+            }
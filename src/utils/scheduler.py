@@ -1,64 +1,194 @@
 # 定时任务处理
 import os
+from datetime import date, datetime, timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MISSED
 from apscheduler.executors.pool import ThreadPoolExecutor
-from src.utils.notifier import run_agent_and_notify
+from src.utils.broadcast import (
+    BroadcastEngine,
+    RESULT_BLOCKED,
+    RESULT_FAILED,
+    RESULT_SENT,
+)
+from src.utils.logger import get_logger
+from src.utils.metrics import SCHEDULER_JOB_NEXT_RUN, SCHEDULER_JOB_RUNS
+from src.utils.notifier import generate_report
 from src.db.tg_user.user_service import UserService
-import requests
+from src.db.broadcast.broadcast import (
+    DELIVERY_BLOCKED,
+    DELIVERY_FAILED,
+    DELIVERY_SENT,
+    STATUS_READY,
+)
+from src.db.broadcast.broadcast_service import BroadcastService
 
-# 从环境变量获取配置
-TG_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-TG_API_URL = f"https://api.telegram.org/bot{TG_TOKEN}"
+logger = get_logger(__name__)
+
+# 单个用户的最大投递次数（含首次投递）
+MAX_DELIVERY_ATTEMPTS = int(os.getenv("BROADCAST_MAX_ATTEMPTS", 3))
+# 投递失败后多久重试（分钟）
+RETRY_DELAY_MINUTES = int(os.getenv("BROADCAST_RETRY_DELAY_MINUTES", 10))
+# 报告生成的最大尝试次数（含首次生成）
+MAX_GENERATION_ATTEMPTS = int(os.getenv("BROADCAST_MAX_GENERATION_ATTEMPTS", 3))
+
+SCHEDULED_HEADER = "📅 定时推送：纳斯达克100指数分析报告"
+SCHEDULED_FOOTER = "💡 如不需要定时推送，请发送 /unsubscribe"
+
+# 每攒够多少条投递结果写一次数据库
+DELIVERY_FLUSH_SIZE = 200
+DELIVERY_STATUS = {
+    RESULT_SENT: DELIVERY_SENT,
+    RESULT_BLOCKED: DELIVERY_BLOCKED,
+    RESULT_FAILED: DELIVERY_FAILED,
+}
 
 executors = {
     'default': ThreadPoolExecutor(10)
 }
 
-def send_scheduled_report():
-    """发送定时报告给所有订阅用户"""
+def get_slot_key(slot: str, trade_date: date = None) -> str:
+    """时段唯一标识，例如 2026-10-16-evening"""
+    trade_date = trade_date or date.today()
+    return f"{trade_date.isoformat()}-{slot}"
+
+def prepare_broadcast(slot: str, slot_key: str):
+    """获取本时段的报告，只有在尚未生成时才调用 crew"""
+    broadcast = BroadcastService.get_or_create(slot_key)
+    if broadcast.status == STATUS_READY and broadcast.report:
+        logger.info("复用已生成的报告: %s", slot_key)
+        return broadcast
+
+    logger.info("开始生成报告: %s", slot_key)
+    try:
+        report = generate_report(slot=slot)
+    except Exception:
+        BroadcastService.mark_failed(broadcast)
+        raise
+    BroadcastService.save_report(broadcast, report)
+    logger.info("报告已生成并保存: %s", slot_key)
+    return broadcast
+
+def deliver_broadcast(broadcast) -> int:
+    """把已保存的报告并发投递给尚未收到的用户，返回仍待重试的用户数"""
+    pending_users = BroadcastService.list_undelivered(broadcast, MAX_DELIVERY_ATTEMPTS)
+    logger.info("待投递用户数: %d", len(pending_users))
+    if not pending_users:
+        return 0
+
+    payload = {
+        "text": f"{SCHEDULED_HEADER}\n\n{broadcast.report}\n\n{SCHEDULED_FOOTER}",
+        "parse_mode": "Markdown",
+    }
+    # 投递状态攒批落库，避免每个用户一次数据库往返
+    results = []
+
+    def on_result(result):
+        if result.status == RESULT_BLOCKED:
+            # 用户阻止了 Bot，不再重试
+            logger.warning("用户 %s 可能已阻止 Bot，考虑取消订阅", result.chat_id)
+            # 可以选择自动取消订阅
+            # UserService.unsubscribe_user({"id": result.chat_id})
+        elif result.status == RESULT_FAILED:
+            logger.error("推送失败 (用户 %s): %s", result.chat_id, result.error)
+        results.append((result.chat_id, DELIVERY_STATUS[result.status], result.error))
+        if len(results) >= DELIVERY_FLUSH_SIZE:
+            BroadcastService.record_deliveries(broadcast, results)
+            results.clear()
+
+    try:
+        stats = BroadcastEngine().broadcast(pending_users, payload, on_result=on_result)
+    finally:
+        BroadcastService.record_deliveries(broadcast, results)
+
+    logger.info("广播完成 [%s]: %s", broadcast.slot_key, stats.summary())
+    delivery = BroadcastService.delivery_stats(broadcast)
+    logger.info("投递统计 [%s]: %s", broadcast.slot_key, delivery)
+    return len(BroadcastService.list_undelivered(broadcast, MAX_DELIVERY_ATTEMPTS))
+
+def send_scheduled_report(slot: str, slot_key: str = None, attempt: int = 1):
+    """发送定时报告给所有订阅用户
+
+    每个时段只生成一次报告，然后分发给所有订阅用户；
+    重复调用（重试）只会给尚未收到的用户重发已保存的报告；
+    报告生成失败时重新安排，最多尝试 MAX_GENERATION_ATTEMPTS 次；
+    运行结果（ok / skipped / retry / error）记入 SCHEDULER_JOB_RUNS
+    """
+    slot_key = slot_key or get_slot_key(slot)
+    status = "error"
     try:
         # 从数据库获取所有订阅用户
         subscribed_users = UserService.list_subscribed_users()
         
         if not subscribed_users:
-            print("⚠️ 没有订阅用户，跳过定时推送")
+            logger.warning("没有订阅用户，跳过定时推送")
+            status = "skipped"
             return
         
-        print(f"📅 开始定时推送，目标用户数: {len(subscribed_users)}")
-        
-        for user in subscribed_users:
-            # user 是一个元组: (tg_user_id, username, first_name, last_name)
-            chat_id = user[0]  # tg_user_id
-            username = user[1] or user[2] or "用户"  # username 或 first_name
-            
-            try:
-                # 发送初始消息
-                initial_msg = {
-                    "chat_id": chat_id,
-                    "text": f"� 定时推新送：正在生成纳斯达克100指数分析报告...\n\n💡 如不需要定时推送，请发送 /unsubscribe",
-                }
-                response = requests.post(TG_API_URL + "/sendMessage", json=initial_msg)
-                
-                if response.status_code == 200:
-                    resp_data = response.json()
-                    status_msg_id = resp_data["result"]["message_id"]
-                    
-                    # 异步执行分析任务
-                    run_agent_and_notify(chat_id, status_msg_id)
-                    print(f"✅ 已为用户 {username} ({chat_id}) 启动分析任务")
-                else:
-                    print(f"❌ 发送初始消息失败 (用户 {username}): {response.text}")
-                    # 如果是用户阻止了 Bot，可以考虑取消订阅
-                    if response.status_code == 403:
-                        print(f"⚠️ 用户 {chat_id} 可能已阻止 Bot，考虑取消订阅")
-                        # 可以选择自动取消订阅
-                        # UserService.unsubscribe_user({"id": chat_id})
-                    
-            except Exception as e:
-                print(f"❌ 推送失败 (用户 {username}): {str(e)}")
+        logger.info(
+            "开始定时推送 [%s]，目标用户数: %d", slot_key, len(subscribed_users)
+        )
+
+        try:
+            broadcast = prepare_broadcast(slot, slot_key)
+        except Exception as e:
+            logger.error("报告生成失败 [%s] (第 %d 次): %s", slot_key, attempt, e)
+            if attempt < MAX_GENERATION_ATTEMPTS:
+                schedule_retry(slot, slot_key, attempt + 1)
+                status = "retry"
+            return
+
+        # user 是一个元组: (tg_user_id, username, first_name, last_name)
+        BroadcastService.enqueue_users(
+            broadcast, [user[0] for user in subscribed_users]
+        )
+
+        remaining = deliver_broadcast(broadcast)
+        if remaining:
+            schedule_retry(slot, slot_key)
+        status = "retry" if remaining else "ok"
                 
     except Exception as e:
-        print(f"❌ 获取订阅用户失败: {str(e)}")
+        logger.exception("定时推送失败 [%s]: %s", slot_key, e)
+    finally:
+        SCHEDULER_JOB_RUNS.inc(job=f"{slot}_report", status=status)
+
+def schedule_retry(slot: str, slot_key: str, attempt: int = 1):
+    """安排一次重试：报告已生成时只给失败的用户重发，生成失败时重新生成
+
+    attempt 为重试时的报告生成尝试次数
+    """
+    run_date = datetime.now() + timedelta(minutes=RETRY_DELAY_MINUTES)
+    get_scheduler().add_job(
+        send_scheduled_report,
+        'date',
+        run_date=run_date,
+        args=[slot, slot_key, attempt],
+        id=f'retry_{slot_key}',
+        name=f'Retry NASDAQ Report {slot_key}',
+        replace_existing=True,
+    )
+    logger.info("已安排重试 [%s]: %s", slot_key, run_date.strftime("%H:%M"))
+
+def _job_label(job_id: str) -> str:
+    """重试任务（retry_<日期>-<时段>）按时段归到 <时段>_report，避免标签随日期增长"""
+    if job_id.startswith("retry_"):
+        return f"{job_id.rsplit('-', 1)[-1]}_report"
+    return job_id
+
+def _on_job_event(event):
+    """记录调度器层面的失败：错过执行时间，或任务抛出了未处理的异常
+
+    正常结束的运行由 send_scheduled_report 自己记录结果
+    """
+    status = "missed" if event.code == EVENT_JOB_MISSED else "error"
+    SCHEDULER_JOB_RUNS.inc(job=_job_label(event.job_id), status=status)
+
+def _next_run_times(scheduler) -> dict:
+    """每个定时任务的下次运行时间（Unix 时间戳，已暂停为 0）"""
+    return {
+        (job.id,): job.next_run_time.timestamp() if job.next_run_time else 0
+        for job in scheduler.get_jobs()
+    }
 
 def start_scheduler():
     """启动定时任务调度器"""
@@ -71,6 +201,7 @@ def start_scheduler():
         'cron', 
         hour=9, 
         minute=0,
+        args=['morning'],
         id='morning_report',
         name='Morning NASDAQ Report'
     )
@@ -81,14 +212,16 @@ def start_scheduler():
         'cron', 
         hour=20, 
         minute=0,
+        args=['evening'],
         id='evening_report',
         name='Evening NASDAQ Report'
     )
     
+    scheduler.add_listener(_on_job_event, EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+    SCHEDULER_JOB_NEXT_RUN.set_function(lambda: _next_run_times(scheduler))
+
     scheduler.start()
-    print("⏰ 定时任务调度器已启动")
-    print("📅 推送时间: 每日 09:00 和 20:00")
-    print("👥 使用数据库管理订阅用户")
+    logger.info("定时任务调度器已启动，推送时间: 每日 09:00 和 20:00")
     
     return scheduler
 
@@ -111,5 +244,5 @@ def get_user_stats():
             "users": subscribed_users
         }
     except Exception as e:
-        print(f"❌ 获取用户统计失败: {str(e)}")
+        logger.error("获取用户统计失败: %s", e)
         return {"subscribed_count": 0, "users": []}
\ No newline at end of file
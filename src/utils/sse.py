@@ -0,0 +1,202 @@
+"""事件驱动的 SSE 流
+
+crew 在工作线程中运行，通过 EventStream.publish() 把事件投递到事件循环
+（loop.call_soon_threadsafe），订阅者用 asyncio.Queue 等待新事件，不再轮询：
+- 每个事件带有 "<run_id>:<序号>" 形式的 id，客户端断线重连时通过
+  Last-Event-ID 续传，只补发缺失的事件
+- 空闲时定期发送注释行作为心跳，同时检测客户端是否已断开
+- 同一次运行可以有任意多个观看者：每个事件只产生一次，按订阅者扇出，
+  新加入的观看者先收到环形缓冲区中的历史事件，再接收实时事件
+- 最后一个订阅者离开时触发 on_idle，由调用方决定取消还是让运行在后台继续
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Callable, Optional
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 心跳间隔（秒）
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+# 每个运行保留的事件数（用于断线续传）
+SSE_HISTORY_SIZE = int(os.getenv("SSE_HISTORY_SIZE", 1000))
+# 运行结束后事件流保留多久（秒）
+SSE_RETENTION_SECONDS = float(os.getenv("SSE_RETENTION_SECONDS", 600))
+
+HEARTBEAT = ": ping\n\n"
+
+
+def format_event(run_id: str, seq: int, data: dict) -> str:
+    """SSE 格式: id: <run_id>:<seq>\\ndata: <json>\\n\\n"""
+    return f"id: {run_id}:{seq}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def parse_event_id(value: Optional[str]) -> tuple[Optional[str], int]:
+    """解析 Last-Event-ID，返回 (run_id, 已收到的最后序号)"""
+    run_id, sep, seq = (value or "").strip().rpartition(":")
+    if not sep or not run_id or not seq.isdigit():
+        return None, 0
+    return run_id, int(seq)
+
+
+class Subscription:
+    """单个订阅者：先补发历史事件，再等待新事件"""
+
+    def __init__(self, stream: "EventStream", backlog: list, missed: int = 0):
+        self.stream = stream
+        self.missed = missed  # 已被环形缓冲区挤掉、无法补发的事件数
+        self._backlog = deque(backlog)
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def get(self) -> Optional[tuple]:
+        """返回下一个 (序号, 数据)，事件流结束时返回 None"""
+        if self._backlog:
+            return self._backlog.popleft()
+        return await self._queue.get()
+
+    def close(self):
+        self.stream._detach(self)
+
+
+class EventStream:
+    """一次运行的事件流
+
+    publish() / close() 可以在任意线程调用，其余方法只在事件循环线程中调用，
+    因此内部状态不需要加锁。
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        loop: asyncio.AbstractEventLoop,
+        history: int = SSE_HISTORY_SIZE,
+        on_idle: Callable[["EventStream"], None] = None,
+    ):
+        self.run_id = run_id
+        self.closed = False
+        self.closed_at: Optional[float] = None
+        self.on_idle = on_idle
+        self._loop = loop
+        self._events = deque(maxlen=history)
+        self._seq = 0
+        self._subscribers: set[Subscription] = set()
+
+    # ---- 任意线程 ----
+
+    def publish(self, data: dict):
+        self._loop.call_soon_threadsafe(self._append, data)
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._close)
+
+    # ---- 事件循环线程 ----
+
+    def _append(self, data: dict):
+        if self.closed:
+            return
+        self._seq += 1
+        event = (self._seq, data)
+        self._events.append(event)
+        for sub in self._subscribers:
+            sub._queue.put_nowait(event)
+
+    def _close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.closed_at = time.monotonic()
+        for sub in self._subscribers:
+            sub._queue.put_nowait(None)
+
+    def subscribe(self, after: int = 0) -> Subscription:
+        """订阅序号大于 after 的事件"""
+        backlog = [event for event in self._events if event[0] > after]
+        oldest = self._events[0][0] if self._events else self._seq + 1
+        sub = Subscription(self, backlog, missed=max(0, oldest - after - 1))
+        if self.closed:
+            sub._queue.put_nowait(None)
+        else:
+            self._subscribers.add(sub)
+        return sub
+
+    def _detach(self, sub: Subscription):
+        self._subscribers.discard(sub)
+        if not self._subscribers and not self.closed and self.on_idle:
+            self.on_idle(self)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+class StreamRegistry:
+    """按 run_id 保存事件流，结束超过保留期的事件流会被清理（只在事件循环线程中使用）"""
+
+    def __init__(self, retention: float = SSE_RETENTION_SECONDS):
+        self.retention = retention
+        self._streams: dict[str, EventStream] = {}
+
+    def create(self, loop: asyncio.AbstractEventLoop, **kwargs) -> EventStream:
+        self.prune()
+        run_id = uuid.uuid4().hex[:12]
+        stream = EventStream(run_id, loop, **kwargs)
+        self._streams[run_id] = stream
+        return stream
+
+    def get(self, run_id: Optional[str]) -> Optional[EventStream]:
+        return self._streams.get(run_id) if run_id else None
+
+    def active(self) -> Optional[EventStream]:
+        """最近创建且尚未结束的运行"""
+        for stream in reversed(self._streams.values()):
+            if not stream.closed:
+                return stream
+        return None
+
+    def running(self) -> int:
+        """尚未结束的运行数"""
+        return sum(1 for stream in self._streams.values() if not stream.closed)
+
+    def prune(self):
+        now = time.monotonic()
+        expired = [
+            run_id for run_id, stream in self._streams.items()
+            if stream.closed and now - stream.closed_at > self.retention
+        ]
+        for run_id in expired:
+            del self._streams[run_id]
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+
+async def stream_events(
+    stream: EventStream,
+    after: int = 0,
+    is_disconnected: Callable = None,
+    heartbeat: float = SSE_HEARTBEAT_SECONDS,
+) -> AsyncIterator[str]:
+    """把事件流渲染成 SSE 文本，空闲时发送心跳，客户端断开后退订"""
+    sub = stream.subscribe(after)
+    try:
+        if sub.missed:
+            yield f"data: {json.dumps({'type': 'gap', 'missed': sub.missed})}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.get(), heartbeat)
+            except asyncio.TimeoutError:
+                if is_disconnected and await is_disconnected():
+                    logger.info("客户端已断开: %s", stream.run_id)
+                    return
+                yield HEARTBEAT
+                continue
+            if event is None:
+                return
+            yield format_event(stream.run_id, *event)
+    finally:
+        sub.close()
@@ -0,0 +1,186 @@
+"""任务级记忆化：输入没变的任务直接复用上次的输出
+
+每个任务的输出按 "输入哈希" 保存，输入包括：
+- 任务配置（渲染后的描述、期望输出、Agent 设定和模型）
+- 上游任务的输出（context）
+- 任务运行中调用过的工具及其结果
+
+前两项在运行前即可算出，作为存储的 key；工具结果只有运行后才知道，
+因此随输出一起记录下 (工具名, 参数, 结果哈希)，
+下次运行前按相同参数重放这些工具调用（行情、新闻都有缓存，开销很小），
+结果哈希全部一致才复用。上游任务需要重新执行时，下游任务也重新执行。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Optional
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# on | off
+TASK_MEMO = os.getenv("TASK_MEMO", "on")
+TASK_MEMO_PATH = os.getenv("TASK_MEMO_PATH", ".cache/task_memo.sqlite")
+# 记忆的有效期（秒），默认覆盖早晚两个推送时段
+TASK_MEMO_TTL = float(os.getenv("TASK_MEMO_TTL", 24 * 3600))
+# 每个任务保留的记录数
+KEEP_PER_TASK = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_memo (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    task       TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    output     TEXT NOT NULL,
+    tool_calls TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_task_memo_task_key
+    ON task_memo (task, key, created_at DESC);
+"""
+
+
+def digest(value: Any) -> str:
+    """任意可 JSON 序列化的值的 SHA-256"""
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ToolCall:
+    tool: str
+    args: dict
+    result_hash: str
+
+
+@dataclass
+class MemoEntry:
+    task: str
+    key: str
+    output: str
+    tool_calls: list[ToolCall]
+    created_at: float
+
+
+def replay_matches(entry: MemoEntry, run_tool: Callable[[str, dict], Any]) -> bool:
+    """按原参数重放工具调用，结果与记录完全一致时返回 True"""
+    for call in entry.tool_calls:
+        try:
+            result = run_tool(call.tool, call.args)
+        except Exception as e:
+            logger.info(
+                "重放工具 %s 失败，任务 %s 需要重新执行: %s", call.tool, entry.task, e
+            )
+            return False
+        if digest(str(result)) != call.result_hash:
+            logger.info(
+                "工具 %s 的结果已变化，任务 %s 需要重新执行", call.tool, entry.task
+            )
+            return False
+    return True
+
+
+class TaskMemoStore:
+    """SQLite 存储的任务输出，可在多个线程中使用"""
+
+    def __init__(self, path: str = TASK_MEMO_PATH, ttl: float = TASK_MEMO_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def get(self, task: str, key: str) -> Optional[MemoEntry]:
+        """该任务在相同 key 下最近一次、未过期的输出"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output, tool_calls, created_at FROM task_memo "
+                "WHERE task = ? AND key = ? AND created_at >= ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (task, key, time.time() - self.ttl),
+            ).fetchone()
+        if row is None:
+            return None
+        calls = [ToolCall(**call) for call in json.loads(row[1])]
+        return MemoEntry(task, key, row[0], calls, row[2])
+
+    def put(self, task: str, key: str, output: str, tool_calls: list[ToolCall]):
+        with self._lock:
+            calls = json.dumps([asdict(c) for c in tool_calls], ensure_ascii=False)
+            self._conn.execute(
+                "INSERT INTO task_memo (task, key, output, tool_calls, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (task, key, output, calls, time.time()),
+            )
+            # 每个任务只保留最近 KEEP_PER_TASK 条
+            self._conn.execute(
+                "DELETE FROM task_memo WHERE task = ? AND id NOT IN "
+                "(SELECT id FROM task_memo WHERE task = ? "
+                "ORDER BY created_at DESC LIMIT ?)",
+                (task, task, KEEP_PER_TASK),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM task_memo")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ToolCallRecorder:
+    """按 crewai task.id 收集任务运行中的工具调用（由事件总线的处理函数写入）"""
+
+    def __init__(self):
+        self._calls: dict[str, list[ToolCall]] = {}
+        self._lock = threading.Lock()
+
+    def track(self, task_id):
+        with self._lock:
+            self._calls[str(task_id)] = []
+
+    def record(self, task_id, tool: str, args, result):
+        if isinstance(args, str):
+            try:
+                args = json.loads(args) if args else {}
+            except ValueError:
+                args = {"input": args}
+        with self._lock:
+            calls = self._calls.get(str(task_id))
+            if calls is not None:
+                calls.append(ToolCall(tool, args or {}, digest(str(result))))
+
+    def pop(self, task_id) -> list[ToolCall]:
+        with self._lock:
+            return self._calls.pop(str(task_id), [])
+
+
+recorder = ToolCallRecorder()
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_task_memo() -> Optional[TaskMemoStore]:
+    """全局任务记忆，TASK_MEMO=off 时返回 None"""
+    global _store
+    if TASK_MEMO != "on":
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TaskMemoStore()
+    return _store
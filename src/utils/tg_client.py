@@ -0,0 +1,88 @@
+"""异步 Telegram 客户端：供 webhook 等事件循环内的代码使用"""
+import os
+import time
+
+import httpx
+
+from src.utils.logger import get_logger
+from src.utils.metrics import TELEGRAM_REQUEST_SECONDS
+from src.utils.notifier import TG_API_URL
+
+logger = get_logger(__name__)
+
+# 事件循环内共享的连接池大小
+TG_ASYNC_POOL_SIZE = int(os.getenv("TG_ASYNC_POOL_SIZE", 100))
+
+_client = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """获取共享的异步 HTTP 客户端（复用 keep-alive 连接）"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=TG_API_URL,
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=TG_ASYNC_POOL_SIZE,
+                max_keepalive_connections=TG_ASYNC_POOL_SIZE,
+            ),
+        )
+    return _client
+
+
+async def _post(method: str, payload: dict) -> httpx.Response:
+    """调用 Telegram Bot API（异步），记录耗时和状态码"""
+    started = time.perf_counter()
+    status = "error"
+    try:
+        response = await get_async_client().post(f"/{method}", json=payload)
+        status = response.status_code
+        return response
+    except httpx.TimeoutException:
+        status = "timeout"
+        raise
+    finally:
+        TELEGRAM_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, method=method, status=status
+        )
+
+
+async def send_message(chat_id: int, text: str, **extra) -> dict | None:
+    """发送消息，成功时返回 Telegram 的 result 字段，失败返回 None"""
+    payload = {"chat_id": chat_id, "text": text, **extra}
+    try:
+        response = await _post("sendMessage", payload)
+    except httpx.HTTPError as e:
+        logger.error("发送消息失败 (chat_id: %s): %s", chat_id, e)
+        return None
+
+    if response.status_code != 200:
+        logger.error("发送消息失败 (%s): %s", response.status_code, response.text)
+        return None
+    return response.json().get("result")
+
+
+async def edit_message(
+    chat_id: int, message_id: int, text: str, **extra
+) -> dict | None:
+    """编辑已发送的消息，失败返回 None"""
+    payload = {"chat_id": chat_id, "message_id": message_id, "text": text, **extra}
+    try:
+        response = await _post("editMessageText", payload)
+    except httpx.HTTPError as e:
+        logger.error("编辑消息失败 (chat_id: %s): %s", chat_id, e)
+        return None
+
+    if response.status_code != 200:
+        logger.error("编辑消息失败 (%s): %s", response.status_code, response.text)
+        return None
+    return response.json().get("result")
+
+
+async def close_async_client():
+    """关闭共享客户端（应用退出时调用）"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
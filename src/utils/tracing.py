@@ -0,0 +1,314 @@
+"""单次运行的链路追踪
+
+每次 crew 运行（/invoke、/start_summary、定时推送）生成一个 Trace，包含以下 span：
+crew（根）、build（构建 crew）、task、step（Agent 每一步）、tool、llm、
+telegram（进度编辑）。
+
+- span 的父子关系显式传递：crewai 的异步任务和事件处理函数运行在其它线程，
+  contextvars 不会跟过去，所以 crew 在构建时按 task.id 登记所属的 Trace，
+  事件处理函数通过 task_id 找到对应的 Trace
+- 进度回调等 crew 自己的代码通过 use_trace() 设置当前 Trace，
+  Telegram 调用读取 current_trace()
+- 运行结束时按 TRACE_EXPORT 导出：json 写入 TRACE_DIR/<run_id>.json，
+  otlp 转成 OpenTelemetry span
+- 最近 TRACE_HISTORY 个 Trace 保留在内存中，供 /runs/{run_id}/trace 和 /status 查看
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 导出方式：none | json | otlp
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "none")
+# json 导出目录
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+# 内存中保留的 Trace 数
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", 50))
+
+KIND_CREW = "crew"
+KIND_BUILD = "build"
+KIND_TASK = "task"
+KIND_STEP = "step"
+KIND_TOOL = "tool"
+KIND_LLM = "llm"
+KIND_TELEGRAM = "telegram"
+
+# 时间线中各类 span 的展示名称
+KIND_LABELS = {
+    KIND_BUILD: "构建",
+    KIND_TASK: "任务",
+    KIND_STEP: "Agent 步骤",
+    KIND_TOOL: "工具",
+    KIND_LLM: "LLM",
+    KIND_TELEGRAM: "Telegram",
+}
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+@dataclass
+class Span:
+    span_id: str
+    name: str
+    kind: str
+    start: float  # Unix 时间戳（秒）
+    end: Optional[float] = None
+    parent_id: Optional[str] = None
+    status: str = "ok"
+    attributes: dict = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+
+class Trace:
+    """一次运行的所有 span，可以在任意线程中添加"""
+
+    def __init__(self, run_id: str = None, name: str = "nasdaq_summary", **attributes):
+        self.run_id = run_id or new_id()
+        self.root = Span(new_id(), name, KIND_CREW, time.time(), attributes=attributes)
+        self.spans: list[Span] = [self.root]
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.root.end is not None
+
+    def add_span(
+        self,
+        name: str,
+        kind: str,
+        start: float,
+        end: float,
+        parent_id: str = None,
+        span_id: str = None,
+        status: str = "ok",
+        **attributes,
+    ) -> Span:
+        """记录一个已结束的 span（开始、结束时间由调用方给出）"""
+        span = Span(
+            span_id or new_id(), name, kind, start, end,
+            parent_id or self.root.span_id, status, attributes,
+        )
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, kind: str, parent_id: str = None, **attributes):
+        """记录代码块的耗时，出错时 status 为 error"""
+        start = time.time()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.add_span(
+                name, kind, start, time.time(), parent_id, status=status, **attributes
+            )
+
+    def finish(self, status: str = "ok"):
+        self.root.end = time.time()
+        self.root.status = status
+
+    def summary(self) -> dict:
+        """各类 span 的总耗时（秒）；并行执行的 span 会重叠，总和可能超过运行时长"""
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            if span.kind != KIND_CREW:
+                totals[span.kind] = totals.get(span.kind, 0) + span.duration
+        return {kind: round(seconds, 3) for kind, seconds in totals.items()}
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return {
+            "run_id": self.run_id,
+            "duration": round(self.root.duration, 3),
+            "finished": self.finished,
+            "summary": self.summary(),
+            "spans": [asdict(span) for span in spans],
+        }
+
+    def render_timeline(self, width: int = 40) -> str:
+        """文本火焰图：按父子关系缩进，条形表示 span 在整个运行中的位置和长度"""
+        with self._lock:
+            spans = list(self.spans)
+        children = {}
+        for span in spans:
+            if span is not self.root:
+                children.setdefault(span.parent_id, []).append(span)
+
+        total = max(self.root.duration, 1e-6)
+        lines = [f"run {self.run_id}  {total:.2f}s"]
+
+        def walk(parent_id: str, depth: int):
+            spans = sorted(children.get(parent_id, []), key=lambda span: span.start)
+            for span in spans:
+                offset = int((span.start - self.root.start) / total * width)
+                length = max(1, round(span.duration / total * width))
+                offset = min(max(offset, 0), width - 1)
+                bar = " " * offset + "█" * min(length, width - offset)
+                flag = "" if span.status == "ok" else " ❌"
+                indent = "  " * depth
+                lines.append(
+                    f"{bar:<{width}} {span.duration:7.2f}s  "
+                    f"{indent}{span.kind}:{span.name}{flag}"
+                )
+                walk(span.span_id, depth + 1)
+
+        walk(self.root.span_id, 0)
+        return "\n".join(lines)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def use_trace(trace: Optional[Trace]):
+    """在当前线程（上下文）中设置当前 Trace"""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+class TraceStore:
+    """保存最近的 Trace，并按 crewai task.id 索引所属的 Trace 和任务 span"""
+
+    def __init__(self, max_traces: int = TRACE_HISTORY, export: str = TRACE_EXPORT):
+        self.max_traces = max_traces
+        self.export = export
+        self._traces: OrderedDict[str, Trace] = OrderedDict()
+        self._tasks: dict[str, tuple[Trace, str]] = {}
+        self._lock = threading.Lock()
+
+    def start(self, run_id: str = None, **attributes) -> Trace:
+        trace = Trace(run_id, **attributes)
+        with self._lock:
+            self._traces[trace.run_id] = trace
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+        return trace
+
+    def bind_task(self, task_id, trace: Trace, span_id: str):
+        with self._lock:
+            self._tasks[str(task_id)] = (trace, span_id)
+
+    def for_task(self, task_id) -> tuple[Optional[Trace], Optional[str]]:
+        """返回 (Trace, 任务 span id)，未登记时返回 (None, None)"""
+        with self._lock:
+            return self._tasks.get(str(task_id), (None, None))
+
+    def get(self, run_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._traces.get(run_id)
+
+    def recent(self, limit: int = 5) -> list[Trace]:
+        with self._lock:
+            return list(self._traces.values())[-limit:][::-1]
+
+    def finish(self, trace: Trace, status: str = "ok"):
+        """结束 Trace、解除任务索引并导出"""
+        trace.finish(status)
+        with self._lock:
+            task_ids = [key for key, value in self._tasks.items() if value[0] is trace]
+            for task_id in task_ids:
+                del self._tasks[task_id]
+        try:
+            if self.export == "json":
+                export_json(trace)
+            elif self.export == "otlp":
+                export_otlp(trace)
+        except Exception as e:
+            logger.warning("Trace 导出失败 (%s): %s", trace.run_id, e)
+
+
+def export_json(trace: Trace, directory: str = TRACE_DIR) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{trace.run_id}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(trace.to_dict(), f, ensure_ascii=False, indent=2)
+    return path
+
+
+_otel_tracer = None
+_otel_lock = threading.Lock()
+
+
+def _get_otel_tracer():
+    """按 OTEL_* 环境变量配置 OTLP 导出
+
+    需要安装 opentelemetry-sdk 和 OTLP exporter。
+    """
+    global _otel_tracer
+    if _otel_tracer is None:
+        with _otel_lock:
+            if _otel_tracer is None:
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+                    OTLPSpanExporter,
+                )
+                from opentelemetry.sdk.resources import Resource
+                from opentelemetry.sdk.trace import TracerProvider
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+                resource = Resource.create({"service.name": "qqq-agent"})
+                provider = TracerProvider(resource=resource)
+                provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+                _otel_tracer = provider.get_tracer(__name__)
+    return _otel_tracer
+
+
+def export_otlp(trace: Trace):
+    """把已结束的 span 按原始时间戳转成 OpenTelemetry span"""
+    try:
+        tracer = _get_otel_tracer()
+    except ImportError as e:
+        logger.warning("未安装 opentelemetry，无法导出 Trace: %s", e)
+        return
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.trace import Status, StatusCode
+
+    with trace._lock:
+        spans = sorted(trace.spans, key=lambda span: span.start)
+    created = {}
+    for span in spans:
+        parent = created.get(span.parent_id)
+        context = otel_trace.set_span_in_context(parent) if parent is not None else None
+        attributes = {"run_id": trace.run_id, "kind": span.kind}
+        attributes.update({key: str(value) for key, value in span.attributes.items()})
+        otel_span = tracer.start_span(
+            f"{span.kind}:{span.name}", context=context,
+            start_time=int(span.start * 1e9), attributes=attributes,
+        )
+        if span.status != "ok":
+            otel_span.set_status(Status(StatusCode.ERROR))
+        created[span.span_id] = otel_span
+    # 子 span 先结束
+    for span in reversed(spans):
+        created[span.span_id].end(end_time=int((span.end or time.time()) * 1e9))
+
+
+traces = TraceStore()